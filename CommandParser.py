@@ -0,0 +1,219 @@
+import re
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from VFSGlob import GLOB_CHARS
+
+# Операторы командной строки; более длинные проверяются первыми
+OPERATORS = ('>>', '|', '>', '&')
+_OPERATOR_CHARS = frozenset(op[0] for op in OPERATORS)
+
+# Символы, при отсутствии которых строку можно разбить простым split()
+_SPECIAL_CHARS = frozenset('\'"\\') | GLOB_CHARS | _OPERATOR_CHARS
+_SPECIAL_SEARCH = re.compile('[' + re.escape(''.join(sorted(_SPECIAL_CHARS))) + ']').search
+
+# Отрезки без специальных символов вне кавычек и внутри двойных кавычек
+_PLAIN_RUN = re.compile(r'[^\s' + re.escape(''.join(sorted(_SPECIAL_CHARS))) + ']+').match
+_DOUBLE_QUOTED_RUN = re.compile(r'[^"\\]+').match
+
+
+class Operator(NamedTuple):
+    """Неэкранированный оператор командной строки (|, >, >>, &)"""
+    text: str
+
+
+class Stage(NamedTuple):
+    """Одна команда конвейера с необязательным перенаправлением вывода"""
+    argv: List[str]
+    redirect: Optional[Tuple[str, str]]  # (оператор '>' или '>>', путь)
+
+
+class Word(NamedTuple):
+    """Слово командной строки после снятия кавычек"""
+    text: str       # Значение слова без кавычек
+    pattern: str    # Значение для сопоставления с шаблоном (экранированные символы в [])
+    is_glob: bool   # Есть ли в слове неэкранированные символы шаблона
+
+
+def _escape_glob_char(char: str) -> str:
+    """Экранирует символ шаблона так, чтобы fnmatch воспринимал его буквально"""
+    return f"[{char}]" if char in GLOB_CHARS else char
+
+
+def _escape_glob_text(text: str) -> str:
+    """Экранирует все символы шаблона в строке из кавычек"""
+    if not any(c in GLOB_CHARS for c in text):
+        return text
+    return ''.join(_escape_glob_char(c) for c in text)
+
+
+def tokenize(line: str) -> List[Union[Word, Operator]]:
+    """Разбивает строку на слова по правилам POSIX shell (как shlex.split),
+    дополнительно запоминая, какие символы шаблона были в кавычках,
+    и выделяя неэкранированные операторы"""
+    if _SPECIAL_SEARCH(line) is None:
+        return [Word(part, part, False) for part in line.split()]
+
+    words = []
+    text = []
+    pattern = []
+    is_glob = False
+    in_word = False
+    i = 0
+    length = len(line)
+
+    while i < length:
+        # Обычные символы добавляем сразу целыми отрезками
+        run = _PLAIN_RUN(line, i)
+        if run is not None:
+            chunk = run.group()
+            text.append(chunk)
+            pattern.append(chunk)
+            in_word = True
+            i = run.end()
+            continue
+
+        char = line[i]
+
+        if char in ' \t\r\n':
+            if in_word:
+                words.append(Word(''.join(text), ''.join(pattern), is_glob))
+                text, pattern, is_glob, in_word = [], [], False, False
+            i += 1
+            continue
+
+        if char in _OPERATOR_CHARS:
+            if in_word:
+                words.append(Word(''.join(text), ''.join(pattern), is_glob))
+                text, pattern, is_glob, in_word = [], [], False, False
+            for operator in OPERATORS:
+                if line.startswith(operator, i):
+                    words.append(Operator(operator))
+                    i += len(operator)
+                    break
+            continue
+
+        in_word = True
+
+        if char == '\\':
+            if i + 1 >= length:
+                raise ValueError("No escaped character")
+            escaped = line[i + 1]
+            text.append(escaped)
+            pattern.append(_escape_glob_char(escaped))
+            i += 2
+            continue
+
+        if char == "'":
+            end = line.find("'", i + 1)
+            if end == -1:
+                raise ValueError("No closing quotation")
+            quoted = line[i + 1:end]
+            text.append(quoted)
+            pattern.append(_escape_glob_text(quoted))
+            i = end + 1
+            continue
+
+        if char == '"':
+            i += 1
+            while True:
+                run = _DOUBLE_QUOTED_RUN(line, i)
+                if run is not None:
+                    chunk = run.group()
+                    text.append(chunk)
+                    pattern.append(_escape_glob_text(chunk))
+                    i = run.end()
+                if i >= length:
+                    raise ValueError("No closing quotation")
+                char = line[i]
+                if char == '"':
+                    i += 1
+                    break
+                # Внутри двойных кавычек обратный слеш экранирует только \\ и " (как в shlex)
+                if i + 1 < length and line[i + 1] in '\\"':
+                    char = line[i + 1]
+                    i += 1
+                text.append(char)
+                pattern.append(_escape_glob_char(char))
+                i += 1
+            continue
+
+        # Неэкранированный символ шаблона
+        is_glob = True
+        text.append(char)
+        pattern.append(char)
+        i += 1
+
+    if in_word:
+        words.append(Word(''.join(text), ''.join(pattern), is_glob))
+
+    return words
+
+
+def split_commands(line: str) -> List[str]:
+    """Разбивает строку на отдельные команды по неэкранированным ';' и '&'
+    ('&' остается в конце своей команды: она выполняется в фоне).
+
+    Разбиение выполняется до раскрытия переменных и шаблонов, чтобы каждая
+    команда видела результат предыдущих (export A=1; echo $A)."""
+    if ';' not in line and '&' not in line:
+        return [line]
+
+    commands = []
+    start = 0
+    quote = None
+    i = 0
+    length = len(line)
+    while i < length:
+        char = line[i]
+        if char == '\\' and quote != "'":
+            i += 2
+            continue
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '\'"':
+            quote = char
+        elif char == ';':
+            commands.append(line[start:i])
+            start = i + 1
+        elif char == '&':
+            commands.append(line[start:i + 1])
+            start = i + 1
+        i += 1
+    commands.append(line[start:])
+    return [command for command in commands if command.strip()]
+
+
+def split_pipeline(tokens: List[Union[str, Operator]]) -> List[Stage]:
+    """Разбивает раскрытые слова и операторы на команды конвейера"""
+    stages = []
+    argv = []
+    redirect = None
+    i = 0
+
+    while i < len(tokens):
+        token = tokens[i]
+        if isinstance(token, Operator):
+            if token.text == '&':
+                # Фоновое выполнение отмечается только в конце команды (см. split_commands)
+                raise ValueError("синтаксическая ошибка рядом с '&'")
+            if token.text == '|':
+                if not argv:
+                    raise ValueError("синтаксическая ошибка рядом с '|'")
+                stages.append(Stage(argv, redirect))
+                argv, redirect = [], None
+            else:
+                if i + 1 >= len(tokens) or isinstance(tokens[i + 1], Operator):
+                    raise ValueError(f"синтаксическая ошибка: нет пути после '{token.text}'")
+                redirect = (token.text, tokens[i + 1])
+                i += 1
+        else:
+            argv.append(token)
+        i += 1
+
+    if argv:
+        stages.append(Stage(argv, redirect))
+    elif stages or redirect:
+        raise ValueError("синтаксическая ошибка: неожиданный конец команды")
+
+    return stages
@@ -0,0 +1,233 @@
+import sys
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+from enum import Enum
+from typing import Dict, Optional
+
+
+class Residency(Enum):
+    """Состояние содержимого файла в памяти"""
+    RESIDENT = "resident"        # Содержимое лежит в node.content
+    COMPRESSED = "compressed"    # Содержимое сжато zlib и лежит в node.compressed_content
+    EVICTED = "evicted"          # Содержимое выгружено, читается заново из архива
+
+
+class ContentCache:
+    """Глобальный кэш содержимого файлов VFS с ограничением по памяти и LRU-вытеснением.
+
+    Холодные файлы с загрузчиком из архива выгружаются полностью и
+    перечитываются при следующем обращении; сжимается такой файл, только если
+    сжатия одного его хватает, чтобы уложиться в бюджет. Узлы без загрузчика
+    (созданные или измененные в сессии) никогда не выгружаются полностью,
+    только сжимаются.
+
+    Чтение из архива и распаковка идут вне блокировки кэша: медленная
+    загрузка одного файла не останавливает остальные потоки, а блокировка
+    берется только для учета LRU. Узел восстанавливает один поток, другие
+    потоки, обратившиеся к тому же узлу, ждут окончания его загрузки.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, compress: bool = True):
+        self.budget_bytes = budget_bytes
+        self.compress = compress
+        self.used_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compressions = 0
+        self.decompressions = 0
+
+        self._lru: "OrderedDict[int, weakref.ref]" = OrderedDict()
+        self._charged: Dict[int, int] = {}
+        # Узлы, которые сейчас загружаются: id узла -> событие окончания загрузки
+        self._loading: Dict[int, threading.Event] = {}
+        self._lock = threading.RLock()
+
+    def configure(self, budget_bytes: Optional[int] = None, compress: bool = True):
+        """Изменяет бюджет кэша и сразу применяет его"""
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self.compress = compress
+            self._enforce_budget()
+
+    def get(self, node) -> str:
+        """Возвращает содержимое узла, при необходимости восстанавливая его"""
+        key = id(node)
+        while True:
+            with self._lock:
+                if node.residency is Residency.RESIDENT:
+                    self.hits += 1
+                    if key in self._lru:
+                        self._lru.move_to_end(key)
+                    return node.content
+                loading = self._loading.get(key)
+                if loading is None:
+                    self.misses += 1
+                    loading = self._loading[key] = threading.Event()
+                    compressed = node.compressed_content if node.residency is Residency.COMPRESSED else None
+                    loader = node.loader
+                    break
+            # Узел уже загружает другой поток: после загрузки он будет в памяти
+            loading.wait()
+
+        try:
+            if compressed is not None:
+                content, raw = zlib.decompress(compressed).decode('utf-8'), None
+            else:
+                raw = loader()
+                content, is_binary = node.decode(raw)
+        except BaseException:
+            with self._lock:
+                del self._loading[key]
+                loading.set()
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            loading.set()
+            if node.residency is Residency.RESIDENT:
+                # Пока шла загрузка, содержимое записали заново
+                return node.content
+            if raw is None:
+                self.decompressions += 1
+            else:
+                node.is_binary = is_binary
+                node.size = len(raw)
+            node.content = content
+            node.compressed_content = None
+            node.residency = Residency.RESIDENT
+            self._charge(node)
+            self._enforce_budget()
+            return content
+
+    def admit(self, node):
+        """Учитывает только что загруженное или измененное содержимое узла"""
+        with self._lock:
+            self._charge(node)
+            self._enforce_budget()
+
+    def discard(self, node):
+        """Перестает учитывать узел в кэше"""
+        with self._lock:
+            self._uncharge(id(node))
+
+    def clear(self):
+        """Сбрасывает учет всех узлов и счетчики"""
+        with self._lock:
+            self._lru.clear()
+            self._charged.clear()
+            self.used_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+            self.compressions = self.decompressions = 0
+
+    def stats(self) -> Dict:
+        """Возвращает счетчики кэша"""
+        with self._lock:
+            resident = compressed = 0
+            for key, ref in self._lru.items():
+                node = ref()
+                if node is None:
+                    continue
+                if node.residency is Residency.RESIDENT:
+                    resident += 1
+                elif node.residency is Residency.COMPRESSED:
+                    compressed += 1
+            lookups = self.hits + self.misses
+            return {
+                'budget_bytes': self.budget_bytes,
+                'used_bytes': self.used_bytes,
+                'resident_nodes': resident,
+                'compressed_nodes': compressed,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'compressions': self.compressions,
+                'decompressions': self.decompressions,
+            }
+
+    @staticmethod
+    def _footprint(node) -> int:
+        """Оценивает объем памяти, занимаемый содержимым узла"""
+        if node.residency is Residency.RESIDENT:
+            return sys.getsizeof(node.content)
+        if node.residency is Residency.COMPRESSED:
+            return sys.getsizeof(node.compressed_content)
+        return 0
+
+    def _charge(self, node):
+        key = id(node)
+        self._uncharge(key)
+        size = self._footprint(node)
+        if size == 0:
+            return
+        self._lru[key] = weakref.ref(node, lambda _ref, key=key: self._on_node_dead(key))
+        self._charged[key] = size
+        self.used_bytes += size
+
+    def _uncharge(self, key: int):
+        self._lru.pop(key, None)
+        self.used_bytes -= self._charged.pop(key, 0)
+
+    def _on_node_dead(self, key: int):
+        with self._lock:
+            self._uncharge(key)
+
+    def _enforce_budget(self):
+        """Сжимает и выгружает холодные узлы, пока не уложимся в бюджет"""
+        if self.budget_bytes is None or self.used_bytes <= self.budget_bytes:
+            return
+
+        for key in list(self._lru):
+            if self.used_bytes <= self.budget_bytes:
+                break
+            ref = self._lru.get(key)
+            node = ref() if ref is not None else None
+            if node is None:
+                self._uncharge(key)
+                continue
+
+            if node.loader is not None and not self._compress_enough(key, node):
+                # Сжимать узел, который все равно будет выгружен, - лишняя работа
+                self._evict(key, node)
+                continue
+
+            if node.residency is Residency.RESIDENT and self.compress:
+                node.compressed_content = zlib.compress(node.content.encode('utf-8'), 1)
+                node.content = ""
+                node.residency = Residency.COMPRESSED
+                self.compressions += 1
+                self._charge(node)
+                self._lru.move_to_end(key, last=False)
+                if self.used_bytes <= self.budget_bytes:
+                    break
+
+            if node.loader is not None:
+                self._evict(key, node)
+
+    def _compress_enough(self, key: int, node) -> bool:
+        """Хватит ли сжатия узла, чтобы уложиться в бюджет (zlib сжимает текст
+        хотя бы вдвое); иначе узел с загрузчиком выгружается сразу"""
+        if not self.compress or node.residency is not Residency.RESIDENT:
+            return False
+        return self.used_bytes - self._charged.get(key, 0) // 2 <= self.budget_bytes
+
+    def _evict(self, key: int, node):
+        node.content = ""
+        node.compressed_content = None
+        node.residency = Residency.EVICTED
+        self.evictions += 1
+        self._uncharge(key)
+
+
+# Общий кэш для всех экземпляров VFS в процессе
+content_cache = ContentCache()
+
+
+def configure_content_cache(budget_bytes: Optional[int] = None, compress: bool = True) -> ContentCache:
+    """Настраивает глобальный кэш содержимого"""
+    content_cache.configure(budget_bytes, compress)
+    return content_cache
@@ -0,0 +1,87 @@
+import os
+import re
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+# Шаблон ссылки на переменную: ${NAME}, $NAME или $? (компилируется один раз)
+VARIABLE_PATTERN = re.compile(r'\$\{([^}]+)\}|\$([a-zA-Z_][a-zA-Z0-9_]*|\?)')
+
+# Допустимое имя переменной для export/unset и присваивания NAME=value
+NAME_PATTERN = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*\Z')
+
+
+class SessionEnvironment:
+    """Переменные окружения сессии поверх переменных реальной ОС.
+
+    Изменения (export, unset, NAME=value) видны только в сессии эмулятора
+    и не затрагивают os.environ.
+    """
+
+    def __init__(self, base: Optional[Mapping[str, str]] = None):
+        self._base = os.environ if base is None else base
+        self._overrides: Dict[str, str] = {}
+        self._unset = set()
+        self.last_status = 0
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Возвращает значение переменной с учетом переопределений сессии"""
+        if name in self._overrides:
+            return self._overrides[name]
+        if name in self._unset:
+            return default
+        return self._base.get(name, default)
+
+    def set(self, name: str, value: str):
+        """Устанавливает переменную в сессии"""
+        self._overrides[name] = value
+        self._unset.discard(name)
+
+    def unset(self, name: str):
+        """Удаляет переменную из сессии (в том числе скрывает переменную ОС)"""
+        self._overrides.pop(name, None)
+        self._unset.add(name)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def session_items(self) -> Iterator[Tuple[str, str]]:
+        """Возвращает переменные, установленные в сессии"""
+        return iter(sorted(self._overrides.items()))
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """Возвращает все видимые переменные"""
+        names = (set(self._base) | set(self._overrides)) - self._unset
+        for name in sorted(names):
+            yield name, self.get(name)
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Возвращает значение для подстановки с особыми правилами для HOME, USER и $?"""
+        if name == "?":
+            return str(self.last_status)
+        if name in self._overrides:
+            # Значения, заданные в сессии, подставляются без изменений
+            return self._overrides[name]
+        if name == "HOME":
+            # В Windows домашняя директория может быть только в USERPROFILE
+            value = self.get("HOME") or self.get("USERPROFILE", "")
+        elif name == "USER":
+            value = self.get("USER") or self.get("USERNAME", "")
+        else:
+            value = self.get(name)
+            if value is None:
+                return None
+        # Для путей ОС заменяем обратные слеши на прямые
+        if "\\" in value:
+            return value.replace("\\", "/")
+        return value
+
+    def expand(self, text: str) -> str:
+        """Раскрывает $NAME, ${NAME} и $? в тексте"""
+        # Быстрый путь: в большинстве строк нет ссылок на переменные
+        if '$' not in text:
+            return text
+        return VARIABLE_PATTERN.sub(self._replace, text)
+
+    def _replace(self, match) -> str:
+        value = self.lookup(match.group(1) or match.group(2))
+        # Неизвестные переменные остаются в тексте как есть
+        return match.group(0) if value is None else value
@@ -1,11 +1,29 @@
+import errno
 import os
 import time
-from typing import Dict, List, Optional, Union
-from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass, field
 from enum import Enum
+from functools import partial
+from itertools import chain
 import zipfile
 import base64
+from bisect import bisect_left, insort
 import io
+import sys
+import threading
+import tracemalloc
+
+from ContentCache import Residency, content_cache
+from MetadataTable import ROW_DIRECTORY, MetadataQuery, MetadataTable
+from Integrity import IntegrityTracker, VerifyReport, checked_open, checked_read, verify_members
+from OutOfCore import OutOfCorePolicy, SpillStore, SqliteNodeIndex
+from Overlay import OverlayBackend
+from SearchIndex import INDEX_SUFFIX, ContentIndex
+from ReadWriteLock import ReadWriteLock
+from VFSFile import ScandirIterator, VFSDirEntry, VFSFileIO
+from StorageBackends import EntryInfo, StorageBackend, is_zip_file, open_backend
+from Tracer import tracer
 
 
 class FileType(Enum):
@@ -25,9 +43,18 @@ class FileType(Enum):
     DIRECTORY = "directory"
 
 
-@dataclass
+# Сериализует ленивую загрузку детей директорий между потоками
+_children_load_lock = threading.RLock()
+
+
+# eq=False: узлы сравниваются по идентичности, а не по содержимому всего поддерева
+@dataclass(eq=False)
 class VFSNode:
-    """Узел виртуальной файловой системы"""
+    """Узел виртуальной файловой системы.
+
+    Методы узла не синхронизированы: из нескольких потоков дерево
+    изменяется только через VirtualFileSystem под блокировкой записи.
+    """
     name: str
     type: FileType
     content: str = ""
@@ -39,6 +66,16 @@ class VFSNode:
     created_time: float = None
     modified_time: float = None
     is_binary: bool = False  # Флаг бинарного файла
+    residency: Residency = Residency.RESIDENT  # Где сейчас находится содержимое
+    # Загрузчик исходных байтов из архива, позволяет выгружать содержимое из памяти
+    loader: Optional[Callable[[], bytes]] = field(default=None, repr=False, compare=False)
+    compressed_content: Optional[bytes] = field(default=None, repr=False, compare=False)
+    # Открывает поток исходных байтов без чтения файла в память целиком
+    opener: Optional[Callable[[], BinaryIO]] = field(default=None, repr=False, compare=False)
+    # Загрузчик детей директории, вызывается при первом обращении к ним (ленивые источники)
+    children_loader: Optional[Callable[['VFSNode'], None]] = field(default=None, repr=False, compare=False)
+    # Отсортированные имена детей: строится при первом запросе и поддерживается при изменениях
+    name_index: Optional[List[str]] = field(default=None, repr=False, compare=False)
 
     def __post_init__(self):
         if self.children is None and self.type == FileType.DIRECTORY:
@@ -47,7 +84,7 @@ class VFSNode:
             self.created_time = time.time()
         if self.modified_time is None:
             self.modified_time = time.time()
-        if self.type == FileType.FILE:
+        if self.type == FileType.FILE and self.residency is Residency.RESIDENT:
             if self.is_binary:
                 # Для бинарных файлов в base64, размер в байтах после декодирования
                 try:
@@ -58,23 +95,64 @@ class VFSNode:
             else:
                 self.size = len(self.content.encode('utf-8'))
 
+    def get_content(self) -> str:
+        """Возвращает содержимое файла через глобальный кэш"""
+        if self.type != FileType.FILE:
+            return ""
+        return content_cache.get(self)
+
+    @staticmethod
+    def decode(raw: bytes) -> Tuple[str, bool]:
+        """Преобразует исходные байты в содержимое узла: (текст или base64, бинарный ли файл)"""
+        try:
+            return raw.decode('utf-8'), False
+        except UnicodeDecodeError:
+            return base64.b64encode(raw).decode('ascii'), True
+
+    def materialize(self, raw: bytes):
+        """Заполняет содержимое из исходных байтов (текст или base64)"""
+        self.content, self.is_binary = self.decode(raw)
+        self.size = len(raw)
+
+    def ensure_loaded(self) -> Dict[str, 'VFSNode']:
+        """Загружает детей директории из источника, если это еще не сделано"""
+        if self.children_loader is not None:
+            with _children_load_lock:
+                # Загрузчик сбрасывается только после заполнения, чтобы другие
+                # потоки не увидели директорию наполовину загруженной
+                loader = self.children_loader
+                if loader is not None:
+                    loader(self)
+                    self.children_loader = None
+        return self.children
+
     def add_child(self, child: 'VFSNode') -> bool:
         """Добавляет дочерний узел"""
         if self.type != FileType.DIRECTORY:
             return False
+        self.ensure_loaded()
         if child.name in self.children:
             return False
-        self.children[child.name] = child
+        self.set_child(child)
         self.modified_time = time.time()
         return True
 
+    def set_child(self, child: 'VFSNode'):
+        """Вставляет или заменяет дочерний узел, поддерживая индекс имен"""
+        if self.name_index is not None and child.name not in self.children:
+            insort(self.name_index, child.name)
+        self.children[child.name] = child
+
     def remove_child(self, name: str) -> bool:
         """Удаляет дочерний узел по имени"""
         if self.type != FileType.DIRECTORY:
             return False
+        self.ensure_loaded()
         if name not in self.children:
             return False
         del self.children[name]
+        if self.name_index is not None:
+            del self.name_index[bisect_left(self.name_index, name)]
         self.modified_time = time.time()
         return True
 
@@ -82,13 +160,35 @@ class VFSNode:
         """Возвращает дочерний узел по имени"""
         if self.type != FileType.DIRECTORY:
             return None
-        return self.children.get(name)
+        return self.ensure_loaded().get(name)
+
+    def sorted_names(self) -> List[str]:
+        """Возвращает имена детей в отсортированном порядке (индекс строится один раз)"""
+        if self.type != FileType.DIRECTORY:
+            return []
+        children = self.ensure_loaded()
+        if self.name_index is None:
+            self.name_index = sorted(children)
+        return self.name_index
+
+    def names_with_prefix(self, prefix: str) -> List[str]:
+        """Возвращает отсортированные имена детей с префиксом за O(log n + k)"""
+        names = self.sorted_names()
+        if not prefix:
+            return list(names)
+        result = []
+        for index in range(bisect_left(names, prefix), len(names)):
+            name = names[index]
+            if not name.startswith(prefix):
+                break
+            result.append(name)
+        return result
 
     def list_children(self) -> list:
         """Возвращает список дочерних узлов"""
         if self.type != FileType.DIRECTORY:
             return []
-        return list(self.children.values())
+        return list(self.ensure_loaded().values())
 
     def get_info(self) -> Dict:
         """Возвращает информацию об узле в виде словаря"""
@@ -103,7 +203,7 @@ class VFSNode:
             'created_time': self.created_time,
             'modified_time': self.modified_time,
             'is_directory': self.type == FileType.DIRECTORY,
-            'children_count': len(self.children) if self.type == FileType.DIRECTORY else 0
+            'children_count': len(self.ensure_loaded()) if self.type == FileType.DIRECTORY else 0
         }
 
     def update_content(self, new_content: str, is_binary: bool = False) -> bool:
@@ -114,6 +214,11 @@ class VFSNode:
         self.content = new_content
         self.is_binary = is_binary
         self.modified_time = time.time()
+        # Содержимое больше не совпадает с архивом, выгружать его нельзя
+        self.loader = None
+        self.opener = None
+        self.compressed_content = None
+        self.residency = Residency.RESIDENT
 
         # Обновляем размер
         if is_binary:
@@ -125,6 +230,7 @@ class VFSNode:
         else:
             self.size = len(new_content.encode('utf-8'))
 
+        content_cache.admit(self)
         return True
 
     def rename(self, new_name: str) -> bool:
@@ -192,19 +298,160 @@ class VFSNode:
         return f"VFSNode(name='{self.name}', type={self.type.value}, size={self.size})"
 
 
-class VirtualFileSystem:
-    """Виртуальная файловая система в памяти, загружаемая из ZIP-архива"""
+class VFSCursor:
+    """Текущая директория одной сессии работы с VFS.
+
+    У каждой сессии (потока) свой курсор, поэтому cd в одной сессии не
+    влияет на разрешение относительных путей в другой. Курсор хранит цепочку
+    узлов от корня, так что '..' и текущий путь вычисляются без поиска по дереву.
+    """
+
+    def __init__(self, vfs: 'VirtualFileSystem'):
+        self.vfs = vfs
+        self.reset()
+
+    def reset(self):
+        """Возвращает курсор в корень VFS"""
+        self.root = self.vfs.root
+        self.chain: List[VFSNode] = [self.root]
+        self.names: List[str] = []
+
+    @property
+    def directory(self) -> VFSNode:
+        return self.chain[-1]
 
-    def __init__(self, vfs_path: str, force_reload: bool = False):
+    def copy(self) -> 'VFSCursor':
+        """Создает независимый курсор в той же директории"""
+        cursor = VFSCursor(self.vfs)
+        cursor.root = self.root
+        cursor.chain = list(self.chain)
+        cursor.names = list(self.names)
+        return cursor
+
+    def resolve_path(self, path: str) -> Optional[VFSNode]:
+        return self.vfs.resolve_path(path, self)
+
+    def list_directory(self, path: str = "") -> List[Dict]:
+        return self.vfs.list_directory(path, self)
+
+    def read_file_content(self, path: str) -> Optional[Union[str, bytes]]:
+        return self.vfs.read_file_content(path, self)
+
+    def open(self, path: str, mode: str = 'rb', buffering: int = -1, encoding: Optional[str] = None,
+             errors: Optional[str] = None, newline: Optional[str] = None):
+        return self.vfs.open(path, mode, buffering, encoding, errors, newline, self)
+
+    def scandir(self, path: str = '.') -> ScandirIterator:
+        return self.vfs.scandir(path, self)
+
+    def write_file(self, path: str, chunks: Iterable[str], append: bool = False) -> bool:
+        return self.vfs.write_file(path, chunks, append, self)
+
+    def change_directory(self, path: str) -> bool:
+        return self.vfs.change_directory(path, self)
+
+    def complete_path(self, text: str) -> List[str]:
+        return self.vfs.complete_path(text, self)
+
+    def get_current_path(self) -> str:
+        return self.vfs.get_current_path(self)
+
+
+class VirtualFileSystem:
+    """Виртуальная файловая система в памяти, загружаемая из ZIP-архива.
+
+    Чтение (resolve_path, list_directory, read_file_content и др.) выполняется
+    под общей блокировкой чтения и может идти из многих потоков одновременно;
+    изменения дерева (write_file, reload_vfs) получают эксклюзивный доступ.
+    Каждый поток должен работать через свой курсор (open_cursor()); методы
+    без курсора используют курсор по умолчанию.
+    """
+
+    def __init__(self, vfs_path: str, force_reload: bool = False, lazy: Optional[bool] = None,
+                 quiet: bool = False, max_memory: Optional[int] = None, spill_dir: Optional[str] = None,
+                 trace_memory: bool = False, layers: Optional[List[str]] = None,
+                 search_index: bool = False, path_filter=None):
         self.vfs_path = vfs_path
+        # Фильтр путей --include/--exclude (см. VFSGlob.PathFilter): отброшенные
+        # записи источника не становятся узлами VFS и никогда не читаются
+        self.path_filter = path_filter
+        # Слои, смонтированные поверх vfs_path (см. Overlay); изменения сессии -
+        # верхний слой в памяти, удаленные в сессии пути запоминаются в whiteouts
+        self.layers: List[str] = list(layers or [])
+        self.whiteouts: Set[str] = set()
+        # В тихом режиме информационные сообщения не выводятся, а ошибки идут в stderr
+        self.quiet = quiet
+        self.lock = ReadWriteLock()
         self.root = VFSNode("/", FileType.DIRECTORY)
-        self.current_directory = self.root
+        # Курсор по умолчанию для однопоточной работы
+        self.cursor = VFSCursor(self)
+
+        # Режим работы с архивами больше памяти (см. OutOfCore): содержимое
+        # читается потоково, крупные файлы сжатых архивов распаковываются
+        # во временную директорию, а индекс узлов при большом числе записей хранится в SQLite
+        self.out_of_core = OutOfCorePolicy.from_limit(max_memory, spill_dir) if max_memory else None
+        self.spill_store = SpillStore(spill_dir) if self.out_of_core else None
+        self.node_index: Optional[SqliteNodeIndex] = None
+
+        # В ленивом режиме содержимое читается из архива только при первом обращении.
+        # По умолчанию ленивый режим включается, если у кэша задан бюджет памяти
+        if self.out_of_core is not None:
+            lazy = True
+        self.lazy = content_cache.budget_bytes is not None if lazy is None else lazy
+        # Источник данных: ZIP, TAR или директория на диске (см. StorageBackends)
+        self.backend: Optional[StorageBackend] = None
+        # Снимок tracemalloc, сделанный после загрузки дерева (для отчета vfs-stats)
+        self.trace_memory = trace_memory
+        self.load_snapshot: Optional[tracemalloc.Snapshot] = None
+        # Результаты проверки CRC: файлы проверяются при первом полном чтении или vfs-verify
+        self.integrity = IntegrityTracker()
+
+        # Колоночная таблица метаданных для find (см. MetadataTable): строится одним
+        # обходом дерева при первом запросе и обновляется при записи и удалении файлов
+        self.metadata: Optional[MetadataTable] = None
+        self._metadata_lock = threading.Lock()
+
+        # Индекс содержимого для команды search (см. SearchIndex), строится в фоне
+        self.content_index: Optional[ContentIndex] = ContentIndex() if search_index else None
 
         # Определяем тип VFS: ZIP архив или память
         self.is_zip_archive = self._check_if_zip_archive(vfs_path)
 
         # Загружаем VFS
         self._load_vfs(force_reload)
+        self._start_content_index()
+
+    @property
+    def current_directory(self) -> VFSNode:
+        """Текущая директория курсора по умолчанию"""
+        return self._cursor(None).directory
+
+    def open_cursor(self) -> VFSCursor:
+        """Создает курсор для новой сессии, начинающийся в корне"""
+        return VFSCursor(self)
+
+    def _cursor(self, cursor: Optional[VFSCursor]) -> VFSCursor:
+        """Возвращает курсор сессии; после перезагрузки или перемонтирования VFS курсор
+        переходит в ту же директорию нового дерева, а если ее больше нет - в корень"""
+        if cursor is None:
+            cursor = self.cursor
+        if cursor.root is not self.root:
+            names = cursor.names
+            cursor.reset()
+            for name in names:
+                child = cursor.directory.get_child(name)
+                if child is None or child.type != FileType.DIRECTORY:
+                    break
+                cursor.chain.append(child)
+                cursor.names.append(name)
+        return cursor
+
+    def _report(self, message: str, error: bool = False):
+        """Выводит сообщение о работе VFS с учетом тихого режима"""
+        if not self.quiet:
+            print(message)
+        elif error:
+            print(message, file=sys.stderr)
 
     def _check_if_zip_archive(self, path: str) -> bool:
         """Проверяет, является ли путь ZIP архивом"""
@@ -213,131 +460,359 @@ class VirtualFileSystem:
             return True
         # Если файл существует, проверяем его сигнатуру
         if os.path.isfile(path):
-            try:
-                with open(path, 'rb') as f:
-                    # Проверяем сигнатуру ZIP файла (первые 4 байта)
-                    signature = f.read(4)
-                    return signature == b'PK\x03\x04'
-            except:
-                return False
+            return is_zip_file(path)
         return False
 
     def _load_vfs(self, force_reload: bool = False):
-        """Загружает VFS из архива или создает пустую"""
-        if self.is_zip_archive:
-            self._load_from_zip(force_reload)
-        else:
-            # Если это не ZIP-архив, создаем пустую VFS в памяти
-            print(f"Создана пустая VFS в памяти (путь: {self.vfs_path})")
-            self._create_empty_vfs()
-
-    def _load_from_zip(self, force_reload: bool = False):
-        """Загружает структуру VFS из ZIP-архива"""
-        if not os.path.exists(self.vfs_path):
-            print(f"ZIP архив '{self.vfs_path}' не найден. Создана пустая VFS.")
+        """Загружает VFS из архива или директории либо создает пустую"""
+        if self.is_zip_archive and not os.path.exists(self.vfs_path):
+            self._report(f"ZIP архив '{self.vfs_path}' не найден. Создана пустая VFS.", error=True)
             self._create_empty_vfs()
             return
 
         try:
-            with zipfile.ZipFile(self.vfs_path, 'r') as zip_ref:
-                # Сначала создаем все директории
-                for file_info in zip_ref.filelist:
-                    if file_info.is_dir():
-                        self._create_directory_structure(file_info.filename)
-
-                # Затем создаем файлы с содержимым
-                for file_info in zip_ref.filelist:
-                    if not file_info.is_dir():
-                        self._create_file_from_zip(zip_ref, file_info)
-
-            print(f"VFS успешно загружена из архива: {self.vfs_path}")
-
+            if self.layers:
+                self.backend = OverlayBackend([self.vfs_path] + self.layers, self.path_filter)
+            else:
+                self.backend = open_backend(self.vfs_path, self.path_filter)
         except zipfile.BadZipFile:
-            print(f"Ошибка: файл '{self.vfs_path}' не является корректным ZIP архивом")
+            self._report(f"Ошибка: файл '{self.vfs_path}' не является корректным ZIP архивом", error=True)
             self._create_empty_vfs()
+            return
         except PermissionError:
-            print(f"Ошибка доступа: нет прав для чтения файла '{self.vfs_path}'")
+            self._report(f"Ошибка доступа: нет прав для чтения файла '{self.vfs_path}'", error=True)
             self._create_empty_vfs()
+            return
         except Exception as e:
-            print(f"Ошибка загрузки VFS из архива: {e}")
+            self._report(f"Ошибка загрузки VFS из архива: {e}", error=True)
+            self._create_empty_vfs()
+            return
+
+        if self.backend is None:
+            # Если это не архив и не директория, создаем пустую VFS в памяти
+            self._report(f"Создана пустая VFS в памяти (путь: {self.vfs_path})")
             self._create_empty_vfs()
+            return
+
+        if not self.trace_memory:
+            self._load_from_backend()
+            return
+
+        # Отслеживаем выделения памяти только на время построения дерева
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            self._load_from_backend()
+            self.load_snapshot = tracemalloc.take_snapshot()
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def _load_from_backend(self):
+        """Строит дерево VFS по записям источника данных"""
+        with tracer.span("load_vfs", "vfs", self.vfs_path):
+            if self.backend.lazy_directories:
+                # Директории сканируются только при первом входе, подключение мгновенное
+                self.root.children_loader = partial(self._load_directory, self.backend.list_dir, '')
+                source = {"image": "образа", "overlay": "слоев"}.get(self.backend.kind, "директории")
+                self._report(f"VFS подключена из {source}: {self.vfs_path}{self._skipped_note()}")
+                return
+
+            try:
+                if self.out_of_core is not None and self.backend.entry_count() > self.out_of_core.index_threshold:
+                    self._load_node_index()
+                    return
+
+                for entry in self.backend.iter_entries():
+                    if entry.is_dir:
+                        self._create_directory_structure(entry.path)
+                    else:
+                        self._create_file_from_entry(entry)
+
+                self._report(f"VFS успешно загружена из архива: {self.vfs_path}{self._skipped_note()}")
+
+            except Exception as e:
+                self._report(f"Ошибка загрузки VFS из архива: {e}", error=True)
+                self.close()
+                self.root = VFSNode("/", FileType.DIRECTORY)
+                self._create_empty_vfs()
+
+    def _skipped_note(self) -> str:
+        """Возвращает пояснение о записях, отброшенных фильтром путей"""
+        if self.path_filter is None:
+            return ""
+        if self.backend.kind in ("directory", "image"):
+            # Директории перечисляются лениво, поэтому записи отбрасываются при входе в них
+            return " (фильтр путей применяется при входе в директории)"
+        return f" (пропущено фильтром записей: {self.backend.skipped})"
+
+    def _load_node_index(self):
+        """Переносит записи архива в индекс SQLite; узлы создаются только для посещенных директорий"""
+        self.node_index = SqliteNodeIndex(os.path.join(self.spill_store.path, "nodes.sqlite"))
+        # Источник не держит свой каталог в памяти, а ищет записи в индексе
+        self.backend.attach_index(self.node_index)
+        self.node_index.build(self.backend.iter_entries())
+        self.root.children_loader = partial(self._load_directory, self.node_index.list_dir, '')
+        self._report(f"VFS подключена из архива: {self.vfs_path} "
+                     f"(записей: {self.node_index.entry_count}, индекс узлов в SQLite){self._skipped_note()}")
+
+    def _load_directory(self, list_dir: Callable[[str], Iterator[EntryInfo]], path: str, node: VFSNode):
+        """Заполняет директорию VFS записями из list_dir (ленивый режим)"""
+        for entry in list_dir(path):
+            if entry.path in self.whiteouts:
+                continue
+            if entry.is_dir:
+                child = self._new_directory_node(entry.name, entry.modified_time)
+                child.children_loader = partial(self._load_directory, list_dir, entry.path)
+            else:
+                child = self._new_file_node(entry, lazy=True)
+            node.set_child(child)
 
     def reload_vfs(self):
         """Перезагружает VFS из архива"""
-        # Очищаем текущую структуру
+        with self.lock.write_lock():
+            # Очищаем текущую структуру
+            self.close()
+            self.root = VFSNode("/", FileType.DIRECTORY)
+            self.cursor.reset()
+            self.integrity.clear()
+            self.whiteouts.clear()
+            self.metadata = None
+
+            # Загружаем заново
+            self._load_vfs(force_reload=True)
+            if self.content_index is not None:
+                self.content_index.reset_session()
+                self._start_content_index()
+
+    def mount(self, path: str):
+        """Монтирует архив или директорию поверх остальных слоев только для чтения"""
+        with self.lock.write_lock():
+            backend = open_backend(path, self.path_filter)
+            if backend is None:
+                raise FileNotFoundError(f"'{path}' не является архивом или директорией")
+            # VFS в памяти целиком становится верхним слоем, включая пустые директории
+            in_memory = self.backend is None
+            if not isinstance(self.backend, OverlayBackend):
+                # Текущий источник становится нижним слоем без повторного открытия
+                overlay = OverlayBackend(path_filter=self.path_filter)
+                if self.backend is not None:
+                    overlay.add_layer(self.vfs_path, self.backend)
+                self.backend = overlay
+            self.backend.add_layer(path, backend)
+            self.layers.append(path)
+            self._remount(keep_directories=in_memory)
+
+    def umount(self, path: str):
+        """Отключает смонтированный слой; остальные слои не перечитываются"""
+        with self.lock.write_lock():
+            target = os.path.abspath(path)
+            if target == os.path.abspath(self.vfs_path):
+                raise ValueError(f"'{path}' - базовый слой VFS, его нельзя отключить")
+            for layer in reversed(self.layers):
+                if os.path.abspath(layer) == target:
+                    break
+            else:
+                raise ValueError(f"слой '{path}' не смонтирован")
+            self.backend.umount(layer)
+            self.layers.remove(layer)
+            self._remount()
+
+    def layer_paths(self) -> List[str]:
+        """Возвращает пути слоев сверху вниз"""
+        if isinstance(self.backend, OverlayBackend):
+            return [layer.path for layer in reversed(self.backend.layers)]
+        return [self.vfs_path] if self.backend is not None else []
+
+    def _remount(self, keep_directories: bool = False):
+        """Перестраивает дерево над новым стеком слоев, сохраняя файлы, измененные в сессии
+        (а при keep_directories - и все директории).
+
+        Директории нового дерева загружаются лениво, поэтому перестройка
+        не зависит от размера слоев.
+        """
+        session_files = []
+        session_directories = []
+        stack = [((), self.root)]
+        while stack:
+            components, directory = stack.pop()
+            if directory.children_loader is not None:
+                continue
+            for name, child in directory.children.items():
+                if child.type == FileType.DIRECTORY:
+                    stack.append((components + (name,), child))
+                    if keep_directories:
+                        session_directories.append((components + (name,), None))
+                elif child.loader is None:
+                    session_files.append((components + (name,), child))
+
+        if self.node_index is not None:
+            self.node_index.close()
+            self.node_index = None
         self.root = VFSNode("/", FileType.DIRECTORY)
-        self.current_directory = self.root
+        self.root.children_loader = partial(self._load_directory, self.backend.list_dir, '')
+        self.metadata = None
+
+        for components, node in session_directories + session_files:
+            parent = self.root
+            for name in components[:len(components) - (node is not None)]:
+                child = parent.get_child(name)
+                if child is None or child.type != FileType.DIRECTORY:
+                    child = self._create_node(name, FileType.DIRECTORY, parent)
+                parent = child
+            if node is not None:
+                # Директория загружается до вставки, иначе загрузка перезапишет файл сессии
+                parent.ensure_loaded()
+                parent.set_child(node)
+        # Индекс источника перестраивается, изменения сессии в нем сохраняются
+        self._start_content_index()
+
+    def session_changes(self) -> Tuple[List[str], List[str]]:
+        """Возвращает пути файлов, записанных в сессии, и пути удаленных файлов"""
+        with self.lock.read_lock():
+            return [path for path, _ in self._session_files()], sorted(self.whiteouts)
+
+    def _session_files(self) -> Iterator[Tuple[str, VFSNode]]:
+        """Перечисляет файлы, записанные в сессии: (путь, узел), без захвата блокировки.
+        Незагруженные директории не обходятся: изменить их содержимое без загрузки нельзя"""
+        stack = [('', self.root)]
+        while stack:
+            directory_path, directory = stack.pop()
+            if directory.children_loader is not None:
+                continue
+            for name in reversed(directory.sorted_names()):
+                child = directory.children[name]
+                child_path = f"{directory_path}/{name}" if directory_path else name
+                if child.type == FileType.DIRECTORY:
+                    stack.append((child_path, child))
+                elif child.loader is None:
+                    yield child_path, child
+
+    def _start_content_index(self):
+        """Запускает построение индекса содержимого по текущему источнику.
+        Индекс архива или образа сохраняется рядом с ним и используется повторно"""
+        index = self.content_index
+        if index is None:
+            return
+        if self.backend is not None and self.backend.kind in ("zip", "tar", "image"):
+            index.persist_path = self.vfs_path + INDEX_SUFFIX
+            index.source_stamp = ContentIndex.stamp(self.vfs_path)
+        else:
+            index.persist_path = None
+            index.source_stamp = None
+        index.start(self._index_source)
+
+    def _index_source(self) -> Iterator[tuple]:
+        """Перечисляет файлы источника для индексации: (путь, функция чтения байтов)"""
+        backend = self.backend
+        if backend is not None:
+            for entry in backend.iter_entries():
+                if not entry.is_dir:
+                    yield entry.path, partial(backend.read, entry.path)
+            return
+
+        # VFS в памяти: содержимое берется из узлов
+        files = []
+        with self.lock.read_lock():
+            stack = [((), self.root)]
+            while stack:
+                components, directory = stack.pop()
+                for name, child in directory.ensure_loaded().items():
+                    if child.type == FileType.DIRECTORY:
+                        stack.append((components + (name,), child))
+                    elif not child.is_binary:
+                        files.append(('/'.join(components + (name,)), child))
+        for path, node in files:
+            yield path, lambda node=node: node.get_content().encode('utf-8')
+
+    def wait_index_saved(self):
+        """Дожидается сохранения индекса содержимого на диск перед выходом"""
+        if self.content_index is not None:
+            self.content_index.wait_saved()
+
+    def close(self):
+        """Закрывает источник данных, индекс узлов и удаляет временные файлы"""
+        if self.node_index is not None:
+            self.node_index.close()
+            self.node_index = None
+        if self.spill_store is not None:
+            self.spill_store.close()
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
+
+    def _new_directory_node(self, name: str, modified_time: Optional[float] = None) -> VFSNode:
+        """Создает узел директории из источника данных"""
+        return VFSNode(
+            name=name,
+            type=FileType.DIRECTORY,
+            owner="user",
+            group="user",
+            permissions="rwxr-xr-x",
+            modified_time=modified_time
+        )
 
-        # Загружаем заново
-        self._load_from_zip(force_reload=True)
+    def _new_file_node(self, entry: EntryInfo, lazy: bool) -> VFSNode:
+        """Создает узел файла; в ленивом режиме содержимое читается при первом обращении"""
+        loader = partial(checked_read, self.backend, self.integrity, entry.path)
+        opener = partial(checked_open, self.backend, self.integrity, entry.path)
+        if lazy:
+            return VFSNode(
+                name=entry.name,
+                type=FileType.FILE,
+                owner="user",
+                group="user",
+                permissions="rw-r--r--",
+                size=entry.size,
+                modified_time=entry.modified_time,
+                residency=Residency.EVICTED,
+                loader=loader,
+                opener=opener
+            )
+
+        # Создаем узел файла; текст сохраняется как есть, бинарные данные в base64
+        node = VFSNode(
+            name=entry.name,
+            type=FileType.FILE,
+            owner="user",
+            group="user",
+            permissions="rw-r--r--",
+            modified_time=entry.modified_time,
+            loader=loader,
+            opener=opener
+        )
+        node.materialize(loader())
+        content_cache.admit(node)
+        return node
 
-    def _create_directory_structure(self, zip_path: str):
-        """Создает структуру директорий из пути в ZIP"""
+    def _create_directory_structure(self, zip_path: str) -> VFSNode:
+        """Создает структуру директорий из пути в архиве и возвращает последнюю директорию"""
         components = self._normalize_zip_path(zip_path)
-        if not components:
-            return
 
         current_node = self.root
         for component in components:
+            if current_node.type != FileType.DIRECTORY:
+                break
             if component not in current_node.children:
-                node = VFSNode(
-                    name=component,
-                    type=FileType.DIRECTORY,
-                    owner="user",
-                    group="user",
-                    permissions="rwxr-xr-x"
-                )
-                current_node.children[component] = node
+                current_node.set_child(self._new_directory_node(component))
             current_node = current_node.children[component]
+        return current_node
 
-    def _create_file_from_zip(self, zip_ref: zipfile.ZipFile, file_info: zipfile.ZipInfo):
-        """Создает файл в VFS из ZIP архива"""
+    def _create_file_from_entry(self, entry: EntryInfo):
+        """Создает файл в VFS по записи архива (недостающие директории создаются)"""
         try:
-            components = self._normalize_zip_path(file_info.filename)
-            if not components:
+            parent_path, _, filename = entry.path.rpartition('/')
+            parent_node = self._create_directory_structure(parent_path)
+            if parent_node.type != FileType.DIRECTORY:
+                self._report(f"Предупреждение: не найдена родительская директория для {entry.path}",
+                             error=True)
                 return
 
-            filename = components[-1]
-            parent_components = components[:-1]
-
-            # Находим родительскую директорию
-            parent_node = self.root
-            for component in parent_components:
-                if component in parent_node.children:
-                    parent_node = parent_node.children[component]
-                else:
-                    print(f"Предупреждение: не найдена родительская директория для {file_info.filename}")
-                    return
-
-            # Читаем содержимое файла
-            with zip_ref.open(file_info.filename) as file:
-                content = file.read()
-
-                # Для текстовых файлов пробуем декодировать как текст
-                try:
-                    # Пробуем UTF-8
-                    text_content = content.decode('utf-8')
-                    is_binary = False
-                except UnicodeDecodeError:
-                    # Если не UTF-8, кодируем в base64
-                    text_content = base64.b64encode(content).decode('ascii')
-                    is_binary = True
-
-                # Создаем узел файла
-                node = VFSNode(
-                    name=filename,
-                    type=FileType.FILE,
-                    content=text_content,
-                    owner="user",
-                    group="user",
-                    permissions="rw-r--r--",
-                    size=len(content),
-                    is_binary=is_binary  # Добавляем флаг бинарного файла
-                )
-                parent_node.children[filename] = node
+            parent_node.set_child(self._new_file_node(entry, lazy=self.lazy))
 
         except Exception as e:
-            print(f"Ошибка создания файла {file_info.filename}: {e}")
+            self._report(f"Ошибка создания файла {entry.path}: {e}", error=True)
 
     def create_default_vfs_archive(archive_path: str = "default_vfs.zip"):
         """Создает VFS архив по умолчанию"""
@@ -407,9 +882,8 @@ class VirtualFileSystem:
         """Создает минимальную структуру VFS"""
         home_dir = VFSNode("home", FileType.DIRECTORY)
         user_dir = VFSNode("user", FileType.DIRECTORY)
-        home_dir.children["user"] = user_dir
-        self.root.children["home"] = home_dir
-        self.current_directory = self.root  # Устанавливаем текущую директорию в корень
+        home_dir.set_child(user_dir)
+        self.root.set_child(home_dir)
 
     def _create_node(self, name: str, node_type: FileType, parent: VFSNode, content: str = "") -> VFSNode:
         """Создает новый узел в VFS"""
@@ -421,143 +895,400 @@ class VirtualFileSystem:
             group="user",
             permissions="rw-r--r--" if node_type == FileType.FILE else "rwxr-xr-x"
         )
-        parent.children[name] = node
+        parent.set_child(node)
         return node
 
-    def read_file_content(self, path: str) -> Optional[Union[str, bytes]]:
+    def read_file_content(self, path: str, cursor: Optional[VFSCursor] = None) -> Optional[Union[str, bytes]]:
         """Читает содержимое файла, возвращает текст или бинарные данные"""
-        node = self.resolve_path(path)
+        with self.lock.read_lock():
+            node = self._resolve(path, cursor)
 
-        if not node or node.type != FileType.FILE:
-            return None
+            if not node or node.type != FileType.FILE:
+                return None
 
-        if node.is_binary:
+            if node.residency is Residency.EVICTED and node.opener is not None and self.backend.zero_copy:
+                # Образ отображен в память и разделяется процессами: содержимое
+                # декодируется прямо из отображения и не попадает в кэш
+                with self.backend.view('/'.join(self._resolve_chain(path, cursor)[1])) as view:
+                    try:
+                        return str(view, 'utf-8')
+                    except UnicodeDecodeError:
+                        return view.tobytes()
+
+            content = node.get_content()
+            is_binary = node.is_binary
+
+        if is_binary:
             # Декодируем base64 обратно в бинарные данные
             try:
-                return base64.b64decode(node.content)
+                return base64.b64decode(content)
             except Exception as e:
-                print(f"Ошибка декодирования бинарного файла: {e}")
+                self._report(f"Ошибка декодирования бинарного файла: {e}", error=True)
                 return None
         else:
-            return node.content
-
-    def get_file_info(self, path: str) -> Optional[Dict]:
-        """Возвращает информацию о файле"""
-        node = self.resolve_path(path)
+            return content
 
-        if not node:
+    def verify(self, workers: Optional[int] = None, force: bool = False) -> Optional[VerifyReport]:
+        """Проверяет целостность всех файлов источника в пуле потоков.
+        Файлы, уже прочитанные целиком, повторно не проверяются (если не задан force)"""
+        if self.backend is None:
             return None
+        paths = [entry.path for entry in self.backend.iter_entries() if not entry.is_dir]
+        return verify_members(self.backend, self.integrity, paths, workers, force)
+
+    def open_stream(self, path: str, cursor: Optional[VFSCursor] = None) -> Optional[BinaryIO]:
+        """Открывает файл VFS как поток байтов.
+
+        Файл, которого нет в памяти, читается прямо из источника. Крупные файлы
+        сжатых TAR-архивов в режиме out-of-core один раз распаковываются
+        во временную директорию, чтобы не распаковывать архив заново при каждом чтении.
+        """
+        with self.lock.read_lock():
+            node = self._resolve(path, cursor)
+            if not node or node.type != FileType.FILE:
+                return None
 
-        return {
-            'name': node.name,
-            'type': node.type.value,
-            'permissions': node.permissions,
-            'owner': node.owner,
-            'group': node.group,
-            'size': node.size,
-            'is_binary': node.is_binary,
-            'modified_time': node.modified_time,
-            'created_time': node.created_time
-        }
+            if node.residency is not Residency.RESIDENT and node.opener is not None:
+                if self.backend.seekable_members:
+                    return node.opener()
+                if self.spill_store is not None and node.size > self.out_of_core.spill_threshold:
+                    key = '/'.join(self._resolve_chain(path, cursor)[1])
+                    return self.spill_store.open(key, node.opener)
 
-    def get_current_path(self) -> str:
-        """Возвращает текущий путь в VFS"""
-        if self.current_directory == self.root:
-            return "/"
-
-        # Собираем путь от корня до текущей директории
-        path_components = []
-        current = self.current_directory
-
-        while current != self.root:
-            # Находим родителя текущего узла
-            parent = self._find_parent(self.root, current)
-            if parent:
-                # Находим имя текущего узла в родителе
-                for name, node in parent.children.items():
-                    if node == current:
-                        path_components.append(name)
-                        break
-                current = parent
-            else:
-                break
+            content = self.read_file_content(path, cursor)
+        if content is None:
+            return None
+        return io.BytesIO(content if isinstance(content, bytes) else content.encode('utf-8'))
+
+    def open(self, path: str, mode: str = 'rb', buffering: int = -1, encoding: Optional[str] = None,
+             errors: Optional[str] = None, newline: Optional[str] = None,
+             cursor: Optional[VFSCursor] = None):
+        """Открывает файл VFS для чтения, как встроенная open().
+
+        'rb' возвращает io.BufferedReader (при buffering=0 - VFSFileIO),
+        'r' - io.TextIOWrapper (по умолчанию в UTF-8). Содержимое читается
+        потоком из источника, поэтому память не зависит от размера файла.
+        Запись через файловый объект не поддерживается (см. write_file).
+        """
+        if mode not in ('r', 'rt', 'tr', 'rb', 'br'):
+            raise ValueError(f"режим '{mode}' не поддерживается: файлы VFS открываются только для чтения")
+        binary = 'b' in mode
+        if binary and (encoding is not None or errors is not None or newline is not None):
+            raise ValueError("в двоичном режиме encoding, errors и newline не задаются")
+        if buffering == 0 and not binary:
+            raise ValueError("без буферизации можно открыть только двоичный файл")
+
+        node = self.resolve_path(path, cursor)
+        if node is not None and node.type == FileType.DIRECTORY:
+            raise IsADirectoryError(errno.EISDIR, "Это каталог", path)
+        stream = self.open_stream(path, cursor) if node is not None else None
+        if stream is None:
+            raise FileNotFoundError(errno.ENOENT, "Нет такого файла или каталога", path)
+
+        raw = VFSFileIO(stream, path)
+        if buffering == 0:
+            return raw
+        buffered = io.BufferedReader(raw, buffering if buffering > 1 else io.DEFAULT_BUFFER_SIZE)
+        if binary:
+            return buffered
+        return io.TextIOWrapper(buffered, encoding or 'utf-8', errors, newline)
+
+    def scandir(self, path: str = '.', cursor: Optional[VFSCursor] = None) -> ScandirIterator:
+        """Перечисляет директорию, как os.scandir: записи VFSDirEntry с метаданными,
+        снятыми под блокировкой чтения (согласованный снимок директории)"""
+        with self.lock.read_lock():
+            node = self._resolve(path, cursor)
+            if node is None:
+                raise FileNotFoundError(errno.ENOENT, "Нет такого файла или каталога", path)
+            if node.type != FileType.DIRECTORY:
+                raise NotADirectoryError(errno.ENOTDIR, "Это не каталог", path)
+
+            prefix = path if path.endswith('/') else path + '/'
+            children = node.children
+            entries = []
+            for name in node.sorted_names():
+                child = children[name]
+                entries.append(VFSDirEntry(name, prefix + name, child.type == FileType.DIRECTORY,
+                                           child.size, child.modified_time, child.created_time,
+                                           child.permissions))
+        return ScandirIterator(entries)
+
+    def write_file(self, path: str, chunks: Iterable[str], append: bool = False,
+                   cursor: Optional[VFSCursor] = None) -> bool:
+        """Записывает текстовые фрагменты в файл VFS, создавая его при необходимости"""
+        components = self.get_absolute_path(path)
+        if not components or components[-1] in ('.', '..'):
+            return False
 
-        return "/" + "/".join(reversed(path_components))
+        parent_path = ('/' if path.startswith('/') else '') + '/'.join(components[:-1])
+        name = components[-1]
+        parent = self.resolve_path(parent_path, cursor)
+        if not parent or parent.type != FileType.DIRECTORY:
+            return False
 
-    def _find_parent(self, current: VFSNode, target: VFSNode) -> Optional[VFSNode]:
-        """Рекурсивно ищет родительскую директорию для целевого узла"""
-        for child in current.children.values():
-            if child == target:
-                return current
-            if child.type == FileType.DIRECTORY:
-                found = self._find_parent(child, target)
-                if found:
-                    return found
-        return None
+        # Фрагменты могут приходить из конвейера, который читает эту же VFS,
+        # поэтому они собираются до захвата блокировки записи
+        buffer = io.StringIO()
+        for chunk in chunks:
+            buffer.write(chunk)
 
-    def resolve_path(self, path: str) -> Optional[VFSNode]:
-        """Разрешает путь и возвращает соответствующий узел"""
-        if not path or path == '.':
-            return self.current_directory
+        with self.lock.write_lock():
+            parent = self._resolve(parent_path, cursor)
+            if not parent or parent.type != FileType.DIRECTORY:
+                return False
 
-        if path == '..':
-            parent = self._find_parent(self.root, self.current_directory)
-            return parent or self.current_directory
+            node = parent.get_child(name)
+            if node is not None and node.type != FileType.FILE:
+                return False
 
-        components = self.get_absolute_path(path)
-        current_node = self.current_directory if not path.startswith('/') else self.root
+            content = buffer.getvalue()
+            is_binary = False
+            if append and node is not None:
+                # Флаг is_binary ленивого узла известен только после загрузки содержимого
+                existing = node.get_content()
+                is_binary = node.is_binary
+                if is_binary:
+                    content = base64.b64encode(base64.b64decode(existing) + content.encode('utf-8')).decode('ascii')
+                else:
+                    content = existing + content
 
-        for component in components:
-            if component == '..':
-                current_node = self._find_parent(self.root, current_node) or current_node
-            elif component == '.':
-                continue
-            elif component in current_node.children:
-                current_node = current_node.children[component]
-            else:
-                return None  # Путь не найден
+            key = '/'.join(self._resolve_chain(parent_path, cursor)[1] + [name])
+            if node is None:
+                node = self._create_node(name, FileType.FILE, parent)
+                self.whiteouts.discard(key)
+            if not node.update_content(content, is_binary):
+                return False
+            if self.content_index is not None:
+                # Бинарные файлы не индексируются, как и при построении индекса
+                self.content_index.update(key, None if is_binary else content)
+            if self.metadata is not None:
+                self.metadata.update(key.split('/'), node.size, node.modified_time)
+            return True
 
-        return current_node
+    def remove_file(self, path: str, cursor: Optional[VFSCursor] = None) -> bool:
+        """Удаляет файл; путь запоминается, чтобы файл не появился из слоев при перемонтировании"""
+        with self.lock.write_lock():
+            chain, names = self._resolve_chain(path, cursor)
+            if not chain or len(chain) < 2 or chain[-1].type != FileType.FILE:
+                return False
+            chain[-2].remove_child(names[-1])
+            self.whiteouts.add('/'.join(names))
+            if self.content_index is not None:
+                self.content_index.update('/'.join(names), None)
+            if self.metadata is not None:
+                self.metadata.remove(names)
+            return True
 
-    def get_absolute_path(self, path: str) -> List[str]:
-        """Преобразует путь в список компонентов"""
-        if path.startswith('/'):
-            components = path.split('/')[1:]
-        else:
-            components = path.split('/')
-        return [comp for comp in components if comp]  # Убираем пустые компоненты
+    def search_candidates(self, query: str, path: str = "/",
+                          cursor: Optional[VFSCursor] = None) -> Optional[List[str]]:
+        """Возвращает пути файлов в директории path, которые могут содержать query,
+        или None, если path не является директорией.
+        Пока индекс не готов (или не включен), возвращаются все текстовые файлы директории"""
+        with self.lock.read_lock():
+            chain, names = self._resolve_chain(path, cursor)
+            if not chain or chain[-1].type != FileType.DIRECTORY:
+                return None
+            prefix = '/'.join(names)
+
+            candidates = self.content_index.candidates(query) if self.content_index is not None else None
+            if candidates is not None:
+                if prefix:
+                    candidates = [c for c in candidates if c.startswith(prefix + '/')]
+                return ['/' + c for c in candidates]
+
+            files = []
+            stack = [(prefix, chain[-1])]
+            while stack:
+                directory_path, directory = stack.pop()
+                for name in reversed(directory.sorted_names()):
+                    child = directory.children[name]
+                    child_path = f"{directory_path}/{name}" if directory_path else name
+                    if child.type == FileType.DIRECTORY:
+                        stack.append((child_path, child))
+                    elif not child.is_binary:
+                        files.append('/' + child_path)
+            return sorted(files)
+
+    def _metadata_table(self) -> MetadataTable:
+        """Возвращает таблицу метаданных, строя ее при первом запросе (под блокировкой чтения)"""
+        with self._metadata_lock:
+            if self.metadata is None:
+                if self.backend is not None and (self.backend.lazy_directories or self.node_index is not None):
+                    # Незагруженные директории не загружаются ради find: таблица строится
+                    # по записям источника, файлы сессии заменяют записи с тем же путем
+                    session = [EntryInfo(path, False, node.size, node.modified_time)
+                               for path, node in self._session_files()]
+                    self.metadata = MetadataTable.from_entries(chain(self.backend.iter_entries(), session),
+                                                               self.root.modified_time, self.whiteouts)
+                else:
+                    self.metadata = MetadataTable.from_tree(self.root)
+            return self.metadata
+
+    def find(self, path: str, query: MetadataQuery, largest: Optional[int] = None,
+             cursor: Optional[VFSCursor] = None) -> Optional[List[tuple]]:
+        """Находит узлы поддерева path по условиям query; largest - только N наибольших
+        по размеру. Возвращает (путь относительно path, является ли директорией, размер)
+        или None, если path не существует"""
+        with self.lock.read_lock():
+            chain, names = self._resolve_chain(path, cursor)
+            if not chain:
+                return None
+            table = self._metadata_table()
+            start = table.row_of(names)
+            if start is None:
+                return None
+            rows = table.select(start, query)
+            if largest is not None:
+                rows = table.largest(rows, largest)
+            prefix = len(table.path(start))
+            result = []
+            for row in rows:
+                relative = table.path(row)[prefix:].lstrip('/') if row != start else ''
+                result.append((relative, table.type[row] == ROW_DIRECTORY, table.size[row]))
+            return result
+
+    def find_summary(self, path: str, query: MetadataQuery,
+                     cursor: Optional[VFSCursor] = None) -> Optional[Dict]:
+        """Возвращает число и суммарный размер узлов поддерева path, подходящих под query"""
+        with self.lock.read_lock():
+            chain, names = self._resolve_chain(path, cursor)
+            if not chain:
+                return None
+            table = self._metadata_table()
+            start = table.row_of(names)
+            if start is None:
+                return None
+            return table.summary(table.select(start, query))
 
-    def list_directory(self, path: str = "") -> List[Dict]:
-        """Возвращает список файлов и директорий по указанному пути"""
-        target_node = self.resolve_path(path) if path else self.current_directory
+    def get_file_info(self, path: str, cursor: Optional[VFSCursor] = None) -> Optional[Dict]:
+        """Возвращает информацию о файле"""
+        with self.lock.read_lock():
+            node = self._resolve(path, cursor)
 
-        if not target_node or target_node.type != FileType.DIRECTORY:
-            return []
+            if not node:
+                return None
 
-        entries = []
-        for name, node in target_node.children.items():
-            entries.append({
-                'name': name,
+            return {
+                'name': node.name,
                 'type': node.type.value,
                 'permissions': node.permissions,
                 'owner': node.owner,
                 'group': node.group,
                 'size': node.size,
+                'is_binary': node.is_binary,
                 'modified_time': node.modified_time,
-                'node': node  # Добавляем ссылку на узел для простого доступа
-            })
+                'created_time': node.created_time
+            }
 
-        return entries
+    def get_current_path(self, cursor: Optional[VFSCursor] = None) -> str:
+        """Возвращает текущий путь в VFS"""
+        return "/" + "/".join(self._cursor(cursor).names)
+
+    def _resolve_chain(self, path: str, cursor: Optional[VFSCursor] = None):
+        """Разрешает путь в цепочку узлов от корня и имена компонентов.
+        Возвращает (None, None), если путь не найден"""
+        with tracer.span("resolve_path", "vfs", path):
+            if path.startswith('/'):
+                chain, names = [self.root], []
+            else:
+                cursor = self._cursor(cursor)
+                chain, names = list(cursor.chain), list(cursor.names)
+
+            for component in self.get_absolute_path(path):
+                if component == '..':
+                    # Выше корня подняться нельзя
+                    if len(chain) > 1:
+                        chain.pop()
+                        names.pop()
+                elif component == '.':
+                    continue
+                else:
+                    current_node = chain[-1]
+                    if current_node.type != FileType.DIRECTORY:
+                        return None, None
+                    child = current_node.ensure_loaded().get(component)
+                    if child is None:
+                        return None, None  # Путь не найден
+                    chain.append(child)
+                    names.append(component)
+
+            return chain, names
+
+    def _resolve(self, path: str, cursor: Optional[VFSCursor] = None) -> Optional[VFSNode]:
+        """Разрешает путь без захвата блокировки"""
+        if not path or path == '.':
+            return self._cursor(cursor).directory
+        chain, _ = self._resolve_chain(path, cursor)
+        return chain[-1] if chain else None
 
-    def change_directory(self, path: str) -> bool:
-        """Изменяет текущую директорию"""
-        target_node = self.resolve_path(path)
+    def resolve_path(self, path: str, cursor: Optional[VFSCursor] = None) -> Optional[VFSNode]:
+        """Разрешает путь и возвращает соответствующий узел"""
+        with self.lock.read_lock():
+            return self._resolve(path, cursor)
 
-        if not target_node:
+    def get_absolute_path(self, path: str) -> List[str]:
+        """Преобразует путь в список компонентов"""
+        if path.startswith('/'):
+            components = path.split('/')[1:]
+        else:
+            components = path.split('/')
+        return [comp for comp in components if comp]  # Убираем пустые компоненты
+
+    def list_directory(self, path: str = "", cursor: Optional[VFSCursor] = None) -> List[Dict]:
+        """Возвращает список файлов и директорий по указанному пути"""
+        with self.lock.read_lock():
+            target_node = self._resolve(path, cursor)
+
+            if not target_node or target_node.type != FileType.DIRECTORY:
+                return []
+
+            # Имена берутся из отсортированного индекса, сортировка при каждом вызове не нужна
+            children = target_node.children
+            entries = []
+            for name in target_node.sorted_names():
+                node = children[name]
+                entries.append({
+                    'name': name,
+                    'type': node.type.value,
+                    'permissions': node.permissions,
+                    'owner': node.owner,
+                    'group': node.group,
+                    'size': node.size,
+                    'modified_time': node.modified_time,
+                    'node': node  # Добавляем ссылку на узел для простого доступа
+                })
+
+            return entries
+
+    def complete_path(self, text: str, cursor: Optional[VFSCursor] = None) -> List[str]:
+        """Возвращает варианты дополнения пути text (директории - с '/' на конце)"""
+        directory, slash, prefix = text.rpartition('/')
+        base = directory + slash
+        with self.lock.read_lock():
+            node = self._resolve(base or '.', cursor) if directory or not slash else self.root
+            if node is None or node.type != FileType.DIRECTORY:
+                return []
+            matches = []
+            for name in node.names_with_prefix(prefix):
+                # Скрытые файлы предлагаются, только если префикс начинается с точки
+                if name.startswith('.') and not prefix.startswith('.'):
+                    continue
+                child = node.children[name]
+                matches.append(base + name + ('/' if child.type == FileType.DIRECTORY else ''))
+            return matches
+
+    def change_directory(self, path: str, cursor: Optional[VFSCursor] = None) -> bool:
+        """Изменяет текущую директорию курсора"""
+        with self.lock.read_lock():
+            chain, names = self._resolve_chain(path, cursor)
+
+        if not chain:
             return False
 
-        if target_node.type != FileType.DIRECTORY:
+        if chain[-1].type != FileType.DIRECTORY:
             return False
 
-        self.current_directory = target_node
-        return True
\ No newline at end of file
+        cursor = self._cursor(cursor)
+        cursor.chain = chain
+        cursor.names = names
+        return True
@@ -0,0 +1,158 @@
+import io
+import os
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Ошибки чтения, означающие поврежденный файл в источнике
+INTEGRITY_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError, tarfile.TarError, OSError)
+
+VERIFY_BUFFER_SIZE = 64 * 1024
+
+
+@dataclass
+class VerifyReport:
+    """Итог проверки целостности"""
+    checked: int = 0
+    checked_bytes: int = 0
+    skipped: int = 0                 # Файлы, уже проверенные ранее (при загрузке или чтении)
+    elapsed: float = 0.0
+    corrupt: Dict[str, str] = field(default_factory=dict)
+
+
+class IntegrityTracker:
+    """Результаты проверки файлов источника: проверенные и поврежденные пути.
+
+    Файл считается проверенным после первого полного чтения (zipfile
+    сверяет CRC32 в конце файла), поэтому при ленивой загрузке проверка
+    распределяется по первым обращениям и не требует отдельного прохода.
+    """
+
+    def __init__(self):
+        self.verified = set()
+        self.corrupt: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def mark_ok(self, path: str):
+        with self._lock:
+            self.verified.add(path)
+            self.corrupt.pop(path, None)
+
+    def mark_corrupt(self, path: str, error: Exception):
+        with self._lock:
+            self.verified.add(path)
+            self.corrupt[path] = str(error) or type(error).__name__
+
+    def is_verified(self, path: str) -> bool:
+        return path in self.verified
+
+    def clear(self):
+        with self._lock:
+            self.verified.clear()
+            self.corrupt.clear()
+
+
+def checked_read(backend, tracker: IntegrityTracker, path: str) -> bytes:
+    """Читает файл из источника, отмечая результат проверки CRC"""
+    try:
+        data = backend.read(path)
+    except INTEGRITY_ERRORS as e:
+        tracker.mark_corrupt(path, e)
+        raise
+    tracker.mark_ok(path)
+    return data
+
+
+class CheckedStream(io.RawIOBase):
+    """Поток файла из источника, отмечающий результат проверки CRC при чтении до конца"""
+
+    def __init__(self, stream, tracker: IntegrityTracker, path: str):
+        super().__init__()
+        self._stream = stream
+        self._tracker = tracker
+        self._path = path
+        # После перехода по смещению чтение до конца уже не означает проверку всего файла
+        self._seeked = False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return self._stream.seekable()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._seeked = True
+        try:
+            return self._stream.seek(offset, whence)
+        except INTEGRITY_ERRORS as e:
+            self._tracker.mark_corrupt(self._path, e)
+            raise
+
+    def tell(self) -> int:
+        return self._stream.tell()
+
+    def readinto(self, buffer) -> int:
+        try:
+            count = self._stream.readinto(buffer)
+        except INTEGRITY_ERRORS as e:
+            self._tracker.mark_corrupt(self._path, e)
+            raise
+        if count == 0 and not self._seeked:
+            self._tracker.mark_ok(self._path)
+        return count
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+def checked_open(backend, tracker: IntegrityTracker, path: str) -> io.BufferedReader:
+    """Открывает файл из источника как поток с проверкой CRC при первом полном чтении"""
+    return io.BufferedReader(CheckedStream(backend.open(path), tracker, path), VERIFY_BUFFER_SIZE)
+
+
+def default_workers() -> int:
+    """Число потоков проверки: распаковка zlib и расчет CRC32 отпускают GIL"""
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def verify_members(backend, tracker: IntegrityTracker, paths: List[str],
+                   workers: Optional[int] = None, force: bool = False) -> VerifyReport:
+    """Проверяет файлы источника в пуле потоков и возвращает отчет.
+
+    Уже проверенные файлы пропускаются, если не задан force.
+    """
+    report = VerifyReport()
+    pending = []
+    for path in paths:
+        if not force and tracker.is_verified(path):
+            report.skipped += 1
+        else:
+            pending.append(path)
+
+    def check(path):
+        try:
+            size = backend.verify(path)
+        except INTEGRITY_ERRORS as e:
+            tracker.mark_corrupt(path, e)
+            return 0
+        tracker.mark_ok(path)
+        return size
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as pool:
+        for size in pool.map(check, pending):
+            report.checked += 1
+            report.checked_bytes += size
+    report.elapsed = time.perf_counter() - start
+
+    for path in paths:
+        if path in tracker.corrupt:
+            report.corrupt[path] = tracker.corrupt[path]
+    return report
@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Команды, которые только читают VFS и не меняют текущую директорию: только их
+# можно выполнять в фоне (cmd &). Перенаправление вывода в файл (>) - тоже запись.
+# vfs-export сюда не входит: он пишет файл на диск и держит блокировку чтения VFS
+# все время экспорта, так что запись в VFS из оболочки ждала бы его окончания
+BACKGROUND_SAFE_COMMANDS = frozenset([
+    'ls', 'cat', 'grep', 'head', 'search', 'find', 'pwd', 'echo', 'env',
+    'vfs-stats', 'vfs-verify', 'vfs-diff', 'log-stats',
+])
+
+
+def default_job_workers() -> int:
+    """Число потоков для фоновых заданий: распаковка и чтение источника отпускают GIL"""
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+@dataclass
+class Job:
+    """Фоновое задание: конвейер, курсор на момент запуска и буфер вывода"""
+    number: int
+    command: str
+    stages: list
+    cursor: object
+    output: List[str] = field(default_factory=list)
+    future: Optional[Future] = None
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def status(self) -> Optional[int]:
+        """Код завершения или None, если задание еще выполняется"""
+        if not self.done:
+            return None
+        return 1 if self.future.exception() is not None else self.future.result()
+
+
+class JobTable:
+    """Фоновые задания сессии.
+
+    Задания выполняются в пуле потоков, вывод каждого копится в своем
+    буфере. Буферы выводятся строго в порядке запуска заданий: вывод
+    завершенного задания ждет, пока не будут выведены все начатые раньше.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or default_job_workers()
+        self.jobs: Dict[int, Job] = {}
+        self._next_number = 1
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, command: str, stages: list, cursor, run) -> Job:
+        """Запускает run(job) в пуле и возвращает задание"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        job = Job(self._next_number, command, stages, cursor)
+        self._next_number += 1
+        self.jobs[job.number] = job
+        job.future = self._pool.submit(run, job)
+        return job
+
+    def collect(self) -> List[Job]:
+        """Снимает завершенные задания, вывод которых уже можно показать (по порядку запуска)"""
+        finished = []
+        for number in sorted(self.jobs):
+            job = self.jobs[number]
+            if not job.done:
+                break
+            finished.append(self.jobs.pop(number))
+        if not self.jobs:
+            self._next_number = 1
+        return finished
+
+    def wait(self, numbers: Optional[List[int]] = None):
+        """Ждет завершения указанных заданий (по умолчанию - всех)"""
+        for number in numbers if numbers is not None else sorted(self.jobs):
+            job = self.jobs.get(number)
+            if job is not None:
+                job.future.exception()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -1,38 +1,214 @@
 import csv
+import gzip
+import io
+import os
+import shutil
+import threading
+import time
 from datetime import datetime
+from enum import IntEnum
+
+from Tracer import tracer
+
+
+class LogLevel(IntEnum):
+    """Уровни важности событий лога"""
+    DEBUG = 10      # Служебные события (начало и конец скриптов)
+    INFO = 20       # Успешно выполненные команды
+    WARNING = 30
+    ERROR = 40      # Команды, завершившиеся ошибкой
 
 
 class Logger:
     """Класс для логирования событий в CSV формате"""
 
-    def __init__(self, log_file, username):
+    HEADER = ['timestamp', 'username', 'command', 'arguments', 'error_message']
+    HEADER_SIZE = len(','.join(HEADER)) + 2  # Заголовок и перевод строки \r\n
+
+    def __init__(self, log_file, username, buffered=False, level=LogLevel.DEBUG, sample_rates=None,
+                 max_bytes=None, rotate_interval=None, backup_count=5, compress_rotated=False):
         self.log_file = log_file
         self.username = username
+        # В буферизованном режиме файл сбрасывается на диск только при close()
+        self.buffered = buffered
+        self.level = LogLevel(level)
+        # Доля записываемых успешных событий по имени команды ('*' - для остальных)
+        self.sample_rates = dict(sample_rates or {})
+        # Ротация по размеру (байты) и/или по времени (секунды)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.compress_rotated = compress_rotated
+
+        self.events_written = 0
+        self.dropped_by_level = 0
+        self.dropped_by_sampling = 0
+        self.rotations = 0
+
+        self._file = None
+        self._file_size = 0
+        # Время первой записи текущего файла: от него отсчитывается интервал ротации
+        self._period_start = None
+        self._row_buffer = io.StringIO()
+        self._writer = csv.writer(self._row_buffer)
+        self._sample_credit = {}
+        self._last_second = None
+        self._last_timestamp = ""
+        # Один логгер может использоваться несколькими сессиями из разных потоков
+        self._lock = threading.Lock()
         self._ensure_log_directory()
         self._init_log_file()
 
     def _ensure_log_directory(self):
         """Создает директорию для лог-файла если нужно"""
-        import os
         log_dir = os.path.dirname(self.log_file)
         if log_dir:
             os.makedirs(log_dir, exist_ok=True)
 
     def _init_log_file(self):
         """Инициализирует лог-файл с заголовками CSV"""
-        import os
         if not os.path.exists(self.log_file):
             with open(self.log_file, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
-                writer.writerow(['timestamp', 'username', 'command', 'arguments', 'error_message'])
+                writer.writerow(self.HEADER)
 
-    def log_event(self, command, arguments="", error_message=""):
-        """Логирует событие в CSV файл"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _open(self):
+        """Открывает лог-файл один раз для дозаписи"""
+        if self._file is None:
+            self._file = open(self.log_file, 'ab')
+            self._file_size = self._file.seek(0, os.SEEK_END)
+            if self.rotate_interval is not None:
+                self._period_start = self._first_record_time()
+        return self._file
 
+    def _first_record_time(self):
+        """Возвращает время первой записи лог-файла или None, если записей нет.
+        Интервал ротации отсчитывается от нее, а не от открытия файла, поэтому
+        перезапуски процесса не продлевают жизнь файла"""
         try:
-            with open(self.log_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([timestamp, self.username, command, arguments, error_message])
-        except Exception as e:
-            print(f"Ошибка записи в лог-файл: {e}")
\ No newline at end of file
+            with open(self.log_file, 'r', encoding='utf-8', newline='') as f:
+                f.readline()   # Заголовок
+                first_row = f.readline()
+            return datetime.strptime(first_row[:19], "%Y-%m-%d %H:%M:%S").timestamp()
+        except (OSError, ValueError):
+            return None
+
+    def _timestamp(self):
+        """Возвращает метку времени; строка форматируется не чаще раза в секунду"""
+        second = int(time.time())
+        if second != self._last_second:
+            self._last_second = second
+            self._last_timestamp = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return self._last_timestamp
+
+    def _should_sample(self, command):
+        """Решает, записывать ли успешное событие с учетом доли для команды"""
+        rate = self.sample_rates.get(command, self.sample_rates.get('*'))
+        if rate is None or rate >= 1:
+            return True
+        # Детерминированная выборка: записывается ровно доля rate событий, первое - всегда
+        credit = self._sample_credit.get(command, 1.0) + rate
+        if credit >= 1:
+            self._sample_credit[command] = credit - 1
+            return True
+        self._sample_credit[command] = credit
+        return False
+
+    def log_event(self, command, arguments="", error_message="", level=None):
+        """Логирует событие в CSV файл с учетом уровня, выборки и ротации"""
+        if level is None:
+            level = LogLevel.ERROR if error_message else LogLevel.INFO
+        if level < self.level:
+            self.dropped_by_level += 1
+            return
+        # Ошибки записываются всегда, выборка применяется только к остальным событиям
+        with self._lock:
+            if level < LogLevel.ERROR and self.sample_rates and not self._should_sample(command):
+                self.dropped_by_sampling += 1
+                return
+
+            timestamp = self._timestamp()
+
+            try:
+                self._writer.writerow([timestamp, self.username, command, arguments, error_message])
+                row = self._row_buffer.getvalue().encode('utf-8')
+                self._row_buffer.seek(0)
+                self._row_buffer.truncate()
+
+                if self._needs_rotation(len(row)):
+                    self._rotate()
+
+                self._open().write(row)
+                self._file_size += len(row)
+                if self._period_start is None:
+                    self._period_start = time.time()
+                self.events_written += 1
+                if not self.buffered:
+                    with tracer.span("logger_flush", "logger"):
+                        self._file.flush()
+            except Exception as e:
+                print(f"Ошибка записи в лог-файл: {e}")
+
+    def _needs_rotation(self, incoming):
+        """Проверяет, пора ли начинать новый лог-файл"""
+        if self.max_bytes is None and self.rotate_interval is None:
+            return False
+        self._open()
+        if self.max_bytes is not None and self._file_size + incoming > self.max_bytes:
+            # Не ротируем файл, в котором есть только заголовок
+            return self._file_size > self.HEADER_SIZE
+        if (self.rotate_interval is not None and self._period_start is not None
+                and time.time() - self._period_start >= self.rotate_interval):
+            return True
+        return False
+
+    def _backup_name(self, index):
+        """Имя архивной копии лога с номером index"""
+        name = f"{self.log_file}.{index}"
+        return name + ".gz" if self.compress_rotated else name
+
+    def _rotate(self):
+        """Переименовывает текущий лог в .1 (сдвигая старые копии) и начинает новый"""
+        self.close()
+
+        if self.backup_count > 0:
+            oldest = self._backup_name(self.backup_count)
+            if os.path.exists(oldest):
+                os.remove(oldest)
+            for index in range(self.backup_count - 1, 0, -1):
+                source = self._backup_name(index)
+                if os.path.exists(source):
+                    os.replace(source, self._backup_name(index + 1))
+
+            if self.compress_rotated:
+                with open(self.log_file, 'rb') as source, gzip.open(self._backup_name(1), 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(self.log_file)
+            else:
+                os.replace(self.log_file, self._backup_name(1))
+        else:
+            os.remove(self.log_file)
+
+        self.rotations += 1
+        self._init_log_file()
+
+    def stats(self):
+        """Возвращает счетчики записанных и отброшенных событий"""
+        return {
+            'written': self.events_written,
+            'dropped_by_level': self.dropped_by_level,
+            'dropped_by_sampling': self.dropped_by_sampling,
+            'rotations': self.rotations,
+        }
+
+    def flush(self):
+        """Сбрасывает буфер лог-файла на диск"""
+        if self._file is not None:
+            with tracer.span("logger_flush", "logger"):
+                self._file.flush()
+
+    def close(self):
+        """Закрывает лог-файл"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
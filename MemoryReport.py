@@ -0,0 +1,129 @@
+import heapq
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from ContentCache import Residency
+from FileType import FileType, VFSNode
+
+
+@dataclass
+class MemoryStats:
+    """Учет памяти, занимаемой загруженным деревом VFS"""
+    files: int = 0
+    directories: int = 0
+    unloaded_directories: int = 0     # Ленивые директории, которые еще не открывались
+    binary_files: int = 0
+    logical_bytes: int = 0            # Сумма размеров файлов
+    resident_files: int = 0
+    resident_bytes: int = 0           # Строки содержимого в памяти
+    compressed_files: int = 0
+    compressed_bytes: int = 0         # Содержимое, сжатое кэшем
+    base64_overhead_bytes: int = 0    # Разница между base64-строкой и исходными байтами
+    node_overhead_bytes: int = 0      # Оценка объектов узлов, их атрибутов и словарей детей
+    deepest_path: str = "/"
+    max_depth: int = 0
+    largest_directories: List[Tuple[int, str]] = field(default_factory=list)
+
+
+def _node_overhead(node: VFSNode) -> int:
+    """Оценивает память узла без содержимого файла"""
+    size = sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.name)
+    if node.children is not None:
+        size += sys.getsizeof(node.children)
+    return size
+
+
+def collect_memory_stats(vfs, top: int = 10) -> MemoryStats:
+    """Обходит загруженную часть дерева VFS и собирает статистику памяти.
+
+    Ленивые директории не загружаются, а только подсчитываются, чтобы
+    отчет не менял то, что он измеряет.
+    """
+    stats = MemoryStats()
+    largest = []
+
+    with vfs.lock.read_lock():
+        stack = [(vfs.root, "/", 0)]
+        while stack:
+            node, path, depth = stack.pop()
+            stats.node_overhead_bytes += _node_overhead(node)
+
+            if node.type == FileType.DIRECTORY:
+                stats.directories += 1
+                if node.children_loader is not None:
+                    stats.unloaded_directories += 1
+                    continue
+                count = len(node.children)
+                if len(largest) < top:
+                    heapq.heappush(largest, (count, path))
+                elif count > largest[0][0]:
+                    heapq.heapreplace(largest, (count, path))
+                prefix = path if path.endswith('/') else path + '/'
+                for name, child in node.children.items():
+                    stack.append((child, prefix + name, depth + 1))
+                continue
+
+            stats.files += 1
+            stats.logical_bytes += node.size
+            if depth > stats.max_depth:
+                stats.max_depth = depth
+                stats.deepest_path = path
+            if node.is_binary:
+                stats.binary_files += 1
+
+            if node.residency is Residency.RESIDENT:
+                stats.resident_files += 1
+                stats.resident_bytes += sys.getsizeof(node.content)
+                if node.is_binary:
+                    stats.base64_overhead_bytes += len(node.content) - node.size
+            elif node.residency is Residency.COMPRESSED:
+                stats.compressed_files += 1
+                stats.compressed_bytes += sys.getsizeof(node.compressed_content)
+
+    stats.largest_directories = sorted(largest, reverse=True)
+    return stats
+
+
+def top_allocations(snapshot: Optional[tracemalloc.Snapshot], top: int = 10) -> List[str]:
+    """Возвращает top-N мест выделения памяти из снимка tracemalloc"""
+    if snapshot is None:
+        return []
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    lines = []
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        lines.append(f"{frame.filename}:{frame.lineno}: {stat.size} байт в {stat.count} блоках")
+    return lines
+
+
+def format_memory_report(stats: MemoryStats, snapshot: Optional[tracemalloc.Snapshot] = None,
+                         top: int = 10) -> Iterator[str]:
+    """Форматирует статистику памяти в строки отчета"""
+    yield "Память VFS:"
+    yield (f"  Узлов: {stats.files + stats.directories} (файлов: {stats.files}, "
+           f"директорий: {stats.directories}, не загружено: {stats.unloaded_directories})")
+    yield f"  Логический размер файлов: {stats.logical_bytes} байт"
+    yield f"  Содержимое в памяти: {stats.resident_bytes} байт ({stats.resident_files} файлов)"
+    yield f"  Сжато кэшем: {stats.compressed_bytes} байт ({stats.compressed_files} файлов)"
+    yield (f"  Накладные расходы base64: {stats.base64_overhead_bytes} байт "
+           f"({stats.binary_files} бинарных файлов)")
+    nodes = stats.files + stats.directories
+    per_node = stats.node_overhead_bytes // nodes if nodes else 0
+    yield f"  Объекты узлов (оценка): {stats.node_overhead_bytes} байт (~{per_node} байт на узел)"
+    yield f"  Самый глубокий путь: {stats.deepest_path} (глубина {stats.max_depth})"
+
+    if stats.largest_directories:
+        yield "  Самые большие директории:"
+        for count, path in stats.largest_directories[:top]:
+            yield f"    {count:>8}  {path}"
+
+    allocations = top_allocations(snapshot, top)
+    if allocations:
+        yield f"  Выделения памяти при загрузке (tracemalloc, top {len(allocations)}):"
+        for line in allocations:
+            yield f"    {line}"
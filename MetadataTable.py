@@ -0,0 +1,346 @@
+import fnmatch
+import heapq
+import operator
+import re
+from array import array
+from functools import partial
+from itertools import compress
+from dataclasses import dataclass
+from typing import Collection, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    # Без NumPy каждое условие - один проход map/compress по колонке таблицы
+    np = None
+
+# Тип строки таблицы
+ROW_FILE = 0
+ROW_DIRECTORY = 1
+ROW_DELETED = -1
+
+
+@dataclass
+class MetadataQuery:
+    """Условия отбора для find; None - условие не задано"""
+    type: Optional[int] = None          # ROW_FILE или ROW_DIRECTORY
+    min_size: Optional[int] = None      # Размер строго больше
+    max_size: Optional[int] = None      # Размер строго меньше
+    newer_than: Optional[float] = None  # Время изменения строго позже
+    older_than: Optional[float] = None  # Время изменения строго раньше
+    max_depth: Optional[int] = None     # Глубина относительно начальной директории
+    name: Optional[str] = None          # Шаблон имени (fnmatch)
+
+
+class MetadataTable:
+    """Колоночная таблица метаданных узлов VFS для запросов find.
+
+    Строка таблицы - узел дерева, номер строки - идентификатор узла.
+    Колонки (родитель, тип, размер, время изменения, глубина) хранятся
+    в массивах array и при наличии NumPy проверяются векторно. Дерево
+    раскладывается обходом в глубину, поэтому поддерево директории r -
+    непрерывный диапазон строк r .. end[r] - 1 и отбор по директории
+    сводится к срезу. Файлы, созданные в сессии, дописываются в конец
+    таблицы, удаленные помечаются ROW_DELETED.
+    """
+
+    def __init__(self):
+        self.parent = array('q')
+        self.type = array('b')
+        self.size = array('q')
+        self.mtime = array('d')
+        self.depth = array('i')
+        self.end = array('q')
+        self.names: List[str] = []
+        # Строки, разложенные обходом; дальше идут строки, добавленные в сессии
+        self.base_count = 0
+        self.version = 0
+        self._directories: Dict[str, int] = {}      # Путь директории -> строка
+        self._directory_paths: Dict[int, str] = {}  # Строка директории -> путь
+        self._children: Dict[int, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.type)
+
+    @classmethod
+    def from_tree(cls, root) -> 'MetadataTable':
+        """Строит таблицу одним обходом дерева VFS (ленивые директории загружаются)"""
+        table = cls()
+        # Элемент стека - узел для добавления или номер строки, поддерево которой закончилось
+        stack = [(root, -1, 0, '')]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, int):
+                table.end[item] = len(table.type)
+                continue
+            node, parent, depth, path = item
+            if node.is_directory():
+                row = table._append(parent, ROW_DIRECTORY, 0, node.modified_time, depth, node.name if parent >= 0 else '')
+                table._register_directory(row, path)
+                stack.append(row)
+                children = node.ensure_loaded()
+                for name in reversed(node.sorted_names()):
+                    stack.append((children[name], row, depth + 1, f"{path}/{name}" if path else name))
+            else:
+                table._append(parent, ROW_FILE, node.size, node.modified_time, depth, node.name)
+        table.base_count = len(table.type)
+        return table
+
+    @classmethod
+    def from_entries(cls, entries: Iterable, root_mtime: Optional[float] = None,
+                     skip: Collection[str] = ()) -> 'MetadataTable':
+        """Строит таблицу по записям источника (StorageBackends.EntryInfo) без узлов VFS.
+
+        Записи группируются по директориям (недостающие директории
+        добавляются) и раскладываются тем же обходом в глубину с детьми в
+        порядке имен, что и в from_tree. Пути из skip и их содержимое
+        пропускаются.
+        """
+        # Путь директории -> имя ребенка -> (тип, размер, время изменения)
+        children: Dict[str, Dict[str, tuple]] = {'': {}}
+        for entry in entries:
+            if entry.path in skip:
+                continue
+            parent = entry.path.rpartition('/')[0]
+            missing = []
+            while parent not in children:
+                missing.append(parent)
+                parent = parent.rpartition('/')[0]
+            for directory in reversed(missing):
+                children[directory] = {}
+                directory_parent, _, name = directory.rpartition('/')
+                children[directory_parent][name] = (ROW_DIRECTORY, 0, None)
+            parent, _, name = entry.path.rpartition('/')
+            if entry.is_dir:
+                children.setdefault(entry.path, {})
+                children[parent][name] = (ROW_DIRECTORY, 0, entry.modified_time)
+            else:
+                children[parent][name] = (ROW_FILE, entry.size, entry.modified_time)
+
+        table = cls()
+        stack = [('', -1, 0, ROW_DIRECTORY, 0, root_mtime)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, int):
+                table.end[item] = len(table.type)
+                continue
+            path, parent, depth, row_type, size, mtime = item
+            name = path.rpartition('/')[2]
+            if row_type == ROW_DIRECTORY:
+                row = table._append(parent, ROW_DIRECTORY, 0, mtime, depth, name)
+                table._register_directory(row, path)
+                stack.append(row)
+                for child_name, (child_type, child_size, child_mtime) in sorted(children.pop(path).items(),
+                                                                                reverse=True):
+                    stack.append((f"{path}/{child_name}" if path else child_name, row, depth + 1,
+                                  child_type, child_size, child_mtime))
+            else:
+                table._append(parent, ROW_FILE, size, mtime, depth, name)
+        table.base_count = len(table.type)
+        return table
+
+    def _append(self, parent: int, row_type: int, size: int, mtime: Optional[float], depth: int,
+                name: str) -> int:
+        row = len(self.type)
+        self.parent.append(parent)
+        self.type.append(row_type)
+        self.size.append(size)
+        self.mtime.append(mtime if mtime is not None else float('nan'))
+        self.depth.append(depth)
+        self.end.append(row + 1)
+        self.names.append(name)
+        return row
+
+    def _register_directory(self, row: int, path: str):
+        self._directories[path] = row
+        self._directory_paths[row] = path
+
+    def row_of(self, components: Sequence[str]) -> Optional[int]:
+        """Возвращает строку узла по компонентам пути от корня"""
+        row = self._directories.get('/'.join(components))
+        if row is not None or not components:
+            return row
+        parent = self._directories.get('/'.join(components[:-1]))
+        return self._child_rows(parent).get(components[-1]) if parent is not None else None
+
+    def path(self, row: int) -> str:
+        """Возвращает путь узла от корня (без ведущего '/')"""
+        path = self._directory_paths.get(row)
+        if path is not None:
+            return path
+        parent = self._directory_paths[self.parent[row]]
+        return f"{parent}/{self.names[row]}" if parent else self.names[row]
+
+    def _child_rows(self, directory: int) -> Dict[str, int]:
+        """Имена и строки детей директории; индекс строится при первом изменении в ней"""
+        children = self._children.get(directory)
+        if children is None:
+            children = {}
+            if directory < self.base_count:
+                candidates = range(directory + 1, self.end[directory])
+            else:
+                candidates = ()
+            for rows in (candidates, range(self.base_count, len(self.type))):
+                for row in rows:
+                    if self.parent[row] == directory and self.type[row] != ROW_DELETED:
+                        children[self.names[row]] = row
+            self._children[directory] = children
+        return children
+
+    def update(self, components: Sequence[str], size: int, mtime: Optional[float]):
+        """Добавляет или обновляет файл, записанный в сессии"""
+        parent = 0
+        for depth, name in enumerate(components[:-1], 1):
+            row = self._child_rows(parent).get(name)
+            if row is None:
+                row = self._append(parent, ROW_DIRECTORY, 0, mtime, depth, name)
+                self._child_rows(parent)[name] = row
+                self._register_directory(row, '/'.join(components[:depth]))
+            parent = row
+        row = self._child_rows(parent).get(components[-1])
+        if row is None:
+            row = self._append(parent, ROW_FILE, size, mtime, len(components), components[-1])
+            self._child_rows(parent)[components[-1]] = row
+        else:
+            self.size[row] = size
+            self.mtime[row] = mtime if mtime is not None else float('nan')
+        self.version += 1
+
+    def remove(self, components: Sequence[str]):
+        """Помечает файл удаленным"""
+        parent = self._directories.get('/'.join(components[:-1]))
+        if parent is None:
+            return
+        row = self._child_rows(parent).pop(components[-1], None)
+        if row is not None:
+            self.type[row] = ROW_DELETED
+            self.version += 1
+
+    def _columns(self):
+        """Колонки в виде массивов NumPy над памятью array, без копирования.
+
+        Представления не сохраняются между вызовами: пока они живы, array нельзя
+        дописать (BufferError). Запросы идут под блокировкой чтения VFS, а
+        изменения таблицы - под блокировкой записи, поэтому они не пересекаются.
+        """
+        return tuple(np.frombuffer(column, dtype=column.typecode)
+                     for column in (self.type, self.size, self.mtime, self.depth))
+
+    def _appended_under(self, start: int) -> List[int]:
+        """Строки, добавленные в сессии внутри поддерева start (проверяются по цепочке родителей)"""
+        rows = []
+        start_end = self.end[start]
+        for row in range(max(self.base_count, start + 1), len(self.type)):
+            ancestor = self.parent[row]
+            while ancestor >= self.base_count and ancestor != start:
+                ancestor = self.parent[ancestor]
+            if ancestor == start or (start < self.base_count and start <= ancestor < start_end):
+                rows.append(row)
+        return rows
+
+    def select(self, start: int, query: MetadataQuery):
+        """Возвращает строки поддерева start (включая ее саму), удовлетворяющие условиям"""
+        low = start
+        high = self.end[start] if start < self.base_count else start + 1
+        max_depth = self.depth[start] + query.max_depth if query.max_depth is not None else None
+        appended = self._appended_under(start)
+
+        if np is not None:
+            types, sizes, mtimes, depths = self._columns()
+            # Все условия проверяются над срезом поддерева, без обхода узлов
+            types, sizes, mtimes, depths = types[low:high], sizes[low:high], mtimes[low:high], depths[low:high]
+            mask = types != ROW_DELETED
+            if query.type is not None:
+                mask &= types == query.type
+            if query.min_size is not None:
+                mask &= sizes > query.min_size
+            if query.max_size is not None:
+                mask &= sizes < query.max_size
+            if query.newer_than is not None:
+                mask &= mtimes > query.newer_than
+            if query.older_than is not None:
+                mask &= mtimes < query.older_than
+            if max_depth is not None:
+                mask &= depths <= max_depth
+            rows = np.flatnonzero(mask) + low
+            if appended:
+                rows = np.concatenate([rows, np.array(self._filter(appended, query, max_depth), dtype=rows.dtype)])
+        else:
+            rows = self._filter(range(low, high), query, max_depth) + self._filter(appended, query, max_depth)
+
+        if query.name is not None:
+            # Имена не хранятся в колонках: шаблон проверяется только у прошедших остальные условия
+            match = re.compile(fnmatch.translate(query.name)).match
+            names = self.names
+            if np is not None:
+                rows = rows[np.array([match(names[row]) is not None for row in rows.tolist()], dtype=bool)]
+            else:
+                rows = [row for row in rows if match(names[row])]
+        return rows
+
+    def _filter(self, rows, query: MetadataQuery, max_depth: Optional[int]) -> List[int]:
+        """Проверяет условия без NumPy (и для строк, добавленных в сессии).
+
+        Каждое условие - один проход map/compress по колонке с операторами
+        сравнения из operator: перебор и сравнения идут в C, а не в цикле Python
+        по строкам. Непрерывный диапазон строк берется срезом колонки.
+        """
+        # Самые избирательные условия идут первыми: следующие проходы короче
+        conditions = []
+        if query.min_size is not None:
+            conditions.append((self.size, partial(operator.lt, query.min_size)))
+        if query.max_size is not None:
+            conditions.append((self.size, partial(operator.gt, query.max_size)))
+        if query.newer_than is not None:
+            conditions.append((self.mtime, partial(operator.lt, query.newer_than)))
+        if query.older_than is not None:
+            conditions.append((self.mtime, partial(operator.gt, query.older_than)))
+        if max_depth is not None:
+            conditions.append((self.depth, partial(operator.ge, max_depth)))
+        if query.type is not None:
+            # Удаленные строки не совпадают ни с одним типом
+            conditions.append((self.type, partial(operator.eq, query.type)))
+        else:
+            conditions.append((self.type, partial(operator.ne, ROW_DELETED)))
+
+        for column, condition in conditions:
+            if isinstance(rows, range) and rows.step == 1:
+                values = column[rows.start:rows.stop]
+            else:
+                values = map(column.__getitem__, rows)
+            rows = list(compress(rows, map(condition, values)))
+        return rows
+
+    def largest(self, rows, count: int) -> List[int]:
+        """Возвращает count строк с наибольшим размером (по убыванию)"""
+        if count <= 0:
+            return []
+        if np is not None:
+            sizes = self._columns()[1][rows]
+            if len(rows) > count:
+                # Частичная сортировка: находится размер count-го по величине узла, из равных
+                # ему берутся первые по порядку строк (как в heapq.nlargest)
+                threshold = np.partition(sizes, len(sizes) - count)[len(sizes) - count]
+                greater = sizes > threshold
+                equal = np.flatnonzero(sizes == threshold)[:count - int(greater.sum())]
+                selected = np.sort(np.concatenate([np.flatnonzero(greater), equal]))
+                rows, sizes = rows[selected], sizes[selected]
+            return rows[np.argsort(-sizes, kind='stable')].tolist()
+        return heapq.nlargest(count, rows, key=self.size.__getitem__)
+
+    def summary(self, rows) -> Dict:
+        """Возвращает число файлов и директорий и суммарный размер файлов"""
+        if np is not None:
+            types, sizes, _, _ = self._columns()
+            files = types[rows] == ROW_FILE
+            return {
+                'files': int(files.sum()),
+                'directories': int(len(rows) - files.sum()),
+                'total_size': int(sizes[rows][files].sum()),
+            }
+        files = list(compress(rows, map(partial(operator.eq, ROW_FILE), map(self.type.__getitem__, rows))))
+        return {
+            'files': len(files),
+            'directories': len(rows) - len(files),
+            'total_size': sum(map(self.size.__getitem__, files)),
+        }
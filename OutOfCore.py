@@ -0,0 +1,189 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+from StorageBackends import EntryInfo
+
+# Оценка памяти на один узел VFSNode вместе со словарем детей и строками
+NODE_BYTES_ESTIMATE = 1024
+
+
+@dataclass
+class OutOfCorePolicy:
+    """Параметры работы с архивами, которые не помещаются в память.
+
+    Все пороги выводятся из общего лимита памяти: половина отдается кэшу
+    содержимого, файлы крупнее spill_threshold никогда не читаются в память
+    целиком, а при большом числе записей индекс узлов переносится в SQLite.
+    """
+    max_memory: int
+    cache_budget: int
+    spill_threshold: int
+    index_threshold: int
+    spill_dir: Optional[str] = None
+
+    @classmethod
+    def from_limit(cls, max_memory: int, spill_dir: Optional[str] = None) -> 'OutOfCorePolicy':
+        """Рассчитывает пороги по лимиту памяти в байтах"""
+        return cls(
+            max_memory=max_memory,
+            cache_budget=max_memory // 2,
+            spill_threshold=max(max_memory // 16, 1024 * 1024),
+            # Дерево узлов может занять не больше четверти лимита
+            index_threshold=max(max_memory // 4 // NODE_BYTES_ESTIMATE, 1),
+            spill_dir=spill_dir
+        )
+
+
+class SpillStore:
+    """Временная директория для распакованных крупных файлов и индекса узлов"""
+
+    def __init__(self, base_dir: Optional[str] = None):
+        self._base_dir = base_dir
+        self._directory: Optional[tempfile.TemporaryDirectory] = None
+        self._spilled = {}
+        # Файлы, которые сейчас распаковываются: другие потоки ждут события
+        self._spilling = {}
+        self._spill_count = 0
+        self._lock = threading.Lock()
+        self.spilled_bytes = 0
+
+    @property
+    def path(self) -> str:
+        """Путь к временной директории (создается при первом обращении)"""
+        if self._directory is None:
+            if self._base_dir:
+                os.makedirs(self._base_dir, exist_ok=True)
+            self._directory = tempfile.TemporaryDirectory(prefix="vfs_spill_", dir=self._base_dir)
+        return self._directory.name
+
+    def open(self, key: str, source: Callable[[], BinaryIO]) -> BinaryIO:
+        """Открывает файл из временной директории, при первом обращении
+        потоково распаковывая его туда из источника.
+
+        Распаковка идет вне блокировки: потоки, открывающие другие файлы, не
+        ждут ее, а потоки, открывающие тот же файл, ждут одной распаковки.
+        """
+        while True:
+            with self._lock:
+                spill_path = self._spilled.get(key)
+                if spill_path is not None:
+                    return open(spill_path, 'rb')
+                spilling = self._spilling.get(key)
+                if spilling is None:
+                    spilling = self._spilling[key] = threading.Event()
+                    spill_path = os.path.join(self.path, f"member_{self._spill_count}")
+                    self._spill_count += 1
+                    break
+            spilling.wait()
+
+        try:
+            with source() as stream, open(spill_path, 'wb') as target:
+                shutil.copyfileobj(stream, target, 1024 * 1024)
+            size = os.path.getsize(spill_path)
+        except BaseException:
+            with self._lock:
+                del self._spilling[key]
+                spilling.set()
+            if os.path.exists(spill_path):
+                os.remove(spill_path)
+            raise
+
+        with self._lock:
+            self.spilled_bytes += size
+            self._spilled[key] = spill_path
+            del self._spilling[key]
+            spilling.set()
+        return open(spill_path, 'rb')
+
+    def close(self):
+        """Удаляет временные файлы"""
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+            self._spilled.clear()
+            self.spilled_bytes = 0
+
+
+class SqliteNodeIndex:
+    """Индекс записей архива в SQLite: директории VFS заполняются из него лениво,
+    поэтому в памяти находятся только узлы посещенных директорий"""
+
+    BATCH_SIZE = 10000
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.entry_count = 0
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._connection.execute("PRAGMA journal_mode=OFF")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute(
+            "CREATE TABLE entries (path TEXT PRIMARY KEY, parent TEXT NOT NULL, "
+            "is_dir INTEGER NOT NULL, size INTEGER NOT NULL, mtime REAL, locator BLOB)"
+        )
+
+    def build(self, entries: Iterable[EntryInfo]):
+        """Заполняет индекс за один проход; недостающие директории добавляются"""
+        known_dirs = {''}
+        batch = []
+
+        def add(path, is_dir, size, mtime, locator=None):
+            parent = path.rpartition('/')[0]
+            batch.append((path, parent, int(is_dir), size, mtime, locator))
+
+        for entry in entries:
+            parent = entry.path.rpartition('/')[0]
+            missing = []
+            while parent not in known_dirs:
+                missing.append(parent)
+                known_dirs.add(parent)
+                parent = parent.rpartition('/')[0]
+            for directory in reversed(missing):
+                add(directory, True, 0, None)
+
+            if entry.is_dir:
+                if entry.path in known_dirs:
+                    continue
+                known_dirs.add(entry.path)
+            add(entry.path, entry.is_dir, entry.size, entry.modified_time, entry.locator)
+
+            if len(batch) >= self.BATCH_SIZE:
+                self._flush(batch)
+
+        self._flush(batch)
+        self._connection.execute("CREATE INDEX entries_parent ON entries (parent)")
+        self._connection.commit()
+
+    def _flush(self, batch):
+        # При повторяющихся именах в архиве остается последняя запись
+        self._connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", batch)
+        self.entry_count += len(batch)
+        batch.clear()
+
+    def list_dir(self, path: str) -> Iterator[EntryInfo]:
+        """Перечисляет записи директории"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, is_dir, size, mtime FROM entries WHERE parent = ?", (path,)
+            ).fetchall()
+        for row_path, is_dir, size, mtime in rows:
+            yield EntryInfo(row_path, bool(is_dir), size, mtime)
+
+    def lookup(self, path: str) -> Optional[EntryInfo]:
+        """Возвращает запись по пути вместе с описанием для открытия в источнике"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT is_dir, size, mtime, locator FROM entries WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None:
+            return None
+        is_dir, size, mtime, locator = row
+        return EntryInfo(path, bool(is_dir), size, mtime, locator=locator)
+
+    def close(self):
+        self._connection.close()
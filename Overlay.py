@@ -0,0 +1,202 @@
+import os
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from StorageBackends import EntryInfo, StorageBackend, open_backend
+
+# Маркеры удаления в слоях (как в образах OCI): '.wh.имя' скрывает 'имя' в нижних слоях,
+# '.wh..wh..opq' делает директорию непрозрачной - содержимое нижних слоев в ней не видно
+WHITEOUT_PREFIX = '.wh.'
+OPAQUE_MARKER = '.wh..wh..opq'
+
+
+class Layer:
+    """Слой только для чтения: источник данных и кэш содержимого его директорий"""
+
+    def __init__(self, path: str, backend: StorageBackend):
+        self.path = path
+        self.backend = backend
+        self._listings: Optional[Dict[str, Dict[str, EntryInfo]]] = None
+
+    def listing(self, path: str) -> Optional[Dict[str, EntryInfo]]:
+        """Возвращает записи директории слоя по имени или None, если директории в слое нет"""
+        if self.backend.lazy_directories:
+            if self._listings is None:
+                self._listings = {}
+            if path not in self._listings:
+                entry = self.backend.stat(path) if path else None
+                if path and (entry is None or not entry.is_dir):
+                    self._listings[path] = None
+                else:
+                    self._listings[path] = {entry.name: entry for entry in self.backend.list_dir(path)}
+            return self._listings[path]
+
+        if self._listings is None:
+            # Индексируемый источник перечисляется один раз и раскладывается по директориям
+            listings: Dict[str, Dict[str, EntryInfo]] = {'': {}}
+            for entry in self.backend.iter_entries():
+                parent = entry.path.rpartition('/')[0]
+                listings.setdefault(parent, {})[entry.name] = entry
+                if entry.is_dir:
+                    listings.setdefault(entry.path, {})
+                # Директории, для которых в архиве нет собственной записи
+                while parent:
+                    grandparent, _, name = parent.rpartition('/')
+                    siblings = listings.setdefault(grandparent, {})
+                    if name in siblings:
+                        break
+                    siblings[name] = EntryInfo(parent, True)
+                    parent = grandparent
+            self._listings = listings
+        return self._listings.get(path)
+
+    def close(self):
+        self.backend.close()
+
+
+class OverlayBackend(StorageBackend):
+    """Стек слоев только для чтения; верхние слои перекрывают нижние.
+
+    Слой, в котором находится путь, запоминается при первом поиске, поэтому
+    повторные обращения не перебирают все слои. Монтирование и отключение
+    слоя сбрасывают только эти результаты поиска: содержимое остальных слоев
+    не перечитывается.
+    """
+
+    kind = "overlay"
+    lazy_directories = True
+
+    def __init__(self, paths: Optional[List[str]] = None, path_filter=None):
+        super().__init__(os.pathsep.join(paths or []), path_filter)
+        self.layers: List[Layer] = []           # Снизу вверх
+        self._lookups: Dict[str, Layer] = {}
+        self._directory_layers: Dict[str, List[Layer]] = {}
+        try:
+            for path in paths or []:
+                self.mount(path)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def seekable_members(self) -> bool:
+        return all(layer.backend.seekable_members for layer in self.layers)
+
+    @property
+    def skipped(self) -> int:
+        return sum(layer.backend.skipped for layer in self.layers)
+
+    def add_layer(self, path: str, backend: StorageBackend):
+        """Кладет уже открытый источник данных поверх остальных слоев"""
+        self.layers.append(Layer(path, backend))
+        self._invalidate()
+
+    def mount(self, path: str):
+        """Открывает источник данных и кладет его поверх остальных слоев"""
+        backend = open_backend(path, self.path_filter)
+        if backend is None:
+            raise FileNotFoundError(f"'{path}' не является архивом или директорией")
+        self.add_layer(path, backend)
+
+    def umount(self, path: str):
+        """Отключает слой по пути, с которым он был смонтирован"""
+        target = os.path.abspath(path)
+        for layer in reversed(self.layers):
+            if os.path.abspath(layer.path) == target:
+                self.layers.remove(layer)
+                self._invalidate()
+                layer.close()
+                return
+        raise ValueError(f"слой '{path}' не смонтирован")
+
+    def _invalidate(self):
+        self._lookups.clear()
+        self._directory_layers.clear()
+
+    def _layers_of(self, path: str) -> List[Layer]:
+        """Возвращает слои (сверху вниз), содержимое которых видно в директории path"""
+        layers = self._directory_layers.get(path)
+        if layers is not None:
+            return layers
+
+        if not path:
+            layers = list(reversed(self.layers))
+        else:
+            parent, _, name = path.rpartition('/')
+            layers = []
+            for layer in self._layers_of(parent):
+                listing = layer.listing(parent)
+                if listing is None:
+                    continue
+                if WHITEOUT_PREFIX + name in listing:
+                    break
+                entry = listing.get(name)
+                if entry is None:
+                    continue
+                if not entry.is_dir:
+                    # Файл в верхнем слое перекрывает одноименные директории нижних
+                    break
+                layers.append(layer)
+                # listing() возвращает None, если слой не знает директорию path
+                if OPAQUE_MARKER in (layer.listing(path) or ()):
+                    break
+        self._directory_layers[path] = layers
+        return layers
+
+    def list_dir(self, path: str) -> Iterator[EntryInfo]:
+        merged: Dict[str, EntryInfo] = {}
+        hidden = set()
+        for layer in self._layers_of(path):
+            listing = layer.listing(path)
+            for name, entry in listing.items():
+                if name.startswith(WHITEOUT_PREFIX):
+                    continue
+                if name not in merged and name not in hidden:
+                    merged[name] = entry
+                    self._lookups[entry.path] = layer
+            hidden.update(name[len(WHITEOUT_PREFIX):] for name in listing if name.startswith(WHITEOUT_PREFIX))
+        return iter(merged.values())
+
+    def _locate(self, path: str) -> Optional[Layer]:
+        """Находит слой, из которого виден путь; результат запоминается"""
+        layer = self._lookups.get(path)
+        if layer is None and path:
+            # Перечисление родителя запоминает слои всех его записей
+            for _ in self.list_dir(path.rpartition('/')[0]):
+                pass
+            layer = self._lookups.get(path)
+        return layer
+
+    def iter_entries(self) -> Iterator[EntryInfo]:
+        stack = ['']
+        while stack:
+            for entry in self.list_dir(stack.pop()):
+                yield entry
+                if entry.is_dir:
+                    stack.append(entry.path)
+
+    def stat(self, path: str) -> Optional[EntryInfo]:
+        layer = self._locate(path)
+        if layer is None:
+            return None
+        return layer.listing(path.rpartition('/')[0])[path.rpartition('/')[2]]
+
+    def _file_layer(self, path: str) -> Layer:
+        layer = self._locate(path)
+        if layer is None:
+            raise FileNotFoundError(path)
+        return layer
+
+    def open(self, path: str) -> BinaryIO:
+        return self._file_layer(path).backend.open(path)
+
+    def read(self, path: str) -> bytes:
+        return self._file_layer(path).backend.read(path)
+
+    def verify(self, path: str) -> int:
+        return self._file_layer(path).backend.verify(path)
+
+    def close(self):
+        for layer in self.layers:
+            layer.close()
+        self.layers = []
+        self._invalidate()
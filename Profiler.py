@@ -0,0 +1,157 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional
+
+
+class CommandProfiler:
+    """Детерминированный профилировщик (cProfile) вокруг выполнения команд.
+
+    Профилируется только время внутри measure(), поэтому ожидание ввода
+    в интерактивном режиме не попадает в результаты.
+    """
+
+    kind = "cprofile"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.running = False
+        self.commands_profiled = 0
+        self._depth = 0
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    @contextmanager
+    def measure(self):
+        """Профилирует выполнение блока (вложенные блоки, например run, не прерывают внешний)"""
+        self._depth += 1
+        if self._depth == 1:
+            self.profile.enable()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.profile.disable()
+                self.commands_profiled += 1
+
+    def dump(self, path: str):
+        """Сохраняет результаты в файл pstats"""
+        self.profile.dump_stats(path)
+
+    def top(self, limit: int = 20, sort: str = 'cumulative') -> List[str]:
+        """Возвращает top-N функций по накопленному времени"""
+        if not self.commands_profiled:
+            return ["Профиль пуст"]
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return [line for line in stream.getvalue().splitlines() if line.strip()]
+
+
+class SamplingProfiler:
+    """Легковесный профилировщик: фоновый поток с фиксированным интервалом
+    снимает стек потока, выполняющего команды.
+
+    Накладные расходы не зависят от числа вызовов функций, поэтому режим
+    подходит для длинных рабочих сессий. Стеки снимаются только во время
+    выполнения команд (внутри measure()).
+    """
+
+    kind = "sampling"
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.running = False
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._target: Optional[int] = None
+        self._busy = 0
+        self._base_depth = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    @contextmanager
+    def measure(self):
+        """Отмечает блок, во время которого снимаются стеки текущего потока"""
+        if not self._busy:
+            # Кадры выше вызывающей функции одинаковы во всех снимках и не сохраняются
+            caller = sys._getframe(2)
+            depth = 0
+            while caller is not None:
+                depth += 1
+                caller = caller.f_back
+            self._base_depth = depth - 1
+            self._target = threading.get_ident()
+        self._busy += 1
+        try:
+            yield
+        finally:
+            self._busy -= 1
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            if not self._busy:
+                continue
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((os.path.basename(code.co_filename), code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            stack.reverse()
+            stack = stack[self._base_depth:]
+            if stack:
+                self.stacks[tuple(stack)] += 1
+                self.samples += 1
+
+    def dump(self, path: str):
+        """Сохраняет стеки в свернутом формате (строка 'a;b;c N'), пригодном для flamegraph"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                frames = ';'.join(f"{name} ({filename}:{lineno})" for filename, name, lineno in stack)
+                f.write(f"{frames} {count}\n")
+
+    def top(self, limit: int = 20) -> List[str]:
+        """Возвращает top-N функций по доле снимков, в которых они были в стеке"""
+        if not self.samples:
+            return ["Профиль пуст"]
+        inclusive = Counter()
+        exclusive = Counter()
+        for stack, count in self.stacks.items():
+            # Функция учитывается один раз на снимок, даже при рекурсии
+            for function in {(filename, name) for filename, name, _ in stack}:
+                inclusive[function] += count
+            exclusive[stack[-1][:2]] += count
+        lines = [f"Снимков: {self.samples}, интервал: {self.interval * 1000:.1f} мс",
+                 f"{'Всего':>7}  {'Собств.':>7}  Функция"]
+        for function, count in inclusive.most_common(limit):
+            filename, name = function
+            lines.append(f"{count / self.samples:>7.1%}  {exclusive[function] / self.samples:>7.1%}  "
+                         f"{filename}:{name}")
+        return lines
@@ -0,0 +1,114 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Блокировка чтения-записи с приоритетом писателей.
+
+    Любое число потоков может одновременно держать блокировку чтения;
+    блокировка записи эксклюзивна. Ожидающий писатель не пропускает новых
+    читателей, поэтому поток записей не голодает при постоянном чтении.
+
+    Блокировка реентерабельна: поток, уже держащий блокировку чтения или
+    записи, может захватить ее повторно (публичные методы VFS вызывают друг
+    друга). Повышение чтения до записи запрещено - оно приводит к взаимной
+    блокировке двух читателей.
+
+    Читатель без писателей не захватывает внутренний мьютекс: threading.Lock
+    не гарантирует очереди, и частые читатели перехватывали бы его у писателя
+    бесконечно. Читатель регистрируется в множестве и затем проверяет флаги
+    писателя, а писатель выставляет флаг и затем проверяет множество - при
+    атомарных операциях set один из них всегда видит другого.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = set()
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def _held(self) -> list:
+        """Стек захватов чтения текущего потока ('r' - чтение, 'w' - вложено в запись)"""
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = []
+        return held
+
+    def acquire_read(self):
+        held = self._held()
+        if self._writer == threading.get_ident():
+            # Писатель уже имеет эксклюзивный доступ
+            self._writer_depth += 1
+            held.append('w')
+            return
+        if 'r' not in held:
+            me = threading.get_ident()
+            while True:
+                self._readers.add(me)
+                if self._writer is None and not self._waiting_writers:
+                    break
+                # Писатель ждет или работает: читатель уступает ему и ждет освобождения
+                self._readers.discard(me)
+                with self._condition:
+                    self._condition.notify_all()
+                    while self._writer is not None or self._waiting_writers:
+                        self._condition.wait()
+        held.append('r')
+
+    def release_read(self):
+        held = self._held()
+        kind = held.pop()
+        if kind == 'w':
+            self._writer_depth -= 1
+            return
+        if 'r' not in held:
+            self._readers.discard(threading.get_ident())
+            if self._waiting_writers:
+                with self._condition:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+            return
+        if 'r' in self._held():
+            raise RuntimeError("нельзя захватить блокировку записи, удерживая блокировку чтения")
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+                # Писатель назначается до снятия флага ожидания: иначе новый
+                # читатель на мгновение не увидел бы ни одного из них
+                self._writer = me
+                self._writer_depth = 1
+            finally:
+                self._waiting_writers -= 1
+
+    def release_write(self):
+        self._writer_depth -= 1
+        if self._writer_depth == 0:
+            with self._condition:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read_lock(self):
+        """Контекстный менеджер блокировки чтения"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_lock(self):
+        """Контекстный менеджер блокировки записи"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.trgm'
+
+# Индексируются триграммы слов: подстрока запроса найдена в файле, только если
+# в файле есть слова, содержащие все триграммы слов запроса
+TOKEN_PATTERN = re.compile(r'\w{3,}')
+
+
+def text_trigrams(text: str) -> Set[str]:
+    """Возвращает множество триграмм слов текста (без учета регистра)"""
+    tokens = set(TOKEN_PATTERN.findall(text.lower()))
+    if not tokens:
+        return set()
+    # Уникальные слова склеиваются через '\0', чтобы нарезать триграммы одним проходом
+    joined = '\0'.join(tokens)
+    return {gram for gram in {joined[i:i + 3] for i in range(len(joined) - 2)} if '\0' not in gram}
+
+
+class TrigramTable:
+    """Инвертированный индекс: триграмма -> номера документов"""
+
+    def __init__(self):
+        self.paths: List[Optional[str]] = []      # Номер документа -> путь (None - удален)
+        self.documents: Dict[str, int] = {}       # Путь -> номер действующего документа
+        self.postings: Dict[str, Set[int]] = {}
+
+    def add(self, path: str, trigrams: Iterable[str]):
+        self.remove(path)
+        document = len(self.paths)
+        self.paths.append(path)
+        self.documents[path] = document
+        for gram in trigrams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = set()
+            posting.add(document)
+
+    def remove(self, path: str):
+        # Номер документа помечается удаленным, списки триграмм чистятся при сохранении
+        document = self.documents.pop(path, None)
+        if document is not None:
+            self.paths[document] = None
+
+    def candidates(self, trigrams: Set[str]) -> List[str]:
+        """Возвращает пути документов, содержащих все триграммы"""
+        if not trigrams:
+            return sorted(self.documents)
+        postings = []
+        for gram in trigrams:
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        documents = set(postings[0])
+        for posting in postings[1:]:
+            documents &= posting
+            if not documents:
+                return []
+        return sorted(path for path in (self.paths[d] for d in documents) if path is not None)
+
+    def save(self, path: str, source_stamp: Tuple[int, int]):
+        """Сохраняет действующие документы (номера перенумеровываются без пропусков)"""
+        renumber = {}
+        paths = []
+        for document, name in enumerate(self.paths):
+            if name is not None:
+                renumber[document] = len(paths)
+                paths.append(name)
+        postings = {}
+        for gram, posting in self.postings.items():
+            documents = sorted(renumber[d] for d in posting if d in renumber)
+            if documents:
+                # Номера хранятся разностями, так индекс лучше сжимается
+                postings[gram] = [documents[0]] + [b - a for a, b in zip(documents, documents[1:])]
+        data = json.dumps({
+            'version': INDEX_VERSION,
+            'source': list(source_stamp),
+            'paths': paths,
+            'postings': postings,
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(zlib.compress(data, 6))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str, source_stamp: Tuple[int, int]) -> Optional['TrigramTable']:
+        """Загружает индекс, если он построен по той же версии источника"""
+        try:
+            with open(path, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return None
+        if data.get('version') != INDEX_VERSION or data.get('source') != list(source_stamp):
+            return None
+        table = cls()
+        table.paths = data['paths']
+        table.documents = {name: document for document, name in enumerate(table.paths)}
+        for gram, deltas in data['postings'].items():
+            documents = set()
+            document = 0
+            for delta in deltas:
+                document += delta
+                documents.add(document)
+            table.postings[gram] = documents
+        return table
+
+
+class ContentIndex:
+    """Индекс содержимого текстовых файлов VFS для команды search.
+
+    Индекс источника строится в фоновом потоке (или загружается из файла
+    рядом с архивом), а файлы, измененные в сессии, индексируются сразу при
+    записи. Пока индекс строится, search просматривает все файлы.
+    """
+
+    def __init__(self, persist_path: Optional[str] = None, source_stamp: Optional[Tuple[int, int]] = None):
+        self.persist_path = persist_path
+        self.source_stamp = source_stamp
+        self.table = TrigramTable()
+        self.ready = threading.Event()
+        self.loaded_from_disk = False
+        self.build_time = 0.0
+        self.indexed_bytes = 0
+        self._lock = threading.Lock()
+        # Файлы сессии: путь -> триграммы содержимого (None - файл удален)
+        self._session: Dict[str, Optional[Set[str]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._generation = 0
+
+    @staticmethod
+    def stamp(path: str) -> Optional[Tuple[int, int]]:
+        """Версия источника для проверки сохраненного индекса: размер и время изменения"""
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        return info.st_size, info.st_mtime_ns
+
+    def start(self, source: Callable[[], Iterator[Tuple[str, Callable[[], bytes]]]]):
+        """Запускает построение индекса источника в фоновом потоке"""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self.ready.clear()
+        self._thread = threading.Thread(target=self._build,
+                                        args=(source, generation, self.persist_path, self.source_stamp),
+                                        name="content-index", daemon=True)
+        self._thread.start()
+
+    def _build(self, source, generation: int, persist_path: Optional[str],
+               source_stamp: Optional[Tuple[int, int]]):
+        started = time.perf_counter()
+        table = None
+        if persist_path and source_stamp:
+            table = TrigramTable.load(persist_path, source_stamp)
+        loaded = table is not None
+        indexed = 0
+        if table is None:
+            table = TrigramTable()
+            try:
+                for path, read in source():
+                    if generation != self._generation:
+                        return   # Источник сменился (перезагрузка или перемонтирование)
+                    try:
+                        data = read()
+                        text = data.decode('utf-8')
+                    except UnicodeDecodeError:
+                        continue   # Бинарные файлы не индексируются
+                    except Exception:
+                        continue   # Поврежденный файл: ошибку покажет чтение или vfs-verify
+                    indexed += len(data)
+                    table.add(path, text_trigrams(text))
+            except Exception:
+                return   # Источник закрыт во время построения
+            if persist_path and source_stamp:
+                try:
+                    table.save(persist_path, source_stamp)
+                except OSError:
+                    pass   # Директория архива недоступна для записи: индекс живет только в памяти
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            # Изменения сессии накладываются поверх индекса источника
+            for path, trigrams in self._session.items():
+                if trigrams is None:
+                    table.remove(path)
+                else:
+                    table.add(path, trigrams)
+            self.table = table
+            self.loaded_from_disk = loaded
+            self.indexed_bytes = indexed
+            self.build_time = time.perf_counter() - started
+            self.ready.set()
+
+    def update(self, path: str, text: Optional[str]):
+        """Индексирует файл, записанный в сессии (text=None - файл удален)"""
+        trigrams = text_trigrams(text) if text is not None else None
+        with self._lock:
+            self._session[path] = trigrams
+            if trigrams is None:
+                self.table.remove(path)
+            else:
+                self.table.add(path, trigrams)
+
+    def reset_session(self):
+        """Забывает изменения сессии (после перезагрузки VFS)"""
+        with self._lock:
+            self._session.clear()
+
+    def candidates(self, query: str) -> Optional[List[str]]:
+        """Возвращает пути файлов, которые могут содержать строку, или None, если индекс не готов"""
+        if not self.ready.is_set():
+            return None
+        trigrams = text_trigrams(query)
+        with self._lock:
+            return self.table.candidates(trigrams)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Ждет завершения построения индекса"""
+        return self.ready.wait(timeout)
+
+    def wait_saved(self):
+        """Ждет окончания фонового построения, если индекс сохраняется на диск.
+
+        Поток построения фоновый (daemon), поэтому без ожидания короткий
+        запуск (-c, --batch) завершится раньше, чем индекс будет записан.
+        """
+        thread = self._thread
+        if thread is not None and self.persist_path and self.source_stamp:
+            thread.join()
@@ -0,0 +1,138 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from StorageBackends import (IMAGE_DIRECTORY_FLAG, IMAGE_HEADER, IMAGE_MAGIC, IMAGE_NODE,
+                             EntryInfo, open_backend)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class ImageStats:
+    """Итог построения образа"""
+    nodes: int = 0
+    files: int = 0
+    content_bytes: int = 0
+    image_bytes: int = 0
+    elapsed: float = 0.0
+
+
+class _ImageNode:
+    """Узел строящегося образа; содержимое в памяти не хранится"""
+
+    __slots__ = ('name', 'entry', 'children')
+
+    def __init__(self, name: str, entry: Optional[EntryInfo] = None):
+        self.name = name
+        self.entry = entry
+        self.children: Optional[Dict[str, '_ImageNode']] = None if entry and not entry.is_dir else {}
+
+
+def _collect_tree(backend) -> _ImageNode:
+    """Строит дерево имен и метаданных по записям источника"""
+    root = _ImageNode('')
+    for entry in backend.iter_entries():
+        node = root
+        parts = entry.path.split('/')
+        for depth, part in enumerate(parts[:-1]):
+            child = node.children.get(part)
+            if child is None:
+                # Директория, для которой в архиве нет собственной записи
+                child = node.children[part] = _ImageNode(part, EntryInfo('/'.join(parts[:depth + 1]), True))
+            node = child
+        existing = node.children.get(parts[-1])
+        if existing is not None and existing.children is not None and entry.is_dir:
+            existing.entry = entry
+        else:
+            node.children[parts[-1]] = _ImageNode(parts[-1], entry)
+    return root
+
+
+def _layout(root: _ImageNode) -> List[_ImageNode]:
+    """Раскладывает узлы в ширину: дети каждой директории идут подряд в порядке имен"""
+    order = [root]
+    position = 0
+    while position < len(order):
+        node = order[position]
+        position += 1
+        if node.children:
+            order.extend(node.children[name] for name in sorted(node.children))
+    return order
+
+
+def build_image(source_path: str, image_path: str, path_filter=None) -> ImageStats:
+    """Строит неизменяемый образ VFS из архива или директории.
+
+    Образ записывается во временный файл и атомарно переименовывается,
+    поэтому подключающиеся процессы никогда не видят его недостроенным.
+    Содержимое файлов копируется из источника потоково; path_filter
+    (--include/--exclude) позволяет собрать образ только из части источника.
+    """
+    started = time.perf_counter()
+    backend = open_backend(source_path, path_filter)
+    if backend is None:
+        raise FileNotFoundError(f"'{source_path}' не является архивом или директорией")
+
+    stats = ImageStats()
+    temporary_path = f"{image_path}.{os.getpid()}.tmp"
+    try:
+        order = _layout(_collect_tree(backend))
+        index = {id(node): i for i, node in enumerate(order)}
+
+        names = bytearray()
+        name_spans = []
+        for node in order:
+            encoded = node.name.encode('utf-8')
+            name_spans.append((len(names), len(encoded)))
+            names += encoded
+
+        records = [None] * len(order)
+        names_offset = IMAGE_HEADER.size + IMAGE_NODE.size * len(order)
+        blob_offset = names_offset + len(names)
+
+        with open(temporary_path, 'wb') as f:
+            # Таблица узлов записывается последней, когда известны смещения содержимого
+            f.seek(names_offset)
+            f.write(names)
+            content_offset = 0
+            for i, node in enumerate(order):
+                entry = node.entry
+                modified_time = entry.modified_time if entry and entry.modified_time is not None else float('nan')
+                name_offset, name_length = name_spans[i]
+                if node.children is not None:
+                    first = index[id(node.children[min(node.children)])] if node.children else 0
+                    records[i] = (name_offset, 0, 0, modified_time, name_length,
+                                  first, len(node.children), IMAGE_DIRECTORY_FLAG)
+                    continue
+                size = 0
+                with backend.open(entry.path) as stream:
+                    while True:
+                        chunk = stream.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        size += len(chunk)
+                records[i] = (name_offset, content_offset, size, modified_time, name_length, 0, 0, 0)
+                content_offset += size
+                stats.files += 1
+
+            stats.image_bytes = f.tell()
+            f.seek(0)
+            f.write(IMAGE_HEADER.pack(IMAGE_MAGIC, len(order), 0, names_offset, len(names),
+                                      blob_offset, content_offset))
+            for record in records:
+                f.write(IMAGE_NODE.pack(*record))
+        os.replace(temporary_path, image_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    finally:
+        backend.close()
+
+    stats.nodes = len(order)
+    stats.content_bytes = content_offset
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -1,100 +1,310 @@
+import codecs
+import io
 import os
-import shlex
 import re
+import shlex
+import threading
 import zipfile
+from bisect import bisect_left
+from itertools import islice
+
+try:
+    import readline
+except ImportError:
+    # В Windows модуля readline нет, дополнение по Tab недоступно
+    readline = None
 
 from Logger import *
 from FileType import *
+from ContentCache import content_cache
+from MemoryReport import collect_memory_stats, format_memory_report
+from ZipExport import export_vfs
+from VFSDiff import DiffStats, diff_paths, diff_session
+from MetadataTable import ROW_DIRECTORY, ROW_FILE, MetadataQuery
+from Profiler import CommandProfiler, SamplingProfiler
+from CommandParser import Operator, split_commands, split_pipeline, tokenize
+from VFSGlob import expand_glob
+from Environment import NAME_PATTERN, SessionEnvironment
+from Jobs import BACKGROUND_SAFE_COMMANDS, JobTable
+from Tracer import tracer
+
+
+# Единицы размера для find -size (c - байты, как в find)
+FIND_SIZE_UNITS = {'c': 1, 'k': 1024, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# Кодировки скриптов в порядке проверки и размер образца для определения кодировки
+SCRIPT_ENCODINGS = ['utf-8', 'cp1251', 'cp866', 'iso-8859-1']
+SCRIPT_SAMPLE_SIZE = 64 * 1024
+
+
+class CommandError(Exception):
+    """Ошибка выполнения команды; текст выводится пользователю и пишется в лог"""
+
 
 class ShellEmulator:
-    def __init__(self, vfs_path, log_file, startup_script=None):
+    def __init__(self, vfs_path, log_file, startup_script=None, batch=False, log_options=None,
+                 vfs_options=None, vfs=None, logger=None):
         self.vfs_name = "myvfs"
         self.running = True
         self.startup_script = startup_script
-        self.script_mode = False
+        # Пакетный режим: без баннера и приглашений, лог пишется через буфер
+        self.batch = batch
+        self.script_mode = batch
+        self.exit_code = None
+        self.commands_executed = 0
+        # Фоновые задания (cmd &): курсор и буфер вывода задания хранятся в данных потока
+        self.jobs = JobTable()
+        self._job_local = threading.local()
 
         # Инициализируем VFS
-        self.vfs = VirtualFileSystem(vfs_path)
+        # (vfs_options - лимит памяти и директория временных файлов, см. OutOfCore).
+        # Несколько сессий могут работать с одной VFS, у каждой свой курсор
+        if vfs is None:
+            self.vfs = VirtualFileSystem(vfs_path, quiet=batch, **(vfs_options or {}))
+            self.cursor = self.vfs.cursor
+        else:
+            self.vfs = vfs
+            self.cursor = vfs.open_cursor()
+
+        # Переменные сессии поверх переменных ОС (export, unset, $?)
+        self.environment = SessionEnvironment()
 
         # Получаем имя пользователя из переменных окружения
         username = os.environ.get("USER") or os.environ.get("USERNAME", "unknown")
 
         # Инициализируем логгер
-        self.logger = Logger(log_file, username)
+        # (log_options - уровень, выборка и ротация, см. Logger)
+        if logger is None:
+            logger = Logger(log_file, username, buffered=batch, **(log_options or {}))
+        self.logger = logger
+
+        # Обработчики команд: принимают аргументы и входной поток строк,
+        # возвращают итератор выходных строк (или None, если вывода нет)
+        self.commands = {
+            "exit": self._handle_exit_command,
+            "ls": self._handle_ls_command,
+            "cd": self._handle_cd_command,
+            "echo": self._handle_echo_command,
+            "env": self._handle_env_command,
+            "run": self._handle_run_command,
+            "pwd": self._handle_pwd_command,
+            "cat": self._handle_cat_command,
+            "grep": self._handle_grep_command,
+            "head": self._handle_head_command,
+            "search": self._handle_search_command,
+            "jobs": self._handle_jobs_command,
+            "wait": self._handle_wait_command,
+            "find": self._handle_find_command,
+            "rm": self._handle_rm_command,
+            "vfs-init": self._handle_vfs_init_command,
+            "vfs-cache": self._handle_vfs_cache_command,
+            "vfs-stats": self._handle_vfs_stats_command,
+            "vfs-verify": self._handle_vfs_verify_command,
+            "vfs-export": self._handle_vfs_export_command,
+            "vfs-diff": self._handle_vfs_diff_command,
+            "mount": self._handle_mount_command,
+            "umount": self._handle_umount_command,
+            "log-stats": self._handle_log_stats_command,
+            "profile": self._handle_profile_command,
+            "trace": self._handle_trace_command,
+            "export": self._handle_export_command,
+            "unset": self._handle_unset_command,
+        }
+
+        # Профилировщик выполнения команд (profile on|off|dump, --profile)
+        self.profiler = None
+
+        # Отсортированные имена команд для дополнения по префиксу
+        self.command_names = sorted(self.commands)
+        self._completions = []
 
         # Логируем старт системы
-        self.logger.log_event("SYSTEM_START", f"VFS: {vfs_path}, Script: {startup_script}")
+        self.logger.log_event("SYSTEM_START", f"VFS: {vfs_path}, Script: {startup_script}",
+                              level=LogLevel.DEBUG)
+
+    @property
+    def cursor(self):
+        """Курсор сессии; в потоке фонового задания - копия, снятая при его запуске"""
+        job_cursor = getattr(self._job_local, 'cursor', None)
+        return job_cursor if job_cursor is not None else self._cursor
+
+    @cursor.setter
+    def cursor(self, value):
+        self._cursor = value
+
+    def _emit(self, line):
+        """Выводит строку; в фоновом задании строка копится в его буфере"""
+        output = getattr(self._job_local, 'output', None)
+        if output is not None:
+            output.append(line)
+        else:
+            print(line)
 
     def expand_environment_variables(self, text):
-        """Раскрывает переменные окружения в тексте ($HOME, ${USER})"""
-
-        def replace_var(match):
-            var_name = match.group(1) or match.group(2)
-
-            # Специальная обработка для HOME, которая в Windows может быть USERPROFILE
-            if var_name == "HOME":
-                home_path = os.environ.get("HOME") or os.environ.get("USERPROFILE", "")
-                # Заменяем обратные слеши на прямые для consistency
-                return home_path.replace("\\", "/")
-            elif var_name == "USER":
-                return os.environ.get("USER") or os.environ.get("USERNAME", "")
-            else:
-                value = os.environ.get(var_name, f"${var_name}")
-                # Для путей заменяем обратные слеши на прямые
-                if "\\" in value:
-                    return value.replace("\\", "/")
-                return value
+        """Раскрывает переменные окружения в тексте ($HOME, ${USER}, $?)"""
+        return self.environment.expand(text)
 
-        pattern = r'\$\{([^}]+)\}|\$([a-zA-Z_][a-zA-Z0-9_]*)'
-        return re.sub(pattern, replace_var, text)
+    @property
+    def last_status(self):
+        """Код завершения последней команды (0 - успех)"""
+        return self.environment.last_status
 
-    def parse_command(self, input_line):
-        """Парсит команду с раскрытием переменных окружения"""
-        try:
+    def _parse_tokens(self, input_line):
+        """Раскрывает переменные и шаблоны, возвращает слова и операторы"""
+        with tracer.span("parse_command", "shell", input_line):
             # Сначала раскрываем переменные окружения
-            expanded_line = self.expand_environment_variables(input_line)
+            with tracer.span("expand_variables", "shell"):
+                expanded_line = self.expand_environment_variables(input_line)
             # Затем разбиваем на части с учетом кавычек
-            return shlex.split(expanded_line)
+            tokens = tokenize(expanded_line)
+
+            # Раскрываем шаблоны (*, ?, [...], **) по VFS; без совпадений слово остается как есть
+            parts = []
+            for token in tokens:
+                if isinstance(token, Operator):
+                    parts.append(token)
+                    continue
+                if token.is_glob:
+                    with tracer.span("expand_glob", "shell", token.pattern):
+                        matches = expand_glob(self.vfs, token.pattern, self.cursor)
+                    if matches:
+                        parts.extend(matches)
+                        continue
+                parts.append(token.text)
+            return parts
+
+    def parse_command(self, input_line):
+        """Парсит команду с раскрытием переменных окружения и шаблонов путей"""
+        try:
+            parts = self._parse_tokens(input_line)
         except ValueError as e:
             print(f"Ошибка парсинга команды: {e}")
             return []
+        return [part.text if isinstance(part, Operator) else part for part in parts]
+
+    def parse_pipeline(self, input_line):
+        """Парсит строку в список команд конвейера (cmd | cmd > file)"""
+        try:
+            return split_pipeline(self._parse_tokens(input_line))
+        except ValueError as e:
+            print(f"Ошибка парсинга команды: {e}")
+            return []
+
+    def _parse_job(self, input_line):
+        """Парсит строку в конвейер и признак фонового выполнения ('&' в конце)"""
+        try:
+            tokens = self._parse_tokens(input_line)
+            background = bool(tokens) and tokens[-1] == Operator('&')
+            if background:
+                tokens = tokens[:-1]
+                if not tokens:
+                    raise ValueError("синтаксическая ошибка рядом с '&'")
+            return split_pipeline(tokens), background
+        except ValueError as e:
+            print(f"Ошибка парсинга команды: {e}")
+            return [], False
+
+    def execute_line(self, input_line):
+        """Парсит и выполняет строку ввода, включая конвейеры, перенаправления
+        и последовательности команд через ';'"""
+        for command_line in split_commands(input_line):
+            if self.profiler is not None and self.profiler.running:
+                with self.profiler.measure():
+                    self._execute_command_line(command_line)
+            else:
+                self._execute_command_line(command_line)
+            if not self.running:
+                break
+        return self.last_status
+
+    def _execute_command_line(self, command_line):
+        """Разбирает и выполняет одну команду или конвейер (с '&' в конце - в фоне)"""
+        # Вывод завершившихся фоновых заданий показывается между командами
+        self.flush_jobs()
+        stages, background = self._parse_job(command_line)
+        if not stages:
+            return
+        if background:
+            self.start_job(command_line, stages)
+        else:
+            self.execute_pipeline(stages)
+
+    def start_job(self, command_line, stages):
+        """Запускает конвейер фоновым заданием, если он только читает VFS"""
+        for stage in stages:
+            if stage.argv[0] not in BACKGROUND_SAFE_COMMANDS or stage.redirect:
+                # Изменения VFS и текущей директории (и запись на диск) выполняются строго по порядку
+                print(f"{stage.argv[0]}: команда изменяет VFS, текущую директорию или файлы на диске, "
+                      f"выполняется без '&'")
+                self.execute_pipeline(stages)
+                return
+        self.commands_executed += 1
+        command = command_line.strip().rstrip('&').rstrip()
+        job = self.jobs.submit(command, stages, self.cursor.copy(), self._run_job)
+        self.environment.last_status = 0
+        if not self.script_mode:
+            print(f"[{job.number}] {command}")
+
+    def _run_job(self, job):
+        """Выполняет конвейер задания в потоке пула, собирая вывод в буфер задания"""
+        self._job_local.cursor = job.cursor
+        self._job_local.output = job.output
+        try:
+            return self.execute_pipeline(job.stages)
+        finally:
+            self._job_local.cursor = None
+            self._job_local.output = None
+
+    def flush_jobs(self, wait=False):
+        """Выводит буферы завершенных заданий в порядке запуска (wait - дождаться всех)"""
+        if wait:
+            self.jobs.wait()
+        for job in self.jobs.collect():
+            for line in job.output:
+                print(line)
+            if job.future.exception() is not None:
+                print(f"[{job.number}] Ошибка выполнения: {job.future.exception()}")
+            if not self.script_mode:
+                print(f"[{job.number}] Завершено (код {job.status}): {job.command}")
+
+    def run_batch(self, lines):
+        """Выполняет команды без баннера и приглашения, возвращает код завершения"""
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            self.execute_line(line)
+            if not self.running:
+                break
+
+        self.flush_jobs(wait=True)
+        self.logger.flush()
+        return self.exit_code if self.exit_code is not None else self.last_status
 
     def execute_script(self, script_path):
         """Выполняет скрипт с комментариями и имитацией диалога"""
+        with tracer.span("execute_script", "shell", script_path):
+            return self._execute_script(script_path)
+
+    def _execute_script(self, script_path):
         if not os.path.exists(script_path):
             error_msg = f"Скрипт не найден: {script_path}"
             print(error_msg)
-            self.logger.log_event("SCRIPT_EXECUTION", script_path, error_msg)
+            self.logger.log_event("SCRIPT_EXECUTION", script_path, error_msg, level=LogLevel.ERROR)
             return False
 
         original_script_mode = self.script_mode
         self.script_mode = True
+        line_num = 0
+        script_file = None
 
         try:
+            # Скрипт читается один раз потоком строк: память не зависит от его длины
+            script_file = open(script_path, 'rb')
             print(f"\n=== Выполнение скрипта: {script_path} ===")
-            self.logger.log_event("SCRIPT_START", script_path)
-
-            # Пробуем разные кодировки для чтения файла
-            encodings = ['utf-8', 'cp1251', 'cp866', 'iso-8859-1']
-            lines = []
+            self.logger.log_event("SCRIPT_START", script_path, level=LogLevel.DEBUG)
 
-            for encoding in encodings:
-                try:
-                    with open(script_path, 'r', encoding=encoding) as f:
-                        lines = f.readlines()
-                    print(f"Файл прочитан в кодировке: {encoding}")
-                    break
-                except UnicodeDecodeError:
-                    continue
-            else:
-                # Если ни одна кодировка не подошла, читаем как байты
-                with open(script_path, 'rb') as f:
-                    content = f.read()
-                    # Пробуем декодировать с заменой ошибок
-                    lines = content.decode('utf-8', errors='replace').splitlines()
-                    print("Файл прочитан с заменой ошибок кодировки")
-
-            for line_num, line in enumerate(lines, 1):
+            for line_num, line in self._script_lines(script_file):
                 line = line.strip()
 
                 if not line:
@@ -104,106 +314,404 @@ class ShellEmulator:
                     print(f"# {line[1:].strip()}")
                     continue
 
-                # ИСПРАВЛЕНИЕ: используем self.vfs.get_current_path() вместо self.current_dir
-                current_vfs_path = self.vfs.get_current_path()
+                # ИСПРАВЛЕНИЕ: используем self.vfs.get_current_path(self.cursor) вместо self.current_dir
+                current_vfs_path = self.vfs.get_current_path(self.cursor)
                 prompt = f"{self.vfs_name}:{current_vfs_path}$ {line}"
                 print(prompt)
 
-                parts = self.parse_command(line)
-                if parts:
-                    command = parts[0]
-                    args = parts[1:]
-                    self.execute_command(command, args)
-
-                    if command == "exit":
-                        break
+                self.execute_line(line)
+                if not self.running:
+                    break
 
+            self.flush_jobs(wait=True)
             print(f"=== Завершение скрипта: {script_path} ===\n")
-            self.logger.log_event("SCRIPT_END", script_path, "Успешное выполнение")
+            self.logger.log_event("SCRIPT_END", script_path, "Успешное выполнение", level=LogLevel.DEBUG)
             return True
 
         except Exception as e:
             error_msg = f"Ошибка выполнения скрипта {script_path} на строке {line_num}: {e}"
             print(error_msg)
-            self.logger.log_event("SCRIPT_ERROR", script_path, error_msg)
+            self.logger.log_event("SCRIPT_ERROR", script_path, error_msg, level=LogLevel.ERROR)
             return False
 
         finally:
+            if script_file is not None:
+                script_file.close()
             self.script_mode = original_script_mode
 
+    def _script_lines(self, script_file):
+        """Построчно декодирует скрипт, определяя кодировку по началу файла.
+
+        Кодировка выбирается по первым SCRIPT_SAMPLE_SIZE байтам. Если дальше
+        встречается строка, которую она не декодирует, для оставшейся части
+        файла берется следующая подходящая кодировка из списка.
+        """
+        with tracer.span("load_script", "shell"):
+            sample = script_file.read(SCRIPT_SAMPLE_SIZE)
+            script_file.seek(0)
+            position = 0
+            for position, encoding in enumerate(SCRIPT_ENCODINGS):
+                try:
+                    # Неполный многобайтовый символ на границе образца ошибкой не считается
+                    codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+                    break
+                except UnicodeDecodeError:
+                    continue
+        print(f"Кодировка файла: {SCRIPT_ENCODINGS[position]}")
+
+        for line_num, raw in enumerate(script_file, 1):
+            while True:
+                try:
+                    line = raw.decode(SCRIPT_ENCODINGS[position])
+                    break
+                except UnicodeDecodeError:
+                    # iso-8859-1 декодирует любые байты, поэтому перебор всегда завершается
+                    position += 1
+                    print(f"Строка {line_num} не в прежней кодировке, далее используется: "
+                          f"{SCRIPT_ENCODINGS[position]}")
+            yield line_num, line
+
     def execute_command(self, command, args):
-        """Обрабатывает команду и аргументы"""
+        """Обрабатывает команду и аргументы, выводя результат на экран"""
+        status = [0]
+        with tracer.span("execute_command", "shell", command):
+            for line in self._run_stage(command, args, None, status):
+                print(line)
+        self.environment.last_status = status[0]
+        return status[0]
+
+    def execute_pipeline(self, stages):
+        """Выполняет конвейер: каждая команда лениво читает вывод предыдущей"""
+        streams = []
+        stream = None
+        status = [0]
+        background = getattr(self._job_local, 'output', None) is not None
+        if not background:
+            self.commands_executed += 1
+        # Подпись отрезка собирается, только если трассировка включена
+        detail = " | ".join(" ".join(stage.argv) for stage in stages) if tracer.enabled else None
+        with tracer.span("execute_command", "shell", detail):
+            try:
+                for stage in stages:
+                    # Код завершения конвейера - код последней команды
+                    status = [0]
+                    stream = self._run_stage(stage.argv[0], stage.argv[1:], stream, status)
+                    streams.append(stream)
+                    if stage.redirect:
+                        stream = self._redirect_output(stage.redirect, stream, status)
+                        streams.append(stream)
+
+                for line in stream:
+                    self._emit(line)
+            finally:
+                # Досрочно закрываем предыдущие команды (например, после head)
+                for opened in reversed(streams):
+                    opened.close()
+                # Фоновое задание не меняет $? сессии
+                if not background:
+                    self.environment.last_status = status[0]
+        return status[0]
+
+    def _run_stage(self, command, args, stdin, status):
+        """Генератор вывода одной команды конвейера; ошибки выводятся и пишутся в лог,
+        код завершения записывается в status[0]"""
         error_message = ""
-
         try:
-            if command == "exit":
-                self.running = False
-                if not self.script_mode:
-                    print("Выход из эмулятора")
+            handler = self.commands.get(command)
+            if handler is None:
+                name, sep, value = command.partition('=')
+                if sep and NAME_PATTERN.match(name) and not args:
+                    # Присваивание NAME=value без export
+                    self.environment.set(name, value)
+                    return
+                status[0] = 127
+                raise CommandError(f"{command}: команда не найдена")
+            output = handler(args, stdin)
+            if output is not None:
+                yield from output
+
+        except CommandError as e:
+            error_message = str(e)
+            status[0] = status[0] or 1
+            self._emit(error_message)
 
-            elif command == "ls":
-                self._handle_ls_command(args)
+        except Exception as e:
+            error_message = f"Ошибка выполнения: {str(e)}"
+            status[0] = 1
+            self._emit(error_message)
 
-            elif command == "cd":
-                self._handle_cd_command(args)
+        finally:
+            # Аргументы записываются в кавычках оболочки, чтобы replay.py разобрал их обратно без потерь
+            arguments_str = shlex.join(args) if args else ""
+            self.logger.log_event(command, arguments_str, error_message)
 
-            elif command == "echo":
-                if args:
-                    print(' '.join(args))
-                else:
-                    print()
+    def _redirect_output(self, redirect, stream, status):
+        """Записывает поток строк в файл VFS (> перезаписывает, >> дописывает)"""
+        operator, path = redirect
+        chunks = (line + "\n" for line in stream)
+        if not self.vfs.write_file(path, chunks, append=(operator == '>>'), cursor=self.cursor):
+            status[0] = 1
+            self._emit(f"{path}: невозможно записать файл")
+        yield from ()
+
+    def _open_input(self, args, stdin):
+        """Возвращает поток строк из файлов VFS, а без аргументов - входной поток"""
+        if not args:
+            if stdin is not None:
+                yield from stdin
+            return
+
+        for path in args:
+            node = self.vfs.resolve_path(path, self.cursor)
+            if not node:
+                raise CommandError(f"{path}: Нет такого файла или каталога")
+            if node.type != FileType.FILE:
+                raise CommandError(f"{path}: Это каталог")
+
+            # Читаем файл построчно из потока, не загружая его в память целиком
+            with io.TextIOWrapper(self.vfs.open_stream(path, self.cursor), encoding='utf-8', errors='replace') as stream:
+                for line in stream:
+                    yield line.rstrip('\n')
+
+    def _handle_exit_command(self, args, stdin):
+        """Обрабатывает команду exit [код]"""
+        if args:
+            try:
+                self.exit_code = int(args[0])
+            except ValueError:
+                raise CommandError(f"exit: {args[0]}: требуется числовой аргумент")
+        else:
+            self.exit_code = self.last_status
+        self.running = False
+        if not self.script_mode:
+            print("Выход из эмулятора")
 
-            elif command == "env":
-                self._handle_env_command()
+    def _handle_echo_command(self, args, stdin):
+        """Обрабатывает команду echo"""
+        yield ' '.join(args)
 
-            elif command == "run":
-                if args:
-                    script_path = args[0]
-                    self.execute_script(script_path)
-                else:
-                    error_message = "run: отсутствует путь к скрипту"
-                    print(error_message)
+    def _handle_run_command(self, args, stdin):
+        """Обрабатывает команду run - выполняет скрипт"""
+        if not args:
+            raise CommandError("run: отсутствует путь к скрипту")
+        self.execute_script(args[0])
 
-            elif command == "pwd":
-                self._handle_pwd_command()
+    def _handle_cat_command(self, args, stdin):
+        """Обрабатывает команду cat - выводит содержимое файлов построчно"""
+        return self._open_input(args, stdin)
 
-            elif command == "vfs-init":
-                self._handle_vfs_init_command(args)
+    def _handle_rm_command(self, args, stdin):
+        """Обрабатывает команду rm файл [файлы...]"""
+        if not args:
+            raise CommandError("rm: отсутствует операнд")
+        for path in args:
+            node = self.vfs.resolve_path(path, self.cursor)
+            if node is not None and node.type == FileType.DIRECTORY:
+                raise CommandError(f"rm: невозможно удалить '{path}': Это каталог")
+            if not self.vfs.remove_file(path, self.cursor):
+                raise CommandError(f"rm: невозможно удалить '{path}': Нет такого файла или каталога")
+
+    def _handle_grep_command(self, args, stdin):
+        """Обрабатывает команду grep [-i] [-v] [-n] [-c] шаблон [файлы...]"""
+        flags = set()
+        while args and args[0].startswith('-') and len(args[0]) > 1:
+            for flag in args[0][1:]:
+                if flag not in 'ivnc':
+                    raise CommandError(f"grep: неизвестный ключ -{flag}")
+                flags.add(flag)
+            args = args[1:]
 
+        if not args:
+            raise CommandError("grep: отсутствует шаблон")
+
+        try:
+            regex = re.compile(args[0], re.IGNORECASE if 'i' in flags else 0)
+        except re.error as e:
+            raise CommandError(f"grep: некорректный шаблон: {e}")
+
+        invert = 'v' in flags
+        count = 0
+        for line_num, line in enumerate(self._open_input(args[1:], stdin), 1):
+            if (regex.search(line) is not None) != invert:
+                count += 1
+                if 'c' not in flags:
+                    yield f"{line_num}:{line}" if 'n' in flags else line
+        if 'c' in flags:
+            yield str(count)
+
+    def _handle_search_command(self, args, stdin):
+        """Обрабатывает команду search [-i] [-l] строка [директория] - поиск подстроки
+        в текстовых файлах с отбором кандидатов по индексу содержимого"""
+        flags = set()
+        while args and args[0].startswith('-') and len(args[0]) > 1:
+            for flag in args[0][1:]:
+                if flag not in 'il':
+                    raise CommandError(f"search: неизвестный ключ -{flag}")
+                flags.add(flag)
+            args = args[1:]
+        if not args or len(args) > 2:
+            raise CommandError("search: использование: search [-i] [-l] строка [директория]")
+
+        query = args[0]
+        path = args[1] if len(args) > 1 else '.'
+        candidates = self.vfs.search_candidates(query, path, self.cursor)
+        if candidates is None:
+            raise CommandError(f"search: {path}: Нет такого каталога")
+
+        ignore_case = 'i' in flags
+        needle = query.lower() if ignore_case else query
+        for file_path in candidates:
+            stream = self.vfs.open_stream(file_path, self.cursor)
+            if stream is None:
+                continue
+            # Индекс дает только кандидатов, совпадение подтверждается чтением файла
+            with io.TextIOWrapper(stream, encoding='utf-8', errors='replace') as lines:
+                for line_num, line in enumerate(lines, 1):
+                    line = line.rstrip('\n')
+                    if needle in (line.lower() if ignore_case else line):
+                        if 'l' in flags:
+                            yield file_path
+                            break
+                        yield f"{file_path}:{line_num}:{line}"
+
+    def _handle_find_command(self, args, stdin):
+        """Обрабатывает команду find [директория] [-type f|d] [-name шаблон] [-size [+-]N[KMG]]
+        [-mtime [+-]дни] [-maxdepth N] [-top N] [-summary]; условия проверяются
+        по колоночной таблице метаданных, без обхода узлов дерева"""
+        path = '.'
+        if args and not args[0].startswith('-'):
+            path, args = args[0], args[1:]
+
+        query = MetadataQuery()
+        top = None
+        summary = False
+        while args:
+            option, args = args[0], args[1:]
+            if option == '-summary':
+                summary = True
+                continue
+            if option not in ('-type', '-name', '-size', '-mtime', '-maxdepth', '-top'):
+                raise CommandError(f"find: неизвестный предикат '{option}'")
+            if not args:
+                raise CommandError(f"find: предикат {option} требует аргумент")
+            value, args = args[0], args[1:]
+
+            if option == '-type':
+                if value not in ('f', 'd'):
+                    raise CommandError(f"find: неизвестный тип '{value}'")
+                query.type = ROW_FILE if value == 'f' else ROW_DIRECTORY
+            elif option == '-name':
+                query.name = value
+            elif option == '-size':
+                sign, size = self._parse_find_number(option, value, FIND_SIZE_UNITS)
+                # Как в find: +N - больше N, -N - меньше N, N - ровно N
+                if sign != '-':
+                    query.min_size = size if sign == '+' else size - 1
+                if sign != '+':
+                    query.max_size = size if sign == '-' else size + 1
+            elif option == '-mtime':
+                sign, days = self._parse_find_number(option, value, {})
+                boundary = time.time() - days * 86400
+                if sign != '+':
+                    query.newer_than = boundary if sign == '-' else boundary - 86400
+                if sign != '-':
+                    query.older_than = boundary
             else:
-                error_message = f"{command}: команда не найдена"
-                print(error_message)
+                try:
+                    number = int(value)
+                except ValueError:
+                    number = -1
+                if number < 0:
+                    raise CommandError(f"find: {option}: некорректное число '{value}'")
+                if option == '-maxdepth':
+                    query.max_depth = number
+                else:
+                    top = number
+
+        if summary:
+            result = self.vfs.find_summary(path, query, self.cursor)
+            if result is None:
+                raise CommandError(f"find: '{path}': Нет такого файла или каталога")
+            yield (f"Найдено: {result['files'] + result['directories']} (файлов: {result['files']}, "
+                   f"директорий: {result['directories']}), общий размер файлов: {result['total_size']} байт")
+            return
+
+        found = self.vfs.find(path, query, top, self.cursor)
+        if found is None:
+            raise CommandError(f"find: '{path}': Нет такого файла или каталога")
+        prefix = path.rstrip('/') or '/'
+        for relative, is_dir, size in found:
+            if not relative:
+                display = path
+            else:
+                display = prefix + relative if prefix == '/' else f"{prefix}/{relative}"
+            # С -top выводится и размер, чтобы список читался как отчет
+            yield f"{size:>12}  {display}" if top is not None else display
+
+    @staticmethod
+    def _parse_find_number(option, value, units):
+        """Разбирает аргумент вида [+|-]N[единица] и возвращает знак и число"""
+        sign = value[0] if value[:1] in ('+', '-') else ''
+        text = value[len(sign):]
+        multiplier = 1
+        if text and text[-1] in units:
+            multiplier, text = units[text[-1]], text[:-1]
+        try:
+            number = float(text)
+        except ValueError:
+            raise CommandError(f"find: {option}: некорректное значение '{value}'")
+        return sign, number * multiplier
+
+    def _handle_head_command(self, args, stdin):
+        """Обрабатывает команду head [-n N] [файлы...]"""
+        limit = 10
+        if args and args[0] == '-n':
+            if len(args) < 2:
+                raise CommandError("head: ключ -n требует аргумент")
+            limit, args = args[1], args[2:]
+        elif args and args[0].startswith('-') and args[0][1:].isdigit():
+            limit, args = args[0][1:], args[1:]
 
-        except Exception as e:
-            error_message = f"Ошибка выполнения: {str(e)}"
-            print(error_message)
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise CommandError(f"head: некорректное число строк: {limit}")
 
-        finally:
-            arguments_str = ' '.join(args) if args else ""
-            self.logger.log_event(command, arguments_str, error_message)
+        # islice прекращает чтение входа сразу после limit строк
+        return islice(self._open_input(args, stdin), max(limit, 0))
 
-    def _handle_ls_command(self, args):
+    def _handle_ls_command(self, args, stdin):
         """Обрабатывает команду ls с поддержкой VFS"""
-        path = args[0] if args else ""
+        paths = args or [""]
 
-        try:
-            entries = self.vfs.list_directory(path)
+        for index, path in enumerate(paths):
+            target = self.vfs.resolve_path(path, self.cursor)
+            if target is None:
+                raise CommandError(f"ls: невозможно получить доступ к '{path}': Нет такого файла или каталога")
 
-            if entries is None:
-                print(f"ls: невозможно получить доступ к '{path}': Нет такого файла или каталога")
-                return
+            if target.type != FileType.DIRECTORY:
+                yield path
+                continue
+
+            try:
+                entries = self.vfs.list_directory(path, self.cursor)
+            except Exception as e:
+                raise CommandError(f"ls: ошибка при получении списка файлов: {e}")
+
+            # При нескольких путях выводим заголовок для каждой директории
+            if len(paths) > 1:
+                if index > 0:
+                    yield ""
+                yield f"{path}:"
 
             # Простой вывод (можно улучшить форматирование позже)
             for entry in entries:
                 if entry['type'] == 'directory':
-                    print(f"{entry['name']}/")
+                    yield f"{entry['name']}/"
                 else:
-                    print(entry['name'])
+                    yield entry['name']
 
-        except Exception as e:
-            print(f"ls: ошибка при получении списка файлов: {e}")
-
-    def _handle_cd_command(self, args):
+    def _handle_cd_command(self, args, stdin):
         """Обрабатывает команду cd с поддержкой VFS"""
         if not args:
             # cd без аргументов - переход в домашнюю директорию
@@ -211,27 +719,326 @@ class ShellEmulator:
         else:
             path = args[0]
 
-        success = self.vfs.change_directory(path)
+        success = self.vfs.change_directory(path, self.cursor)
         if not success:
-            print(f"cd: {path}: Нет такого файла или каталога")
-
-    def _handle_pwd_command(self):
+            raise CommandError(f"cd: {path}: Нет такого файла или каталога")
+
+    def _handle_jobs_command(self, args, stdin):
+        """Обрабатывает команду jobs - список фоновых заданий, вывод которых еще не показан"""
+        for number in sorted(self.jobs.jobs):
+            job = self.jobs.jobs[number]
+            state = f"Завершено (код {job.status})" if job.done else "Выполняется"
+            yield f"[{number}]  {state:<22} {job.command}"
+
+    def _handle_wait_command(self, args, stdin):
+        """Обрабатывает команду wait [номер...] - ожидание фоновых заданий
+        (по умолчанию всех) и вывод их буферов"""
+        numbers = []
+        for arg in args:
+            number = arg.lstrip('%')
+            if not number.isdigit() or int(number) not in self.jobs.jobs:
+                raise CommandError(f"wait: {arg}: нет такого задания")
+            numbers.append(int(number))
+        statuses = [self.jobs.jobs[number] for number in numbers]
+        self.jobs.wait(numbers or None)
+        # Код завершения wait - код последнего ожидаемого задания
+        last = statuses[-1].status if statuses else 0
+        self.flush_jobs()
+        if last:
+            raise CommandError(f"wait: задание завершилось с кодом {last}")
+
+    def _handle_pwd_command(self, args, stdin):
         """Обрабатывает команду pwd"""
-        current_path = self.vfs.get_current_path()
-        print(current_path)
+        yield self.vfs.get_current_path(self.cursor)
 
-    def _handle_env_command(self):
+    def _handle_env_command(self, args, stdin):
         """Обрабатывает команду env"""
-        print("Переменные окружения:")
-        home_path = os.environ.get("HOME") or os.environ.get("USERPROFILE", "")
-        userprofile = os.environ.get("USERPROFILE", "не установлена")
+        yield "Переменные окружения:"
+        home_path = self.environment.lookup("HOME")
+        userprofile = self.environment.get("USERPROFILE", "не установлена")
+
+        yield "  HOME: " + home_path
+        yield "  USERPROFILE: " + userprofile.replace("\\", "/")
+        yield f"  USER: {self.environment.get('USER', 'не установлена')}"
+        yield f"  USERNAME: {self.environment.get('USERNAME', 'не установлена')}"
+        yield f"  VFS_PATH: {self.vfs.vfs_path}"
+        yield f"  CURRENT_VFS_DIR: {self.vfs.get_current_path(self.cursor)}"
+        for name, value in self.environment.session_items():
+            yield f"  {name}: {value}"
+
+    def _handle_export_command(self, args, stdin):
+        """Обрабатывает команду export NAME=value [NAME...]"""
+        if not args:
+            for name, value in self.environment.session_items():
+                yield f'export {name}="{value}"'
+            return
+
+        for arg in args:
+            name, sep, value = arg.partition('=')
+            if not NAME_PATTERN.match(name):
+                raise CommandError(f"export: '{arg}': неверный идентификатор")
+            if sep:
+                self.environment.set(name, value)
+            elif name not in self.environment:
+                self.environment.set(name, "")
+
+    def _handle_unset_command(self, args, stdin):
+        """Обрабатывает команду unset NAME [NAME...]"""
+        for name in args:
+            if not NAME_PATTERN.match(name):
+                raise CommandError(f"unset: '{name}': неверный идентификатор")
+            self.environment.unset(name)
+
+    def _handle_vfs_cache_command(self, args, stdin):
+        """Обрабатывает команду vfs-cache - выводит счетчики кэша содержимого"""
+        stats = content_cache.stats()
+        budget = stats['budget_bytes']
+        yield "Кэш содержимого VFS:"
+        yield f"  Бюджет: {budget if budget is not None else 'не ограничен'} байт"
+        yield f"  Занято: {stats['used_bytes']} байт"
+        yield f"  В памяти: {stats['resident_nodes']} файлов, сжато: {stats['compressed_nodes']} файлов"
+        yield f"  Попадания: {stats['hits']}, промахи: {stats['misses']} ({stats['hit_ratio']:.1%})"
+        yield (f"  Вытеснения: {stats['evictions']}, сжатия: {stats['compressions']}, "
+               f"распаковки: {stats['decompressions']}")
+        if self.vfs.out_of_core is not None:
+            yield f"  Лимит памяти: {self.vfs.out_of_core.max_memory} байт"
+            if self.vfs.node_index is not None:
+                yield f"  Индекс узлов (SQLite): {self.vfs.node_index.entry_count} записей"
+            yield f"  Распаковано во временные файлы: {self.vfs.spill_store.spilled_bytes} байт"
+
+    def _handle_vfs_stats_command(self, args, stdin):
+        """Обрабатывает команду vfs-stats [-n N] - выводит учет памяти дерева VFS"""
+        top = 10
+        if args:
+            if len(args) != 2 or args[0] != '-n' or not args[1].isdigit():
+                raise CommandError("vfs-stats: использование: vfs-stats [-n N]")
+            top = int(args[1])
+        stats = collect_memory_stats(self.vfs, top)
+        return format_memory_report(stats, self.vfs.load_snapshot, top)
+
+    def _handle_vfs_verify_command(self, args, stdin):
+        """Обрабатывает команду vfs-verify [-f] [-j N] - проверяет CRC файлов источника"""
+        usage = "vfs-verify: использование: vfs-verify [-f] [-j N]"
+        force = False
+        workers = None
+        while args:
+            if args[0] == '-f':
+                force = True
+                args = args[1:]
+            elif args[0] == '-j' and len(args) > 1 and args[1].isdigit() and int(args[1]) > 0:
+                workers = int(args[1])
+                args = args[2:]
+            else:
+                raise CommandError(usage)
+
+        report = self.vfs.verify(workers, force)
+        if report is None:
+            raise CommandError("vfs-verify: VFS не загружена из архива или директории")
+
+        rate = report.checked_bytes / report.elapsed / 1024 ** 2 if report.elapsed > 0 else 0.0
+        yield (f"Проверено файлов: {report.checked} ({report.checked_bytes} байт) за {report.elapsed:.3f} с "
+               f"({rate:.1f} МБ/с)")
+        if report.skipped:
+            yield f"Проверены ранее (при загрузке или чтении): {report.skipped}"
+        if report.corrupt:
+            yield f"Поврежденных файлов: {len(report.corrupt)}"
+            for path, error in sorted(report.corrupt.items()):
+                yield f"  {path}: {error}"
+            raise CommandError(f"vfs-verify: найдено поврежденных файлов: {len(report.corrupt)}")
+        yield "Поврежденных файлов не найдено"
+
+    def _handle_vfs_export_command(self, args, stdin):
+        """Обрабатывает команду vfs-export [-l N] [-s] [-j N] путь - сохраняет VFS в ZIP-архив"""
+        usage = "vfs-export: использование: vfs-export [-l 0-9] [-s] [-j N] путь"
+        level = 6
+        store_compressed = False
+        workers = None
+        while len(args) > 1:
+            if args[0] == '-s':
+                store_compressed = True
+                args = args[1:]
+            elif args[0] == '-l' and len(args) > 2 and args[1].isdigit() and int(args[1]) <= 9:
+                level = int(args[1])
+                args = args[2:]
+            elif args[0] == '-j' and len(args) > 2 and args[1].isdigit() and int(args[1]) > 0:
+                workers = int(args[1])
+                args = args[2:]
+            else:
+                raise CommandError(usage)
+        if len(args) != 1 or args[0].startswith('-'):
+            raise CommandError(usage)
+
+        path = os.path.abspath(os.path.expanduser(args[0]))
+        if self.vfs.vfs_path and os.path.abspath(self.vfs.vfs_path) == path:
+            raise CommandError("vfs-export: нельзя перезаписать архив, из которого загружена VFS")
+        try:
+            stats = export_vfs(self.vfs, path, level, store_compressed, workers)
+        except OSError as e:
+            raise CommandError(f"vfs-export: {e}")
+
+        ratio = stats.output_bytes / stats.input_bytes if stats.input_bytes else 0.0
+        rate = stats.input_bytes / stats.elapsed / 1024 ** 2 if stats.elapsed > 0 else 0.0
+        yield f"Экспортировано в {path}: файлов {stats.files}, директорий {stats.directories}"
+        yield (f"Размер: {stats.input_bytes} -> {stats.output_bytes} байт ({ratio:.1%}) "
+               f"за {stats.elapsed:.3f} с ({rate:.1f} МБ/с)")
+
+    def _handle_vfs_diff_command(self, args, stdin):
+        """Обрабатывает команду vfs-diff [-s] [старый новый] - сравнивает два архива
+        или (без аргументов) дерево VFS с его источником"""
+        usage = "vfs-diff: использование: vfs-diff [-s] [старый новый]"
+        summary_only = bool(args) and args[0] == '-s'
+        if summary_only:
+            args = args[1:]
+        if len(args) not in (0, 2) or any(arg.startswith('-') for arg in args):
+            raise CommandError(usage)
+
+        stats = DiffStats()
+        if args:
+            changes = diff_paths(args[0], args[1], stats)
+        elif self.vfs.backend is None:
+            raise CommandError("vfs-diff: VFS не загружена из архива или директории")
+        else:
+            changes = diff_session(self.vfs, stats)
 
-        print("  HOME: " + home_path.replace("\\", "/"))
-        print("  USERPROFILE: " + userprofile.replace("\\", "/"))
-        print(f"  USER: {os.environ.get('USER', 'не установлена')}")
-        print(f"  USERNAME: {os.environ.get('USERNAME', 'не установлена')}")
-        print(f"  VFS_PATH: {self.vfs.vfs_path}")
-        print(f"  CURRENT_VFS_DIR: {self.vfs.get_current_path()}")
+        try:
+            # Различия выводятся по мере обнаружения, не дожидаясь конца сравнения
+            for change in changes:
+                if not summary_only:
+                    yield f"{change.kind} {change.path}" + (f"  ({change.detail})" if change.detail else "")
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            raise CommandError(f"vfs-diff: {e}")
+
+        summary = (f"Добавлено: {stats.added}, удалено: {stats.removed}, изменено: {stats.modified}, "
+                   f"только метаданные: {stats.metadata}")
+        # Для дерева VFS неизмененные файлы источника не перебираются и не считаются
+        yield summary + (f", без изменений: {stats.unchanged}" if args else "")
+        yield f"Прочитано содержимое файлов: {stats.content_reads}, время: {stats.elapsed:.3f} с"
+
+    def _handle_mount_command(self, args, stdin):
+        """Обрабатывает команду mount [путь] - монтирует слой поверх VFS или выводит список слоев"""
+        if len(args) > 1:
+            raise CommandError("mount: использование: mount [путь к архиву или директории]")
+        if args:
+            try:
+                self.vfs.mount(args[0])
+            except (OSError, ValueError, zipfile.BadZipFile) as e:
+                raise CommandError(f"mount: {e}")
+            return None
+        lines = ["Слои VFS (сверху вниз):", "  [сессия] изменения в памяти"]
+        lines.extend(f"  {path}" for path in self.vfs.layer_paths())
+        return lines
+
+    def _handle_umount_command(self, args, stdin):
+        """Обрабатывает команду umount путь - отключает смонтированный слой"""
+        if len(args) != 1:
+            raise CommandError("umount: использование: umount путь")
+        try:
+            self.vfs.umount(args[0])
+        except ValueError as e:
+            raise CommandError(f"umount: {e}")
+
+    def start_profiling(self, sampling=False, interval=0.005):
+        """Включает профилирование команд; данные профилировщика того же типа накапливаются"""
+        kind = SamplingProfiler.kind if sampling else CommandProfiler.kind
+        if self.profiler is None or self.profiler.kind != kind:
+            if self.profiler is not None:
+                self.profiler.stop()
+            self.profiler = SamplingProfiler(interval) if sampling else CommandProfiler()
+        self.profiler.start()
+
+    def _handle_profile_command(self, args, stdin):
+        """Обрабатывает команду profile on [sample [мс]] | off | dump [N | файл]"""
+        usage = "profile: использование: profile on [sample [мс]] | off | dump [N | файл]"
+        if not args:
+            raise CommandError(usage)
+
+        action = args[0]
+        if action == "on":
+            sampling = len(args) > 1 and args[1] == "sample"
+            if len(args) > 1 and not sampling or len(args) > 3:
+                raise CommandError(usage)
+            interval = 0.005
+            if len(args) == 3:
+                try:
+                    interval = float(args[2]) / 1000
+                except ValueError:
+                    raise CommandError(f"profile: некорректный интервал: {args[2]}")
+                if interval <= 0:
+                    raise CommandError(f"profile: некорректный интервал: {args[2]}")
+            self.start_profiling(sampling, interval)
+            yield f"Профилирование включено ({self.profiler.kind})"
+
+        elif action == "off":
+            if self.profiler is None or not self.profiler.running:
+                raise CommandError("profile: профилирование не включено")
+            self.profiler.stop()
+            yield "Профилирование выключено"
+
+        elif action == "dump":
+            if self.profiler is None:
+                raise CommandError("profile: профилирование не включалось")
+            if len(args) > 2:
+                raise CommandError(usage)
+            target = args[1] if len(args) == 2 else "20"
+            if target.isdigit():
+                yield from self.profiler.top(int(target))
+            else:
+                try:
+                    # Файл сохраняется на реальной файловой системе для pstats и flamegraph
+                    self.profiler.dump(target)
+                except OSError as e:
+                    raise CommandError(f"profile: не удалось сохранить профиль: {e}")
+                yield f"Профиль сохранен: {target}"
+
+        else:
+            raise CommandError(usage)
+
+    def _handle_trace_command(self, args, stdin):
+        """Обрабатывает команду trace on [N] | off | dump файл - трассировка в формате Chrome trace-event"""
+        usage = "trace: использование: trace on [размер буфера] | off | dump файл"
+        if not args:
+            raise CommandError(usage)
+
+        action = args[0]
+        if action == "on":
+            if len(args) > 2:
+                raise CommandError(usage)
+            capacity = None
+            if len(args) == 2:
+                if not args[1].isdigit() or int(args[1]) <= 0:
+                    raise CommandError(f"trace: некорректный размер буфера: {args[1]}")
+                capacity = int(args[1])
+            tracer.start(capacity)
+            yield f"Трассировка включена (буфер: {tracer.capacity} отрезков)"
+
+        elif action == "off":
+            if not tracer.enabled:
+                raise CommandError("trace: трассировка не включена")
+            tracer.stop()
+            yield f"Трассировка выключена (записано отрезков: {tracer.recorded}, вытеснено: {tracer.dropped})"
+
+        elif action == "dump":
+            if len(args) != 2:
+                raise CommandError(usage)
+            try:
+                # Файл сохраняется на реальной файловой системе для Perfetto и chrome://tracing
+                count = tracer.dump(args[1])
+            except OSError as e:
+                raise CommandError(f"trace: не удалось сохранить трассировку: {e}")
+            yield f"Трассировка сохранена: {args[1]} (отрезков: {count}, вытеснено: {tracer.dropped})"
+
+        else:
+            raise CommandError(usage)
+
+    def _handle_log_stats_command(self, args, stdin):
+        """Обрабатывает команду log-stats - выводит счетчики логгера"""
+        stats = self.logger.stats()
+        yield "Лог событий:"
+        yield f"  Файл: {self.logger.log_file}, уровень: {self.logger.level.name}"
+        yield f"  Записано: {stats['written']}"
+        yield f"  Отброшено по уровню: {stats['dropped_by_level']}"
+        yield f"  Отброшено выборкой: {stats['dropped_by_sampling']}"
+        yield f"  Ротаций: {stats['rotations']}"
 
     def create_default_vfs_archive(self, archive_path: str = "default_vfs.zip"):
             """Создает VFS архив по умолчанию"""
@@ -290,11 +1097,10 @@ class ShellEmulator:
                 print(f"Ошибка создания архива по умолчанию: {e}")
                 return None
 
-    def _handle_vfs_init_command(self, args):
+    def _handle_vfs_init_command(self, args, stdin):
             """Обрабатывает команду vfs-init - сбрасывает VFS к состоянию по умолчанию"""
             if args:
-                print("vfs-init: команда не принимает аргументов")
-                return
+                raise CommandError("vfs-init: команда не принимает аргументов")
 
             print("Инициализация VFS...")
 
@@ -305,7 +1111,9 @@ class ShellEmulator:
                 self.create_default_vfs_archive(default_archive)
 
             # Очищаем текущую VFS и загружаем по умолчанию
+            self.vfs.close()
             self.vfs = VirtualFileSystem(default_archive, force_reload=True)
+            self.cursor = self.vfs.cursor
 
             # Обновляем путь к VFS в конфигурации
             self.vfs_path = default_archive
@@ -313,11 +1121,42 @@ class ShellEmulator:
             print("VFS успешно сброшена к состоянию по умолчанию")
             print(f"Загружена из: {default_archive}")
 
+    def complete(self, text, state):
+        """Функция дополнения для readline: имена команд в начале команды, иначе пути VFS"""
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_begidx()]
+            # Начало команды: после ';' или '|' еще нет ни одного слова
+            if not re.split(r'[;|]', line)[-1].strip():
+                start = bisect_left(self.command_names, text)
+                self._completions = []
+                for name in self.command_names[start:]:
+                    if not name.startswith(text):
+                        break
+                    self._completions.append(name)
+            else:
+                self._completions = self.vfs.complete_path(text, self.cursor)
+        if state < len(self._completions):
+            return self._completions[state]
+        return None
+
+    def _setup_completion(self):
+        """Включает дополнение команд и путей по Tab"""
+        if readline is None:
+            return
+        readline.set_completer(self.complete)
+        # Слова разделяются только пробелами и операторами, '/' входит в путь
+        readline.set_completer_delims(' \t\n;|<>')
+        if 'libedit' in (readline.__doc__ or ''):
+            readline.parse_and_bind("bind ^I rl_complete")
+        else:
+            readline.parse_and_bind("tab: complete")
+
     def run(self):
         """Основной цикл REPL"""
         print("Добро пожаловать в эмулятор командной строки!")
         print("Введите 'exit' для выхода")
-        print("Доступные команды: ls, cd, echo, env, pwd, run <script>, vfs-init")
+        print("Доступные команды: ls, cd, echo, env, export, unset, pwd, cat, grep, head, search, find, run <script>, vfs-init, vfs-cache, vfs-stats, vfs-verify, vfs-export, vfs-diff, mount, umount, rm, log-stats, profile, trace")
+        print("Конвейеры и перенаправления: cmd | cmd, cmd > file, cmd >> file; фоновые задания: cmd &, jobs, wait")
         print("-" * 50)
         print("Конфигурация эмулятора:")
         print(f"  VFS путь: {self.vfs.vfs_path}")
@@ -334,24 +1173,23 @@ class ShellEmulator:
                 print("!!! ОШИБКА ВЫПОЛНЕНИЯ СТАРТОВОГО СКРИПТА !!!")
             print("-" * 50)
 
+        self._setup_completion()
+
         # Главный цикл REPL
         while self.running:
             try:
                 # Используем путь из VFS вместо реальной файловой системы
-                current_vfs_path = self.vfs.get_current_path()
+                current_vfs_path = self.vfs.get_current_path(self.cursor)
                 prompt = f"{self.vfs_name}:{current_vfs_path}$ "
                 user_input = input(prompt).strip()
 
-                parts = self.parse_command(user_input)
-                if not parts:
-                    continue
-
-                command = parts[0]
-                args = parts[1:]
-                self.execute_command(command, args)
+                self.execute_line(user_input)
 
             except KeyboardInterrupt:
                 print("\nДля выхода введите 'exit'")
             except EOFError:
                 print("\nВыход")
-                break
\ No newline at end of file
+                break
+
+        # Перед выходом выводятся буферы оставшихся фоновых заданий
+        self.flush_jobs(wait=True)
@@ -0,0 +1,750 @@
+import io
+import math
+import mmap
+import os
+import stat
+import struct
+import tarfile
+import threading
+import time
+import zipfile
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+from Tracer import tracer
+
+
+@dataclass
+class EntryInfo:
+    """Описание файла или директории в источнике данных VFS"""
+    path: str                   # Путь без ведущего и завершающего '/' (a/b/c)
+    is_dir: bool
+    size: int = 0
+    modified_time: Optional[float] = None
+    crc: Optional[int] = None   # CRC32 содержимого, если источник его хранит (ZIP)
+    # Описание записи для открытия файла по индексу узлов (см. ZipBackend.attach_index)
+    locator: Optional[bytes] = None
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+
+# Размер блока при чтении файла для проверки целостности
+VERIFY_CHUNK_SIZE = 1024 * 1024
+
+
+def normalize_member_path(path: str) -> str:
+    """Приводит путь из архива к виду a/b/c"""
+    return '/'.join(part for part in path.replace('\\', '/').split('/') if part and part != '.')
+
+
+class StorageBackend:
+    """Интерфейс источника данных VFS: перечисление, stat и открытие потока.
+
+    Индексируемые источники (архивы) перечисляют все записи сразу через
+    iter_entries(). Источники с lazy_directories = True перечисляют только
+    содержимое конкретной директории через list_dir() при первом входе в нее.
+
+    Фильтр путей (path_filter, см. VFSGlob.PathFilter) применяется при
+    чтении каталога архива или при перечислении директории: отброшенные
+    записи не попадают в источник, а их число копится в skipped.
+    """
+
+    kind = "unknown"
+    lazy_directories = False
+    # Можно ли дешево открыть файл повторно (без распаковки всего, что лежит перед ним)
+    seekable_members = True
+    # Число записей, отброшенных фильтром путей
+    skipped = 0
+    # Содержимое доступно через view() прямо из отображенного в память файла, без копии в кэше
+    zero_copy = False
+
+    def __init__(self, path: str, path_filter=None):
+        self.path = path
+        self.path_filter = path_filter
+
+    def _accepts(self, path: str, is_dir: bool) -> bool:
+        """Проверяет запись фильтром путей и считает отброшенные"""
+        if self.path_filter is None or not path or self.path_filter.accepts(path, is_dir):
+            return True
+        self.skipped += 1
+        return False
+
+    def iter_entries(self) -> Iterator[EntryInfo]:
+        """Перечисляет все записи источника"""
+        raise NotImplementedError
+
+    def entry_count(self) -> int:
+        """Возвращает число записей источника"""
+        return sum(1 for _ in self.iter_entries())
+
+    def list_dir(self, path: str) -> Iterator[EntryInfo]:
+        """Перечисляет записи одной директории"""
+        prefix = path + '/' if path else ''
+        for entry in self.iter_entries():
+            if entry.path.startswith(prefix) and '/' not in entry.path[len(prefix):]:
+                yield entry
+
+    def stat(self, path: str) -> Optional[EntryInfo]:
+        """Возвращает описание записи или None"""
+        raise NotImplementedError
+
+    def open(self, path: str) -> BinaryIO:
+        """Открывает поток для чтения содержимого файла"""
+        raise NotImplementedError
+
+    def read(self, path: str) -> bytes:
+        """Читает содержимое файла целиком"""
+        with self.open(path) as stream:
+            return stream.read()
+
+    def verify(self, path: str) -> int:
+        """Читает файл до конца, не сохраняя содержимое, и возвращает число байтов.
+
+        Для ZIP контрольная сумма CRC32 проверяется zipfile при достижении
+        конца файла; в TAR и директориях контрольных сумм нет, поэтому
+        проверяется только, что данные читаются (и распаковываются) целиком.
+        При повреждении выбрасывается исключение.
+        """
+        total = 0
+        with self.open(path) as stream:
+            while True:
+                chunk = stream.read(VERIFY_CHUNK_SIZE)
+                if not chunk:
+                    return total
+                total += len(chunk)
+
+    def attach_index(self, node_index):
+        """Сообщает, что записи источника переносятся в индекс узлов (OutOfCore.SqliteNodeIndex).
+
+        Вызывается до перечисления записей для индекса. Источник, который
+        держит свой каталог в памяти, может вместо этого искать записи в индексе.
+        """
+
+    def close(self):
+        """Освобождает ресурсы источника"""
+
+
+# Структуры ZIP, нужные для чтения центрального каталога без zipfile
+EOCD = struct.Struct('<4s4H2LH')
+EOCD_SIGNATURE = b'PK\x05\x06'
+ZIP64_LOCATOR = struct.Struct('<4sLQL')
+ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_EOCD = struct.Struct('<4sQ2H2L4Q')
+ZIP64_EOCD_SIGNATURE = b'PK\x06\x06'
+# Из записи каталога берутся флаги, метод сжатия, время и дата, CRC32, сжатый и полный размеры,
+# длины имени, extra и комментария и смещение локального заголовка
+CENTRAL_HEADER = struct.Struct('<4s4xHHHHLLLHHH8xL')
+CENTRAL_SIGNATURE = b'PK\x01\x02'
+# Из локального заголовка записи - флаги и длины имени и extra, после которых идут сжатые данные
+LOCAL_HEADER = struct.Struct('<4s2xH18xHH')
+LOCAL_SIGNATURE = b'PK\x03\x04'
+ZIP64_EXTRA_ID = 1
+ENCRYPTED_FLAG = 0x1
+UTF8_FLAG = 0x800
+ZIP64_LIMIT = 0xFFFFFFFF
+# Упакованное описание записи ZIP для индекса узлов: флаги, метод сжатия, CRC32, сжатый размер,
+# размер, смещение локального заголовка и время DOS; за ним - имя в архиве, если оно отличается от пути
+ZIP_LOCATOR = struct.Struct('<HHLQQQL')
+
+
+def _central_directory_bounds(mapped: mmap.mmap) -> Tuple[int, int, int, int]:
+    """Находит смещение и размер центрального каталога, число записей и сдвиг архива.
+
+    Сдвиг ненулевой, если перед архивом записаны другие данные (например,
+    самораспаковывающийся архив); на него поправляются все смещения каталога.
+    """
+    # Концевая запись лежит в конце файла, за ней - комментарий длиной до 64 КБ
+    position = mapped.rfind(EOCD_SIGNATURE, max(0, len(mapped) - EOCD.size - 0xFFFF))
+    if position < 0:
+        raise ValueError("не найден центральный каталог ZIP")
+    _, _, _, _, count, size, offset, _ = EOCD.unpack_from(mapped, position)
+    locator = position - ZIP64_LOCATOR.size
+    if locator >= 0 and mapped[locator:locator + 4] == ZIP64_LOCATOR_SIGNATURE:
+        # Запись ZIP64 лежит прямо перед локатором (как ее ищет zipfile)
+        position = locator - ZIP64_EOCD.size
+        if position < 0 or mapped[position:position + 4] != ZIP64_EOCD_SIGNATURE:
+            raise ValueError("повреждена концевая запись ZIP64")
+        _, _, _, _, _, _, _, count, size, offset = ZIP64_EOCD.unpack_from(mapped, position)
+    return offset, size, count, position - size - offset
+
+
+def _zip64_values(mapped: mmap.mmap, position: int, end: int,
+                  compress_size: int, file_size: int, header_offset: int) -> Tuple[int, int, int]:
+    """Читает из поля extra ZIP64 значения, которые не поместились в 32 бита.
+
+    В поле записаны по порядку только переполненные значения: размер,
+    сжатый размер и смещение локального заголовка.
+    """
+    while position + 4 <= end:
+        header_id, length = struct.unpack_from('<HH', mapped, position)
+        if header_id == ZIP64_EXTRA_ID:
+            values = iter(struct.unpack_from(f'<{length // 8}Q', mapped, position + 4))
+            if file_size == ZIP64_LIMIT:
+                file_size = next(values)
+            if compress_size == ZIP64_LIMIT:
+                compress_size = next(values)
+            if header_offset == ZIP64_LIMIT:
+                header_offset = next(values)
+            return compress_size, file_size, header_offset
+        position += 4 + length
+    raise ValueError("нет поля ZIP64 у записи центрального каталога")
+
+
+def zip_entry_count(path: str) -> int:
+    """Возвращает число записей ZIP по концевой записи, не читая каталог"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return _central_directory_bounds(mapped)[2]
+
+
+def iter_zip_directory(path: str, accepts: Optional[Callable[[str, bool], bool]] = None) -> Iterator[tuple]:
+    """Перечисляет записи центрального каталога ZIP без создания объектов ZipInfo.
+
+    Каталог читается напрямую из отображенного в память файла, поэтому
+    архив с миллионом записей перечисляется за секунды, а в памяти остается
+    только текущая запись. Для каждой записи выдается кортеж (путь,
+    директория, имя в архиве, флаги, метод сжатия, CRC32, сжатый размер,
+    размер, смещение локального заголовка, время DOS); время DOS - дата и
+    время записи одним числом. Функция accepts(путь, директория) отбирает
+    записи прямо при разборе: для отброшенных записей не разбирается поле
+    extra и не создается кортеж.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        offset, size, _, shift = _central_directory_bounds(mapped)
+        position = offset + shift
+        end = position + size
+        unpack = CENTRAL_HEADER.unpack_from
+        while position < end:
+            signature, flags, method, dos_time, dos_date, crc, compress_size, file_size, \
+                name_length, extra_length, comment_length, header_offset = unpack(mapped, position)
+            if signature != CENTRAL_SIGNATURE:
+                raise ValueError(f"поврежден центральный каталог ZIP (смещение {position})")
+            name_start = position + CENTRAL_HEADER.size
+            extra_start = name_start + name_length
+            raw_name = mapped[name_start:extra_start]
+            # Имена без флага UTF-8 записаны в cp437, для ASCII-имен декодирование совпадает
+            name = raw_name.decode('utf-8' if flags & UTF8_FLAG or raw_name.isascii() else 'cp437')
+            position = extra_start + extra_length + comment_length
+            is_dir = name.endswith('/')
+            member_path = name[:-1] if is_dir else name
+            if ('\\' in member_path or '//' in member_path or './' in member_path or member_path[:1] == '/'
+                    or member_path.endswith('/.') or member_path == '.'):
+                # Разбор пути нужен только для нестандартных имен
+                member_path = normalize_member_path(member_path)
+            if not member_path or accepts is not None and not accepts(member_path, is_dir):
+                continue
+            if ZIP64_LIMIT in (compress_size, file_size, header_offset):
+                compress_size, file_size, header_offset = _zip64_values(
+                    mapped, extra_start, extra_start + extra_length, compress_size, file_size, header_offset)
+            yield (member_path, is_dir, name, flags, method, crc, compress_size, file_size,
+                   header_offset + shift, dos_date << 16 | dos_time)
+
+
+class ZipBackend(StorageBackend):
+    """ZIP-архив; центральный каталог читается напрямую, без объектов ZipInfo.
+
+    Обычно каталог читается один раз при первом обращении, и записи
+    хранятся в словаре компактными кортежами. Если VFS переносит записи в
+    индекс узлов SQLite (см. attach_index), словарь не строится вовсе:
+    каталог потоком идет в индекс, а описание записи для открытия файла
+    берется из индекса, поэтому память не зависит от числа записей.
+
+    Файл открывается без zipfile.ZipFile (он читает весь каталог):
+    локальный заголовок проверяется здесь, а распаковку, проверку CRC32 и
+    переходы по потоку выполняет zipfile.ZipExtFile.
+    """
+
+    kind = "zip"
+
+    def __init__(self, path: str, path_filter=None):
+        super().__init__(path, path_filter)
+        try:
+            self._count = zip_entry_count(path)
+        except ValueError as e:
+            # Пустой файл или файл без концевой записи - не ZIP
+            raise zipfile.BadZipFile(f"{path}: {e}") from e
+        self._members: Optional[Dict[str, tuple]] = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def attach_index(self, node_index):
+        self._index = node_index
+        self._members = None
+
+    def _records(self) -> Iterator[tuple]:
+        """Перечисляет записи каталога, прошедшие фильтр путей"""
+        skipped = self.skipped
+        self.skipped = 0
+        try:
+            # Фильтр путей проверяется при разборе каталога, до создания описания записи
+            yield from iter_zip_directory(self.path, self._accepts if self.path_filter is not None else None)
+        except BaseException:
+            # Прерванный проход не пересчитывает отброшенные записи
+            self.skipped = skipped
+            raise
+
+    def _load_members(self) -> Dict[str, tuple]:
+        with self._lock:
+            if self._members is None:
+                # При повторяющихся именах остается последняя запись, как в zipfile
+                self._members = {record[0]: record for record in self._records()}
+            return self._members
+
+    @staticmethod
+    def _entry(record: tuple, locator: bool = False) -> EntryInfo:
+        path, is_dir, name, flags, method, crc, compress_size, file_size, header_offset, stamp = record
+        date, dos_time = stamp >> 16, stamp & 0xFFFF
+        date_time = ((date >> 9) + 1980, (date >> 5) & 0xF, date & 0x1F,
+                     dos_time >> 11, (dos_time >> 5) & 0x3F, (dos_time & 0x1F) * 2)
+        try:
+            modified_time = time.mktime(date_time + (0, 0, -1))
+        except (OverflowError, ValueError):
+            modified_time = None
+        packed = None
+        if locator:
+            original = name[:-1] if is_dir else name
+            packed = ZIP_LOCATOR.pack(flags, method, crc, compress_size, file_size, header_offset, stamp)
+            if original != path:
+                packed += name.encode('utf-8')
+        return EntryInfo(path, is_dir, file_size, modified_time, crc, packed)
+
+    @staticmethod
+    def _unpack_locator(entry: EntryInfo) -> tuple:
+        flags, method, crc, compress_size, file_size, header_offset, stamp = \
+            ZIP_LOCATOR.unpack_from(entry.locator)
+        name = entry.locator[ZIP_LOCATOR.size:].decode('utf-8') or \
+            (entry.path + '/' if entry.is_dir else entry.path)
+        return (entry.path, entry.is_dir, name, flags, method, crc, compress_size, file_size,
+                header_offset, stamp)
+
+    def _record(self, path: str) -> Optional[tuple]:
+        if self._index is None:
+            return self._load_members().get(path)
+        entry = self._index.lookup(path)
+        if entry is None or entry.locator is None:
+            # Директории, которых нет в архиве, индекс добавляет сам
+            return None
+        return self._unpack_locator(entry)
+
+    def iter_entries(self) -> Iterator[EntryInfo]:
+        if self._index is not None:
+            # Каталог идет в индекс узлов потоком, описание записи передается вместе с ней
+            for record in self._records():
+                yield self._entry(record, locator=True)
+            return
+        for record in self._load_members().values():
+            yield self._entry(record)
+
+    def entry_count(self) -> int:
+        # По концевой записи каталога, до применения фильтра путей
+        return self._count
+
+    def stat(self, path: str) -> Optional[EntryInfo]:
+        if self._index is not None:
+            entry = self._index.lookup(path)
+            if entry is not None and entry.locator is not None:
+                entry.crc = ZIP_LOCATOR.unpack_from(entry.locator)[2]
+                entry.locator = None
+            return entry
+        record = self._record(path)
+        return self._entry(record) if record is not None else None
+
+    def open(self, path: str) -> BinaryIO:
+        with tracer.span("zip_open", "storage", path):
+            record = self._record(path)
+            if record is None:
+                raise KeyError(path)
+            _, is_dir, name, flags, method, crc, compress_size, file_size, header_offset, stamp = record
+            if flags & ENCRYPTED_FLAG:
+                raise RuntimeError(f"File {name!r} is encrypted, password required for extraction")
+            info = zipfile.ZipInfo(name)
+            info.flag_bits = flags
+            info.compress_type = method
+            info.CRC = crc
+            info.compress_size = compress_size
+            info.file_size = file_size
+            info.header_offset = header_offset
+            # У каждого потока свой дескриптор архива, как у потоков TAR
+            member = open(self.path, 'rb')
+            try:
+                member.seek(header_offset)
+                header = member.read(LOCAL_HEADER.size)
+                if len(header) != LOCAL_HEADER.size:
+                    raise zipfile.BadZipFile("Truncated file header")
+                signature, local_flags, name_length, extra_length = LOCAL_HEADER.unpack(header)
+                if signature != LOCAL_SIGNATURE:
+                    raise zipfile.BadZipFile("Bad magic number for file header")
+                raw_name = member.read(name_length)
+                local_name = raw_name.decode('utf-8' if local_flags & UTF8_FLAG else 'cp437')
+                if local_name != info.orig_filename:
+                    raise zipfile.BadZipFile(f"File name in directory {info.orig_filename!r} "
+                                             f"and header {raw_name!r} differ.")
+                member.seek(extra_length, io.SEEK_CUR)
+                return zipfile.ZipExtFile(member, 'r', info, None, True)
+            except BaseException:
+                member.close()
+                raise
+
+    def read(self, path: str) -> bytes:
+        with tracer.span("zip_read", "storage", path):
+            return super().read(path)
+
+
+class _TarMemberStream(io.RawIOBase):
+    """Поток файла TAR со своим дескриптором архива; дескриптор закрывается вместе с потоком"""
+
+    def __init__(self, tar: tarfile.TarFile, member: tarfile.TarInfo):
+        super().__init__()
+        self._tar = tar
+        self._stream = tar.extractfile(member)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self._stream.readinto(buffer)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._stream.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._stream.tell()
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+            self._tar.close()
+        super().close()
+
+
+class TarBackend(StorageBackend):
+    """TAR-архив (в том числе .tar.gz и .tar.xz).
+
+    Заголовки всех записей читаются один раз при открытии, после чего
+    содержимое файлов открывается по сохраненным смещениям. Для несжатых
+    архивов это прямой переход к данным; для сжатых поток распаковывается
+    до нужного смещения.
+    """
+
+    kind = "tar"
+    COMPRESSED_SIGNATURES = (b'\x1f\x8b', b'\xfd7zXZ', b'BZh')
+
+    def __init__(self, path: str, path_filter=None):
+        super().__init__(path, path_filter)
+        self._tar = tarfile.open(path, 'r:*')
+        self._members: Dict[str, tarfile.TarInfo] = {}
+        for member in self._tar:
+            member_path = normalize_member_path(member.name)
+            if self._accepts(member_path, member.isdir()):
+                self._members[member_path] = member
+        if self.skipped:
+            self._tar.members = list(self._members.values())
+        # В сжатом архиве переход к файлу требует распаковки всего, что лежит перед ним
+        with open(path, 'rb') as f:
+            self.seekable_members = not f.read(6).startswith(self.COMPRESSED_SIGNATURES)
+        # Файловый объект tarfile общий, поэтому read() и verify() через него сериализуются;
+        # потоки open() получают свой дескриптор архива
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _entry(path: str, member: tarfile.TarInfo) -> EntryInfo:
+        return EntryInfo(path, member.isdir(), member.size, float(member.mtime))
+
+    def iter_entries(self) -> Iterator[EntryInfo]:
+        for path, member in self._members.items():
+            if path and (member.isdir() or member.isreg()):
+                yield self._entry(path, member)
+
+    def entry_count(self) -> int:
+        return len(self._members)
+
+    def stat(self, path: str) -> Optional[EntryInfo]:
+        member = self._members.get(path)
+        return self._entry(path, member) if member is not None else None
+
+    def open(self, path: str) -> BinaryIO:
+        member = self._members[path]
+        if member.isdir():
+            raise IsADirectoryError(path)
+        if not member.isreg():
+            # Для ссылок tarfile ищет цель среди всех заголовков: читается через общий архив
+            return io.BytesIO(self.read(path))
+        # Общий файловый объект tarfile сдвигают чтения из других потоков, поэтому
+        # у каждого потока свой дескриптор (для сжатого архива - свой распаковщик)
+        tar = tarfile.open(self.path, 'r:*')
+        try:
+            return io.BufferedReader(_TarMemberStream(tar, member))
+        except BaseException:
+            tar.close()
+            raise
+
+    def read(self, path: str) -> bytes:
+        with self._lock:
+            stream = self._tar.extractfile(self._members[path])
+            if stream is None:
+                raise IsADirectoryError(path)
+            return stream.read()
+
+    def verify(self, path: str) -> int:
+        # Общий поток не распаковывает сжатый архив заново с начала для каждого файла,
+        # поэтому он удерживается до конца чтения
+        with self._lock:
+            stream = self._tar.extractfile(self._members[path])
+            if stream is None:
+                raise IsADirectoryError(path)
+            total = 0
+            while True:
+                chunk = stream.read(VERIFY_CHUNK_SIZE)
+                if not chunk:
+                    return total
+                total += len(chunk)
+
+    def close(self):
+        self._tar.close()
+
+
+class DirectoryBackend(StorageBackend):
+    """Директория на диске; каждая директория сканируется os.scandir только при первом входе.
+
+    Символические ссылки на директории пропускаются: ссылка на родительскую
+    директорию иначе зациклила бы обход. Ссылки на файлы читаются как файлы.
+    """
+
+    kind = "directory"
+    lazy_directories = True
+
+    def _full_path(self, path: str) -> str:
+        return os.path.join(self.path, *path.split('/')) if path else self.path
+
+    def iter_entries(self) -> Iterator[EntryInfo]:
+        stack = ['']
+        while stack:
+            for entry in self.list_dir(stack.pop()):
+                yield entry
+                if entry.is_dir:
+                    stack.append(entry.path)
+
+    def list_dir(self, path: str) -> Iterator[EntryInfo]:
+        prefix = path + '/' if path else ''
+        with os.scandir(self._full_path(path)) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if not is_dir and (entry.is_symlink() and entry.is_dir() or not entry.is_file()):
+                        continue
+                    info = entry.stat()
+                except OSError:
+                    continue
+                if not self._accepts(prefix + entry.name, is_dir):
+                    continue
+                yield EntryInfo(prefix + entry.name, is_dir, 0 if is_dir else info.st_size, info.st_mtime)
+
+    def stat(self, path: str) -> Optional[EntryInfo]:
+        full_path = self._full_path(path)
+        try:
+            info = os.stat(full_path)
+        except OSError:
+            return None
+        is_dir = stat.S_ISDIR(info.st_mode)
+        if is_dir and path and os.path.islink(full_path):
+            return None
+        if self.path_filter is not None and path and not self.path_filter.accepts(path, is_dir):
+            return None
+        return EntryInfo(path, is_dir, 0 if is_dir else info.st_size, info.st_mtime)
+
+    def open(self, path: str) -> BinaryIO:
+        return open(self._full_path(path), 'rb')
+
+
+# Формат образа VFS (см. SharedImage): заголовок, таблица узлов, пул имен и блок содержимого.
+# Дети директории лежат в таблице подряд и отсортированы по имени, узел 0 - корень
+IMAGE_MAGIC = b'VFSIMG\x00\x01'
+# magic, число узлов, резерв, смещение и размер пула имен, смещение и размер блока содержимого
+IMAGE_HEADER = struct.Struct('<8sIIQQQQ')
+# смещение имени, смещение содержимого, размер, время изменения, длина имени,
+# первый ребенок, число детей, флаги
+IMAGE_NODE = struct.Struct('<QQQdIIII')
+IMAGE_DIRECTORY_FLAG = 1
+
+
+class _ViewStream(io.RawIOBase):
+    """Поток чтения поверх memoryview без копирования всего файла"""
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position:self._position + len(buffer)]
+        count = len(chunk)
+        buffer[:count] = chunk
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class ImageBackend(StorageBackend):
+    """Неизменяемый образ VFS в файле, отображенном в память (mmap).
+
+    Подключение читает только заголовок: таблица узлов, имена и содержимое
+    читаются прямо из отображения, а страницы файла разделяются всеми
+    процессами, подключенными к одному образу.
+    """
+
+    kind = "image"
+    lazy_directories = True
+    zero_copy = True
+
+    def __init__(self, path: str, path_filter=None):
+        super().__init__(path, path_filter)
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, self.node_count, _, self._names_offset, _, self._blob_offset, _ = \
+            IMAGE_HEADER.unpack_from(self._map)
+        if magic != IMAGE_MAGIC:
+            self.close()
+            raise ValueError(f"'{path}' не является образом VFS")
+
+    def _node(self, index: int):
+        return IMAGE_NODE.unpack_from(self._map, IMAGE_HEADER.size + index * IMAGE_NODE.size)
+
+    def _name(self, index: int) -> str:
+        name_offset, _, _, _, name_length, _, _, _ = self._node(index)
+        start = self._names_offset + name_offset
+        return str(self._view[start:start + name_length], 'utf-8')
+
+    def _find(self, path: str) -> Optional[int]:
+        """Находит узел по пути двоичным поиском среди отсортированных детей"""
+        index = 0
+        for part in path.split('/') if path else ():
+            _, _, _, _, _, first, count, flags = self._node(index)
+            if not flags & IMAGE_DIRECTORY_FLAG:
+                return None
+            children = range(first, first + count)
+            position = bisect_left(children, part, key=self._name)
+            if position == count or self._name(first + position) != part:
+                return None
+            index = first + position
+        return index
+
+    def _entry(self, path: str, index: int) -> EntryInfo:
+        _, _, size, modified_time, _, _, _, flags = self._node(index)
+        is_dir = bool(flags & IMAGE_DIRECTORY_FLAG)
+        return EntryInfo(path, is_dir, size, None if math.isnan(modified_time) else modified_time)
+
+    def iter_entries(self) -> Iterator[EntryInfo]:
+        stack = ['']
+        while stack:
+            for entry in self.list_dir(stack.pop()):
+                yield entry
+                if entry.is_dir:
+                    stack.append(entry.path)
+
+    def entry_count(self) -> int:
+        return self.node_count - 1
+
+    def list_dir(self, path: str) -> Iterator[EntryInfo]:
+        index = self._find(path)
+        if index is None:
+            return
+        _, _, _, _, _, first, count, flags = self._node(index)
+        if not flags & IMAGE_DIRECTORY_FLAG:
+            return
+        prefix = path + '/' if path else ''
+        for child in range(first, first + count):
+            entry = self._entry(prefix + self._name(child), child)
+            if self._accepts(entry.path, entry.is_dir):
+                yield entry
+
+    def stat(self, path: str) -> Optional[EntryInfo]:
+        index = self._find(path)
+        if index is None:
+            return None
+        entry = self._entry(path, index)
+        if self.path_filter is not None and path and not self.path_filter.accepts(path, entry.is_dir):
+            return None
+        return entry
+
+    def view(self, path: str) -> memoryview:
+        """Возвращает содержимое файла как срез отображения, без копирования"""
+        index = self._find(path)
+        if index is None:
+            raise FileNotFoundError(path)
+        _, content_offset, size, _, _, _, _, flags = self._node(index)
+        if flags & IMAGE_DIRECTORY_FLAG:
+            raise IsADirectoryError(path)
+        start = self._blob_offset + content_offset
+        return self._view[start:start + size]
+
+    def open(self, path: str) -> BinaryIO:
+        return io.BufferedReader(_ViewStream(self.view(path)))
+
+    def read(self, path: str) -> bytes:
+        with self.view(path) as content:
+            return content.tobytes()
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Открытые потоки еще ссылаются на отображение; оно закроется вместе с ними
+            pass
+
+
+def is_image_file(path: str) -> bool:
+    """Проверяет сигнатуру образа VFS"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(IMAGE_MAGIC)) == IMAGE_MAGIC
+    except OSError:
+        return False
+
+
+def is_zip_file(path: str) -> bool:
+    """Проверяет сигнатуру ZIP файла (первые 4 байта)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) == b'PK\x03\x04'
+    except OSError:
+        return False
+
+
+def open_backend(path: str, path_filter=None) -> Optional[StorageBackend]:
+    """Подбирает источник данных по пути; None - если путь не является ни архивом, ни директорией"""
+    if os.path.isdir(path):
+        return DirectoryBackend(path, path_filter)
+    if not os.path.isfile(path):
+        return None
+    if is_image_file(path):
+        return ImageBackend(path, path_filter)
+    if path.lower().endswith('.zip') or is_zip_file(path):
+        return ZipBackend(path, path_filter)
+    if tarfile.is_tarfile(path):
+        return TarBackend(path, path_filter)
+    return None
@@ -0,0 +1,136 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Емкость кольцевого буфера по умолчанию (отрезок занимает ~150 байт, весь буфер - ~15 МБ)
+DEFAULT_TRACE_CAPACITY = 100000
+
+
+class _Span:
+    """Открытый отрезок трассировки; записывается в буфер при выходе из блока"""
+
+    __slots__ = ('_tracer', '_name', '_category', '_detail', '_start')
+
+    def __init__(self, tracer: 'SpanTracer', name: str, category: str, detail: Optional[str]):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._detail = detail
+
+    def __enter__(self) -> '_Span':
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tracer._record(self._name, self._category, self._start, time.perf_counter_ns(), self._detail)
+        return False
+
+
+class _NullSpan:
+    """Отрезок выключенного трассировщика: блок выполняется без замеров"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class SpanTracer:
+    """Трассировщик вложенных отрезков выполнения в формате Chrome trace-event.
+
+    Отрезок - блок with tracer.span(имя, категория): время начала и
+    длительность записываются при выходе из блока. Вложенность восстанавливается
+    просмотрщиком (Perfetto, chrome://tracing) по времени внутри каждого потока.
+    Отрезки хранятся в кольцевом буфере фиксированной емкости, при
+    переполнении вытесняются самые старые. Выключенный трассировщик
+    возвращает общий пустой отрезок, не снимая время и не выделяя память.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_TRACE_CAPACITY):
+        self.enabled = False
+        self.capacity = capacity
+        self.events: deque = deque(maxlen=capacity)
+        self._origin = time.perf_counter_ns()
+        self._counter = itertools.count()
+        self._recorded = 0
+        self._threads: Dict[int, str] = {}
+
+    @property
+    def recorded(self) -> int:
+        """Число отрезков, записанных с момента включения"""
+        return self._recorded
+
+    @property
+    def dropped(self) -> int:
+        """Число отрезков, вытесненных из буфера"""
+        return max(0, self._recorded - len(self.events))
+
+    def start(self, capacity: Optional[int] = None):
+        """Включает трассировку; новая емкость сбрасывает уже записанные отрезки"""
+        if capacity is not None and capacity != self.capacity:
+            self.capacity = capacity
+            self.clear()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events = deque(maxlen=self.capacity)
+        self._counter = itertools.count()
+        self._recorded = 0
+        self._threads = {}
+
+    def span(self, name: str, category: str = '', detail: Optional[str] = None):
+        """Возвращает контекстный менеджер отрезка (detail - подпись в свойствах отрезка)"""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, category, detail)
+
+    def _record(self, name: str, category: str, start: int, end: int, detail: Optional[str]):
+        thread = threading.get_ident()
+        if thread not in self._threads:
+            self._threads[thread] = threading.current_thread().name
+        # deque.append и next(count) атомарны, поэтому запись из нескольких потоков не блокируется
+        self.events.append((name, category, start, end - start, thread, detail))
+        self._recorded = next(self._counter) + 1
+
+    def dump(self, path: str) -> int:
+        """Сохраняет отрезки в JSON формата Chrome trace-event и возвращает их число"""
+        events = list(self.events)
+        # Поток регистрируется раньше записи своего отрезка, поэтому снимок берется после отрезков
+        threads = dict(self._threads)
+        pid = os.getpid()
+        # Идентификаторы потоков заменяются короткими номерами в порядке появления
+        numbers = {thread: number for number, thread in enumerate(threads, 1)}
+        trace = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                  'args': {'name': 'shell_emulator'}}]
+        for thread, number in numbers.items():
+            trace.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': number,
+                          'args': {'name': threads[thread]}})
+        for name, category, start, duration, thread, detail in events:
+            # Время в trace-event - микросекунды от начала трассировки
+            event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': numbers[thread],
+                     'ts': (start - self._origin) / 1000, 'dur': duration / 1000}
+            if detail is not None:
+                event['args'] = {'detail': detail}
+            trace.append(event)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms',
+                       'otherData': {'recorded': self.recorded, 'dropped': self.dropped}},
+                      f, ensure_ascii=False)
+        return len(events)
+
+
+# Общий трассировщик процесса: точки трассировки есть в оболочке, VFS, источниках и логгере
+tracer = SpanTracer()
@@ -0,0 +1,221 @@
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+from StorageBackends import EntryInfo, StorageBackend, is_zip_file, iter_zip_directory, open_backend
+
+# Размер блока при сравнении содержимого двух файлов
+DIFF_CHUNK_SIZE = 1024 * 1024
+
+# Виды изменений (буквы как в git diff --name-status; m - изменились только метаданные)
+ADDED = 'A'
+REMOVED = 'D'
+MODIFIED = 'M'
+METADATA = 'm'
+
+
+@dataclass
+class DiffChange:
+    """Найденное различие; путь директории завершается '/'"""
+    kind: str
+    path: str
+    detail: str = ""
+
+
+@dataclass
+class DiffStats:
+    """Итог сравнения"""
+    added: int = 0
+    removed: int = 0
+    modified: int = 0
+    metadata: int = 0
+    unchanged: int = 0
+    content_reads: int = 0      # Пары файлов, для которых пришлось читать содержимое
+    elapsed: float = 0.0
+
+    def count(self, change: Optional[DiffChange]):
+        if change is None:
+            self.unchanged += 1
+        elif change.kind == ADDED:
+            self.added += 1
+        elif change.kind == REMOVED:
+            self.removed += 1
+        elif change.kind == MODIFIED:
+            self.modified += 1
+        else:
+            self.metadata += 1
+
+
+def _display(entry: EntryInfo) -> str:
+    return entry.path + '/' if entry.is_dir else entry.path
+
+
+def _same_streams(first, second) -> bool:
+    """Сравнивает два потока блоками, не читая файлы в память целиком"""
+    with first, second:
+        while True:
+            chunk = first.read(DIFF_CHUNK_SIZE)
+            if chunk != second.read(len(chunk) or DIFF_CHUNK_SIZE):
+                return False
+            if not chunk:
+                return True
+
+
+def _compare_entries(old: StorageBackend, new: StorageBackend, old_entry: EntryInfo, new_entry: EntryInfo,
+                     stats: DiffStats) -> Optional[DiffChange]:
+    """Сравнивает записи с одинаковым путем; содержимое читается, только если метаданных не хватает"""
+    if old_entry.is_dir != new_entry.is_dir:
+        kind = "директория заменена файлом" if old_entry.is_dir else "файл заменен директорией"
+        return DiffChange(MODIFIED, _display(new_entry), kind)
+    if new_entry.is_dir:
+        return None
+    if old_entry.size != new_entry.size:
+        return DiffChange(MODIFIED, new_entry.path, f"размер {old_entry.size} -> {new_entry.size}")
+
+    same_time = old_entry.modified_time == new_entry.modified_time
+    if old_entry.crc is not None and new_entry.crc is not None:
+        # Центральные каталоги ZIP хранят CRC32: содержимое не читается
+        if old_entry.crc != new_entry.crc:
+            return DiffChange(MODIFIED, new_entry.path, "CRC32")
+    elif not same_time:
+        # Без контрольной суммы совпадение размера и времени считается совпадением содержимого
+        # (как в rsync); при разном времени содержимое сравнивается
+        stats.content_reads += 1
+        if not _same_streams(old.open(old_entry.path), new.open(new_entry.path)):
+            return DiffChange(MODIFIED, new_entry.path, "содержимое")
+    if not same_time:
+        return DiffChange(METADATA, new_entry.path, "время изменения")
+    return None
+
+
+def iter_central_directory(path: str) -> Iterator[Tuple[str, bool, int, int, int]]:
+    """Перечисляет записи центрального каталога ZIP: (путь, директория, размер, CRC32, время DOS)"""
+    for member_path, is_dir, _, _, _, crc, _, size, _, stamp in iter_zip_directory(path):
+        yield member_path, is_dir, size, crc, stamp
+
+
+def diff_zip_archives(old_path: str, new_path: str, stats: DiffStats) -> Iterator[DiffChange]:
+    """Сравнивает два ZIP-архива только по центральным каталогам: имя, размер, CRC32 и время.
+
+    Записи сравниваются кортежами целиком, поэтому совпадающие записи
+    (подавляющее большинство) проверяются одним сравнением.
+    """
+    start = time.perf_counter()
+    remaining = {entry[0]: entry for entry in iter_central_directory(old_path)}
+    for entry in iter_central_directory(new_path):
+        path, is_dir, size, crc, stamp = entry
+        old_entry = remaining.pop(path, None)
+        if old_entry is None:
+            change = DiffChange(ADDED, path + '/' if is_dir else path)
+        elif old_entry == entry or is_dir and old_entry[1]:
+            change = None
+        elif old_entry[1] != is_dir:
+            change = DiffChange(MODIFIED, path + '/' if is_dir else path,
+                                "директория заменена файлом" if old_entry[1] else "файл заменен директорией")
+        elif old_entry[2] != size:
+            change = DiffChange(MODIFIED, path, f"размер {old_entry[2]} -> {size}")
+        elif old_entry[3] != crc:
+            change = DiffChange(MODIFIED, path, "CRC32")
+        else:
+            change = DiffChange(METADATA, path, "время изменения")
+        stats.count(change)
+        if change is not None:
+            yield change
+    for path, is_dir, _, _, _ in remaining.values():
+        change = DiffChange(REMOVED, path + '/' if is_dir else path)
+        stats.count(change)
+        yield change
+    stats.elapsed = time.perf_counter() - start
+
+
+def _is_zip(path: str) -> bool:
+    return os.path.isfile(path) and (path.lower().endswith('.zip') or is_zip_file(path))
+
+
+def diff_paths(old_path: str, new_path: str, stats: DiffStats) -> Iterator[DiffChange]:
+    """Сравнивает два архива или директории; два ZIP сравниваются по центральным каталогам"""
+    if _is_zip(old_path) and _is_zip(new_path):
+        yield from diff_zip_archives(old_path, new_path, stats)
+        return
+    backends = []
+    try:
+        for path in (old_path, new_path):
+            backend = open_backend(path)
+            if backend is None:
+                raise FileNotFoundError(f"'{path}' не является архивом или директорией")
+            backends.append(backend)
+        yield from diff_backends(backends[0], backends[1], stats)
+    finally:
+        for backend in backends:
+            backend.close()
+
+
+def diff_backends(old: StorageBackend, new: StorageBackend, stats: DiffStats) -> Iterator[DiffChange]:
+    """Сравнивает два источника данных и выдает различия по мере обнаружения.
+
+    Записи старого источника собираются в словарь по пути, затем записи
+    нового перечисляются одним проходом: каждая либо находит пару, либо
+    добавлена. Оставшиеся в словаре записи удалены.
+    """
+    start = time.perf_counter()
+    remaining = {entry.path: entry for entry in old.iter_entries()}
+    for entry in new.iter_entries():
+        old_entry = remaining.pop(entry.path, None)
+        if old_entry is None:
+            change = DiffChange(ADDED, _display(entry))
+        else:
+            change = _compare_entries(old, new, old_entry, entry, stats)
+        stats.count(change)
+        if change is not None:
+            yield change
+    for entry in remaining.values():
+        change = DiffChange(REMOVED, _display(entry))
+        stats.count(change)
+        yield change
+    stats.elapsed = time.perf_counter() - start
+
+
+def diff_session(vfs, stats: DiffStats) -> Iterator[DiffChange]:
+    """Сравнивает дерево VFS с его источником данных.
+
+    Файлы источника, которые не менялись в сессии, совпадают с ним по
+    построению, поэтому сравниваются только файлы, записанные в сессии, и
+    удаленные пути. Для записанного файла CRC32 считается по содержимому в
+    памяти, а источник читается, только если он не хранит CRC32.
+    """
+    start = time.perf_counter()
+    backend = vfs.backend
+    files, removed = vfs.session_changes()
+    for path in files:
+        entry = backend.stat(path)
+        if entry is None:
+            change = DiffChange(ADDED, path)
+        elif entry.is_dir:
+            change = DiffChange(MODIFIED, path, "директория заменена файлом")
+        else:
+            content = vfs.read_file_content('/' + path)
+            if content is None:
+                continue   # Файл удален после снимка изменений
+            data = content if isinstance(content, bytes) else content.encode('utf-8')
+            if len(data) != entry.size:
+                change = DiffChange(MODIFIED, path, f"размер {entry.size} -> {len(data)}")
+            elif entry.crc is not None:
+                same = zlib.crc32(data) == entry.crc
+                change = DiffChange(METADATA, path, "время изменения") if same else \
+                    DiffChange(MODIFIED, path, "CRC32")
+            else:
+                stats.content_reads += 1
+                same = backend.read(path) == data
+                change = DiffChange(METADATA, path, "время изменения") if same else \
+                    DiffChange(MODIFIED, path, "содержимое")
+        stats.count(change)
+        yield change
+    for path in removed:
+        entry = backend.stat(path)
+        if entry is not None and not entry.is_dir:
+            change = DiffChange(REMOVED, path)
+            stats.count(change)
+            yield change
+    stats.elapsed = time.perf_counter() - start
@@ -0,0 +1,129 @@
+import io
+import os
+import stat
+from typing import BinaryIO, Iterator, List, Optional
+
+
+def permission_bits(permissions: str) -> int:
+    """Преобразует права вида rwxr-xr-x в биты режима"""
+    bits = 0
+    for i, flag in enumerate(permissions[:9]):
+        if flag != '-':
+            bits |= 1 << (8 - i)
+    return bits
+
+
+class VFSFileIO(io.RawIOBase):
+    """Небуферизованный поток чтения файла VFS (аналог io.FileIO).
+
+    Оборачивает поток источника (или содержимое из памяти) и дает ему
+    интерфейс RawIOBase: readinto, seek и tell, поэтому поверх него
+    работают BufferedReader, TextIOWrapper, shutil.copyfileobj и csv.
+    Данные читаются прямо в буфер вызывающего кода.
+    """
+
+    def __init__(self, stream: BinaryIO, name: str):
+        super().__init__()
+        if isinstance(stream, io.BufferedReader):
+            # Собственный буфер источника не нужен: буферизацию дает BufferedReader поверх этого потока
+            stream = stream.detach()
+        self._stream = stream
+        self.name = name
+        self.mode = 'rb'
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return self._stream.seekable()
+
+    def readinto(self, buffer) -> int:
+        return self._stream.readinto(buffer)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if not self._stream.seekable():
+            raise io.UnsupportedOperation("источник файла не поддерживает переход по смещению")
+        return self._stream.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._stream.tell()
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+    def __repr__(self) -> str:
+        return f"<VFSFileIO name={self.name!r}>"
+
+
+class VFSDirEntry:
+    """Запись директории VFS (аналог os.DirEntry).
+
+    Метаданные снимаются с узла при перечислении директории, поэтому
+    is_dir(), is_file() и stat() не обращаются к дереву повторно.
+    """
+
+    __slots__ = ('name', 'path', '_is_dir', '_size', '_modified_time', '_created_time',
+                 '_permissions', '_stat')
+
+    def __init__(self, name: str, path: str, is_dir: bool, size: int,
+                 modified_time: Optional[float], created_time: Optional[float], permissions: str):
+        self.name = name
+        self.path = path
+        self._is_dir = is_dir
+        self._size = size
+        self._modified_time = modified_time or 0.0
+        self._created_time = created_time or 0.0
+        self._permissions = permissions
+        self._stat: Optional[os.stat_result] = None
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        return self._is_dir
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        return not self._is_dir
+
+    def is_symlink(self) -> bool:
+        return False
+
+    def inode(self) -> int:
+        return 0
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        """Возвращает os.stat_result по сохраненным метаданным"""
+        if self._stat is None:
+            file_type = stat.S_IFDIR if self._is_dir else stat.S_IFREG
+            self._stat = os.stat_result((
+                file_type | permission_bits(self._permissions), 0, 0, 1, 0, 0, self._size,
+                self._modified_time, self._modified_time, self._created_time
+            ))
+        return self._stat
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"<VFSDirEntry {self.name!r}>"
+
+
+class ScandirIterator:
+    """Итератор записей директории; как и os.scandir, поддерживает with"""
+
+    def __init__(self, entries: List[VFSDirEntry]):
+        self._entries: Iterator[VFSDirEntry] = iter(entries)
+
+    def __iter__(self) -> 'ScandirIterator':
+        return self
+
+    def __next__(self) -> VFSDirEntry:
+        return next(self._entries)
+
+    def close(self):
+        self._entries = iter(())
+
+    def __enter__(self) -> 'ScandirIterator':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
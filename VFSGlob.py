@@ -0,0 +1,257 @@
+import fnmatch
+import re
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from FileType import FileType, VFSNode
+
+GLOB_CHARS = frozenset('*?[')
+
+# Виды сегментов шаблона
+SEGMENT_LITERAL = 0     # Точное имя, ищется прямым обращением к словарю детей
+SEGMENT_PATTERN = 1     # Шаблон с *, ? или [...]
+SEGMENT_RECURSIVE = 2   # ** - ноль или больше уровней директорий
+
+
+def has_magic(text: str) -> bool:
+    """Проверяет, содержит ли строка символы шаблона"""
+    return any(c in GLOB_CHARS for c in text)
+
+
+class CompiledGlob:
+    """Скомпилированный шаблон пути: список сегментов и признак абсолютного пути"""
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.absolute = pattern.startswith('/')
+        self.dirs_only = pattern.endswith('/')
+        self.segments: List[Tuple[int, str, Optional[Callable]]] = []
+
+        for part in pattern.split('/'):
+            if not part:
+                continue
+            if part == '**':
+                # Несколько ** подряд эквивалентны одному
+                if not self.segments or self.segments[-1][0] != SEGMENT_RECURSIVE:
+                    self.segments.append((SEGMENT_RECURSIVE, part, None))
+            elif has_magic(part):
+                matcher = re.compile(fnmatch.translate(part)).match
+                self.segments.append((SEGMENT_PATTERN, part, matcher))
+            else:
+                self.segments.append((SEGMENT_LITERAL, part, None))
+
+        self.recursive_count = sum(1 for kind, _, _ in self.segments if kind == SEGMENT_RECURSIVE)
+
+    def literal_prefix(self) -> List[str]:
+        """Возвращает начальные литеральные сегменты, по которым можно сразу сузить обход"""
+        prefix = []
+        for kind, name, _ in self.segments:
+            if kind != SEGMENT_LITERAL:
+                break
+            prefix.append(name)
+        return prefix
+
+
+@lru_cache(maxsize=512)
+def compile_glob(pattern: str) -> CompiledGlob:
+    """Компилирует шаблон один раз и кэширует результат"""
+    return CompiledGlob(pattern)
+
+
+def _join(prefix: str, name: str) -> str:
+    if not prefix:
+        return name
+    if prefix.endswith('/'):
+        return prefix + name
+    return prefix + '/' + name
+
+
+def _walk_directories(node: VFSNode, path: str) -> Iterator[Tuple[VFSNode, str]]:
+    """Итеративно обходит директорию и все вложенные (кроме скрытых) в глубину"""
+    stack = [(node, path)]
+    while stack:
+        current, current_path = stack.pop()
+        yield current, current_path
+        # Порядок обхода не важен: результаты сортируются в конце
+        for name, child in current.ensure_loaded().items():
+            if child.type == FileType.DIRECTORY and not name.startswith('.'):
+                stack.append((child, _join(current_path, name)))
+
+
+def _walk_all(node: VFSNode, path: str) -> Iterator[Tuple[VFSNode, str]]:
+    """Обходит все вложенные узлы (кроме скрытых), не включая саму директорию"""
+    for directory, directory_path in _walk_directories(node, path):
+        for name, child in directory.ensure_loaded().items():
+            if not name.startswith('.'):
+                yield child, _join(directory_path, name)
+
+
+def _match_segments(glob: CompiledGlob, node: VFSNode, path: str, index: int) -> Iterator[Tuple[VFSNode, str]]:
+    """Сопоставляет сегменты шаблона начиная с index относительно узла node"""
+    segments = glob.segments
+    # Стек состояний вместо рекурсии: глубокие ** не упираются в лимит рекурсии
+    stack = [(node, path, index)]
+    while stack:
+        current, current_path, i = stack.pop()
+
+        if i == len(segments):
+            yield current, current_path
+            continue
+
+        if current.type != FileType.DIRECTORY:
+            continue
+
+        kind, name, matcher = segments[i]
+        last = i == len(segments) - 1
+
+        if kind == SEGMENT_LITERAL:
+            if name == '.':
+                stack.append((current, _join(current_path, name), i + 1))
+                continue
+            child = current.ensure_loaded().get(name)
+            if child is not None:
+                stack.append((child, _join(current_path, name), i + 1))
+
+        elif kind == SEGMENT_PATTERN:
+            hidden_ok = name.startswith('.')
+            for child_name, child in current.ensure_loaded().items():
+                if not hidden_ok and child_name.startswith('.'):
+                    continue
+                if not last and child.type != FileType.DIRECTORY:
+                    continue
+                if matcher(child_name):
+                    stack.append((child, _join(current_path, child_name), i + 1))
+
+        else:
+            if last:
+                # ** в конце шаблона совпадает со всеми вложенными файлами и директориями
+                yield from _walk_all(current, current_path)
+                continue
+            for directory, directory_path in _walk_directories(current, current_path):
+                stack.append((directory, directory_path, i + 1))
+
+
+def expand_glob(vfs, pattern: str, cursor=None) -> List[str]:
+    """Раскрывает шаблон относительно текущей директории курсора и возвращает
+    отсортированный список путей"""
+    with vfs.lock.read_lock():
+        return _expand_glob(vfs, pattern, cursor)
+
+
+def _expand_glob(vfs, pattern: str, cursor) -> List[str]:
+    glob = compile_glob(pattern)
+
+    # Литеральный префикс разрешается один раз, обход начинается уже с него
+    prefix = glob.literal_prefix()
+    if glob.absolute:
+        start_path = '/' + '/'.join(prefix)
+        display_prefix = start_path
+    else:
+        start_path = '/'.join(prefix)
+        display_prefix = start_path
+
+    start_node = vfs.resolve_path(start_path, cursor)
+    if start_node is None:
+        return []
+
+    seen = set() if glob.recursive_count > 1 else None
+    results = []
+    for node, path in _match_segments(glob, start_node, display_prefix, len(prefix)):
+        if glob.dirs_only:
+            if node.type != FileType.DIRECTORY:
+                continue
+            path += '/'
+        if seen is not None:
+            if path in seen:
+                continue
+            seen.add(path)
+        results.append(path)
+
+    results.sort()
+    return results
+
+
+class PathFilter:
+    """Фильтр путей источника по шаблонам --include/--exclude.
+
+    Путь проходит фильтр, если он (или одна из его родительских директорий)
+    совпадает хотя бы с одним шаблоном include и ни он, ни его родители не
+    совпадают с шаблонами exclude. Директория проходит и тогда, когда внутри
+    нее могут оказаться подходящие пути. Шаблоны сопоставляются посегментно,
+    состояние сопоставления родительской директории запоминается, поэтому
+    проверка каждой записи архива стоит один шаг по ее имени.
+    """
+
+    def __init__(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None):
+        self.include = [compile_glob(pattern) for pattern in include or []]
+        self.exclude = [compile_glob(pattern) for pattern in exclude or []]
+        self._globs = self.include + self.exclude
+        # Путь директории -> для каждого шаблона множество позиций в его сегментах
+        self._directories = {'': tuple(self._closure(glob, {0}) for glob in self._globs)}
+
+    @classmethod
+    def from_patterns(cls, include: Optional[List[str]], exclude: Optional[List[str]]) -> Optional['PathFilter']:
+        """Создает фильтр или возвращает None, если шаблоны не заданы"""
+        if not include and not exclude:
+            return None
+        return cls(include, exclude)
+
+    @staticmethod
+    def _closure(glob: CompiledGlob, positions) -> frozenset:
+        # ** может совпасть с нулем директорий: позиция за ним достижима сразу
+        result = set(positions)
+        stack = list(positions)
+        while stack:
+            i = stack.pop()
+            if i < len(glob.segments) and glob.segments[i][0] == SEGMENT_RECURSIVE and i + 1 not in result:
+                result.add(i + 1)
+                stack.append(i + 1)
+        return frozenset(result)
+
+    def _step(self, glob: CompiledGlob, positions: frozenset, name: str) -> frozenset:
+        end = len(glob.segments)
+        following = set()
+        for i in positions:
+            if i == end:
+                # Совпавший путь захватывает все свое содержимое
+                following.add(end)
+                continue
+            kind, segment, matcher = glob.segments[i]
+            if kind == SEGMENT_RECURSIVE:
+                following.add(i)
+            elif kind == SEGMENT_PATTERN:
+                if matcher(name):
+                    following.add(i + 1)
+            elif segment == name or segment == '.':
+                following.add(i + 1)
+        return self._closure(glob, following) if following else frozenset()
+
+    def _states(self, path: str):
+        states = self._directories.get(path)
+        if states is None:
+            parent, _, name = path.rpartition('/')
+            states = tuple(self._step(glob, positions, name)
+                           for glob, positions in zip(self._globs, self._states(parent)))
+            self._directories[path] = states
+        return states
+
+    def accepts(self, path: str, is_dir: bool = False) -> bool:
+        """Проверяет путь вида a/b/c"""
+        if is_dir:
+            states = self._states(path)
+        else:
+            parent, _, name = path.rpartition('/')
+            states = tuple(self._step(glob, positions, name)
+                           for glob, positions in zip(self._globs, self._states(parent)))
+
+        include_states = states[:len(self.include)]
+        for glob, positions in zip(self.exclude, states[len(self.include):]):
+            if len(glob.segments) in positions:
+                return False
+        if not self.include:
+            return True
+        for glob, positions in zip(self.include, include_states):
+            if len(glob.segments) in positions:
+                return True
+        # В директории еще могут найтись пути, совпадающие с include
+        return is_dir and any(include_states)
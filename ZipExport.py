@@ -0,0 +1,288 @@
+import base64
+import io
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from ContentCache import Residency
+from FileType import FileType, VFSNode
+
+# Файлы крупнее CHUNK_SIZE сжимаются частями параллельно (как в pigz)
+CHUNK_SIZE = 1024 * 1024
+# Окно предыдущих данных, которым инициализируется словарь каждой части
+DEFLATE_WINDOW = 32 * 1024
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_COUNT_LIMIT = 0xFFFF
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+UTF8_FLAG = 0x800
+
+# Расширения уже сжатых форматов: при store_compressed такие файлы не пережимаются
+COMPRESSED_EXTENSIONS = frozenset([
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst', '.lz4',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.avi', '.mov',
+    '.jar', '.docx', '.xlsx', '.pptx', '.odt', '.pdf',
+])
+
+
+def deflate_chunk(data: bytes, level: int, zdict: bytes, last: bool) -> bytes:
+    """Сжимает часть файла в raw deflate.
+
+    Каждая часть сжимается независимо, словарь берется из конца предыдущей
+    части. Все части, кроме последней, завершаются Z_SYNC_FLUSH, поэтому
+    их конкатенация - корректный поток deflate.
+    """
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def dos_datetime(timestamp: Optional[float]):
+    """Преобразует время в формат даты и времени DOS"""
+    t = time.localtime(timestamp if timestamp is not None else time.time())
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class _Member:
+    """Запись архива; CRC и размеры заполняются по мере записи данных"""
+
+    def __init__(self, name: str, method: int, modified_time: Optional[float], is_dir: bool,
+                 zip64: bool):
+        self.name = name.encode('utf-8')
+        self.method = method
+        self.dos_time, self.dos_date = dos_datetime(modified_time)
+        self.is_dir = is_dir
+        self.zip64 = zip64
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+        self.header_offset = 0
+
+
+@dataclass
+class ExportStats:
+    """Итог экспорта"""
+    files: int = 0
+    directories: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    elapsed: float = 0.0
+
+
+class ParallelZipWriter:
+    """Запись ZIP-архива со сжатием в пуле потоков.
+
+    Сжатие частей идет параллельно (zlib отпускает GIL), а запись в файл -
+    строго в порядке добавления. Число частей в работе ограничено окном,
+    поэтому память не зависит от размера архива. Поддерживается ZIP64
+    для файлов и архивов больше 4 ГБ и более чем 65535 записей.
+    """
+
+    def __init__(self, path: str, level: int = 6, workers: Optional[int] = None,
+                 chunk_size: int = CHUNK_SIZE):
+        self.level = level
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.stats = ExportStats()
+        self._file = open(path, 'wb')
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+        self._window = self.workers * 4
+        self._members = []
+        self._started = time.perf_counter()
+
+    def add_directory(self, name: str, modified_time: Optional[float] = None):
+        """Добавляет запись директории (имя без завершающего '/')"""
+        member = _Member(name.rstrip('/') + '/', ZIP_STORED, modified_time, True, False)
+        self._pending.append(('begin', member))
+        self._pending.append(('end', member))
+        self.stats.directories += 1
+        self._drain(self._window)
+
+    def add_file(self, name: str, stream: BinaryIO, size_hint: int = 0,
+                 modified_time: Optional[float] = None, store: bool = False):
+        """Добавляет файл из потока; store - записать без сжатия"""
+        method = ZIP_STORED if store or self.level == 0 else ZIP_DEFLATED
+        # Как и zipfile, заранее резервируем поля ZIP64, если файл может превысить 4 ГБ
+        member = _Member(name, method, modified_time, False, size_hint * 1.05 > ZIP64_LIMIT)
+        self._pending.append(('begin', member))
+
+        zdict = b''
+        chunk = stream.read(self.chunk_size)
+        while True:
+            following = stream.read(self.chunk_size) if chunk else b''
+            last = not following
+            member.crc = zlib.crc32(chunk, member.crc)
+            member.file_size += len(chunk)
+            if method == ZIP_STORED:
+                if chunk:
+                    self._pending.append(('data', member, chunk))
+            else:
+                future = self._pool.submit(deflate_chunk, chunk, self.level, zdict, last)
+                self._pending.append(('future', member, future))
+                zdict = chunk[-DEFLATE_WINDOW:]
+            if last:
+                break
+            chunk = following
+            self._drain(self._window)
+
+        self._pending.append(('end', member))
+        self.stats.files += 1
+        self.stats.input_bytes += member.file_size
+        self._drain(self._window)
+
+    def _drain(self, limit: int):
+        """Записывает готовые части по порядку, пока в очереди не останется limit элементов"""
+        while len(self._pending) > limit:
+            kind, member, *rest = self._pending.popleft()
+            if kind == 'begin':
+                member.header_offset = self._file.tell()
+                self._file.write(self._local_header(member))
+            elif kind == 'data':
+                self._file.write(rest[0])
+                member.compress_size += len(rest[0])
+            elif kind == 'future':
+                data = rest[0].result()
+                self._file.write(data)
+                member.compress_size += len(data)
+            else:
+                self._finish_member(member)
+
+    def _local_header(self, member: _Member) -> bytes:
+        extra = b''
+        if member.zip64:
+            extra = struct.pack('<HHQQ', 0x0001, 16, member.file_size, member.compress_size)
+            sizes = (ZIP64_LIMIT, ZIP64_LIMIT)
+        else:
+            sizes = (member.compress_size, member.file_size)
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 45 if member.zip64 else 20, UTF8_FLAG, member.method,
+            member.dos_time, member.dos_date, member.crc, sizes[0], sizes[1],
+            len(member.name), len(extra)
+        ) + member.name + extra
+
+    def _finish_member(self, member: _Member):
+        """Дописывает в локальный заголовок CRC и размеры, известные после записи данных"""
+        if not member.zip64 and (member.file_size > ZIP64_LIMIT or member.compress_size > ZIP64_LIMIT):
+            raise ValueError(f"размер файла {member.name.decode('utf-8')} превышает оценку для ZIP64")
+        end = self._file.tell()
+        self._file.seek(member.header_offset)
+        self._file.write(self._local_header(member))
+        self._file.seek(end)
+        self._members.append(member)
+
+    def _central_directory_entry(self, member: _Member) -> bytes:
+        fields = []
+        file_size, compress_size, offset = member.file_size, member.compress_size, member.header_offset
+        if file_size >= ZIP64_LIMIT or member.zip64:
+            fields.append(file_size)
+            file_size = ZIP64_LIMIT
+        if compress_size >= ZIP64_LIMIT or member.zip64:
+            fields.append(compress_size)
+            compress_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            fields.append(offset)
+            offset = ZIP64_LIMIT
+        extra = b''
+        if fields:
+            extra = struct.pack('<HH' + 'Q' * len(fields), 0x0001, 8 * len(fields), *fields)
+        version = 45 if fields else 20
+        if member.is_dir:
+            attributes = (0o40755 << 16) | 0x10
+        else:
+            attributes = 0o100644 << 16
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | version, version, UTF8_FLAG, member.method,
+            member.dos_time, member.dos_date, member.crc, compress_size, file_size,
+            len(member.name), len(extra), 0, 0, 0, attributes, offset
+        ) + member.name + extra
+
+    def close(self) -> ExportStats:
+        """Дожидается сжатия, записывает центральный каталог и закрывает файл"""
+        try:
+            self._drain(0)
+            directory_offset = self._file.tell()
+            for member in self._members:
+                self._file.write(self._central_directory_entry(member))
+            directory_size = self._file.tell() - directory_offset
+            count = len(self._members)
+
+            if count >= ZIP_COUNT_LIMIT or directory_offset >= ZIP64_LIMIT or directory_size >= ZIP64_LIMIT:
+                zip64_offset = self._file.tell()
+                self._file.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0,
+                                             count, count, directory_size, directory_offset))
+                self._file.write(struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1))
+                count = min(count, ZIP_COUNT_LIMIT)
+                directory_size = min(directory_size, ZIP64_LIMIT)
+                directory_offset = min(directory_offset, ZIP64_LIMIT)
+
+            self._file.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count,
+                                         directory_size, directory_offset, 0))
+            self.stats.output_bytes = self._file.tell()
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._file.close()
+        self.stats.elapsed = time.perf_counter() - self._started
+        return self.stats
+
+
+def _open_node(node: VFSNode, seekable: bool) -> BinaryIO:
+    """Открывает содержимое файла VFS как поток байтов"""
+    if seekable and node.residency is not Residency.RESIDENT and node.opener is not None:
+        # Неизмененный файл читается потоком прямо из источника, минуя кэш
+        return node.opener()
+    content = node.get_content()
+    if node.is_binary:
+        return io.BytesIO(base64.b64decode(content))
+    return io.BytesIO(content.encode('utf-8'))
+
+
+def export_vfs(vfs, path: str, level: int = 6, store_compressed: bool = False,
+               workers: Optional[int] = None) -> ExportStats:
+    """Записывает текущее дерево VFS (с изменениями сессии) в ZIP-архив.
+
+    На время экспорта удерживается блокировка чтения, поэтому в архив
+    попадает согласованный снимок дерева.
+    """
+    # Файлы сжатых TAR-архивов при открытии распаковываются с начала архива,
+    # поэтому для них используется обычное чтение через кэш
+    seekable = vfs.backend is None or vfs.backend.seekable_members
+    writer = ParallelZipWriter(path, level, workers)
+    try:
+        with vfs.lock.read_lock():
+            stack = [(vfs.root, '')]
+            while stack:
+                directory, prefix = stack.pop()
+                if prefix:
+                    writer.add_directory(prefix, directory.modified_time)
+                subdirectories = []
+                for name in directory.sorted_names():
+                    node = directory.children[name]
+                    arcname = prefix + name
+                    if node.type == FileType.DIRECTORY:
+                        subdirectories.append((node, arcname + '/'))
+                        continue
+                    store = store_compressed and os.path.splitext(name)[1].lower() in COMPRESSED_EXTENSIONS
+                    with _open_node(node, seekable) as stream:
+                        writer.add_file(arcname, stream, node.size, node.modified_time, store)
+                # Обратный порядок в стеке сохраняет алфавитный порядок директорий
+                stack.extend(reversed(subdirectories))
+    except BaseException:
+        try:
+            writer.close()
+        finally:
+            os.remove(path)
+        raise
+    return writer.close()
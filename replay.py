@@ -0,0 +1,261 @@
+import argparse
+import contextlib
+import csv
+import gzip
+import io
+import math
+import os
+import shlex
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from ShellEmulator import ShellEmulator
+from FileType import VirtualFileSystem
+from Logger import Logger
+from Environment import NAME_PATTERN
+
+# Команды, которые нельзя повторять на общей VFS: они завершают сессию, заменяют или
+# перемонтируют VFS, удаляют файлы или пишут файлы на диск. run пропускается, потому что
+# команды скрипта записаны в лог отдельными строками (и скрипта может не быть на этой машине)
+SKIPPED_COMMANDS = frozenset([
+    'exit', 'vfs-init', 'run', 'mount', 'umount', 'rm', 'vfs-export', 'trace', 'profile',
+])
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_arguments():
+    """Парсит аргументы командной строки для воспроизведения логов"""
+    parser = argparse.ArgumentParser(
+        description='Воспроизведение CSV-логов эмулятора как нагрузочного теста',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python replay.py --vfs-path ./new_vfs.zip --log-file ./logs/replay.log ./logs/shell.log
+  python replay.py --vfs-path ./new_vfs.zip --log-file ./logs/replay.log --mode original --speed 10 ./logs/shell.log
+  python replay.py --vfs-path ./new_vfs.zip --log-file ./logs/replay.log --sessions 8 ./logs/shell.log.2.gz ./logs/shell.log.1.gz ./logs/shell.log
+        """
+    )
+
+    parser.add_argument(
+        'logs',
+        nargs='+',
+        help='CSV-логи эмулятора (в том числе архивные .gz) в порядке воспроизведения'
+    )
+
+    parser.add_argument(
+        '--vfs-path',
+        required=True,
+        help='Путь к VFS, на которой воспроизводятся команды'
+    )
+
+    parser.add_argument(
+        '--log-file',
+        required=True,
+        help='Лог-файл воспроизведения'
+    )
+
+    parser.add_argument(
+        '--mode',
+        choices=['fast', 'original'],
+        default='fast',
+        help='fast - без пауз, original - с исходными интервалами между командами'
+    )
+
+    parser.add_argument(
+        '--speed',
+        type=float,
+        default=1.0,
+        help='Ускорение исходных интервалов в режиме original (по умолчанию 1.0)'
+    )
+
+    parser.add_argument(
+        '--sessions',
+        type=int,
+        default=1,
+        help='Число параллельных сессий; каждая воспроизводит весь поток команд (по умолчанию 1)'
+    )
+
+    return parser.parse_args()
+
+
+def open_log(path):
+    """Открывает лог для потокового чтения, архивные копии .gz распаковываются на лету"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    return open(path, 'r', newline='', encoding='utf-8')
+
+
+def read_events(paths):
+    """Потоково читает события из логов: (время, команда, аргументы)"""
+    for path in paths:
+        with open_log(path) as f:
+            for row in csv.reader(f):
+                if len(row) < 4 or row[0] == 'timestamp':
+                    # Заголовок (в том числе после ротации) или поврежденная строка
+                    continue
+                try:
+                    timestamp = datetime.strptime(row[0], TIMESTAMP_FORMAT).timestamp()
+                except ValueError:
+                    continue
+                yield timestamp, row[2], row[3]
+
+
+def split_arguments(arguments):
+    """Разбирает аргументы из лога (записаны через shlex.join)"""
+    if not arguments:
+        return []
+    try:
+        return shlex.split(arguments)
+    except ValueError:
+        # Логи прежних версий: аргументы записаны через пробел без кавычек
+        return arguments.split()
+
+
+def is_replayable(shell, command, arguments):
+    """Проверяет, является ли событие командой пользователя, которую можно повторить"""
+    if command in SKIPPED_COMMANDS:
+        return False
+    if command in shell.commands:
+        return True
+    # Присваивание NAME=value без аргументов
+    name, sep, _ = command.partition('=')
+    return bool(sep) and NAME_PATTERN.match(name) is not None and not arguments
+
+
+class ReplayStats:
+    """Задержки команд одной сессии"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.executed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.max_lag = 0.0   # Наибольшее отставание от исходного расписания
+
+    def record(self, command, latency, status):
+        samples = self.latencies.get(command)
+        if samples is None:
+            samples = self.latencies[command] = array('d')
+        samples.append(latency)
+        self.executed += 1
+        if status != 0:
+            self.failed += 1
+
+    def merge(self, other: 'ReplayStats'):
+        for command, samples in other.latencies.items():
+            self.latencies.setdefault(command, array('d')).extend(samples)
+        self.executed += other.executed
+        self.failed += other.failed
+        self.skipped += other.skipped
+        self.max_lag = max(self.max_lag, other.max_lag)
+
+
+def replay_session(shell, paths, mode, speed, stats):
+    """Воспроизводит поток команд в одной сессии"""
+    start_wall = time.perf_counter()
+    start_log = None
+
+    for timestamp, command, arguments in read_events(paths):
+        if not is_replayable(shell, command, arguments):
+            stats.skipped += 1
+            continue
+
+        if mode == 'original':
+            if start_log is None:
+                start_log = timestamp
+            due = start_wall + (timestamp - start_log) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                stats.max_lag = max(stats.max_lag, -delay)
+
+        # Аргументы в логе уже раскрыты, поэтому команда выполняется без повторного разбора
+        args = split_arguments(arguments)
+        started = time.perf_counter()
+        status = shell.execute_command(command, args)
+        stats.record(command, time.perf_counter() - started, status)
+
+
+class _NullWriter(io.TextIOBase):
+    """Поток вывода, отбрасывающий все записанное"""
+
+    def write(self, text):
+        return len(text)
+
+
+def percentile(sorted_samples, percent):
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(sorted_samples)), 1)
+    return sorted_samples[rank - 1]
+
+
+def format_report(stats, elapsed, args):
+    """Форматирует итоги воспроизведения"""
+    rate = stats.executed / elapsed if elapsed > 0 else 0.0
+    yield f"Воспроизведение: логов {len(args.logs)}, сессий {args.sessions}, режим {args.mode}"
+    yield (f"Выполнено команд: {stats.executed} за {elapsed:.3f} с ({rate:,.0f} команд/с), "
+           f"с ошибкой: {stats.failed}, пропущено событий: {stats.skipped}")
+    if args.mode == 'original':
+        yield f"Наибольшее отставание от расписания: {stats.max_lag * 1000:.1f} мс"
+
+    yield f"{'Команда':<12} {'Вызовов':>9} {'p50 мс':>9} {'p90 мс':>9} {'p99 мс':>9} {'max мс':>9}"
+    for command in sorted(stats.latencies, key=lambda name: -len(stats.latencies[name])):
+        samples = sorted(stats.latencies[command])
+        yield (f"{command:<12} {len(samples):>9} "
+               f"{percentile(samples, 50) * 1000:>9.3f} {percentile(samples, 90) * 1000:>9.3f} "
+               f"{percentile(samples, 99) * 1000:>9.3f} {samples[-1] * 1000:>9.3f}")
+
+
+def main():
+    """Точка входа воспроизведения логов"""
+    args = parse_arguments()
+    if args.sessions < 1 or args.speed <= 0:
+        print("Ошибка: --sessions должно быть не меньше 1, --speed - больше 0")
+        sys.exit(2)
+    for path in args.logs:
+        if not os.path.isfile(path):
+            print(f"Ошибка: лог '{path}' не найден")
+            sys.exit(2)
+
+    os.makedirs(os.path.dirname(args.log_file) or ".", exist_ok=True)
+
+    # Все сессии работают с одной VFS и одним логом, у каждой сессии свой курсор
+    vfs = VirtualFileSystem(args.vfs_path, quiet=True)
+    username = os.environ.get("USER") or os.environ.get("USERNAME", "unknown")
+    logger = Logger(args.log_file, username, buffered=True)
+    shells = [ShellEmulator(args.vfs_path, args.log_file, batch=True, vfs=vfs, logger=logger)
+              for _ in range(args.sessions)]
+    session_stats = [ReplayStats() for _ in shells]
+
+    # Вывод команд не нужен, измеряется только время их выполнения
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(_NullWriter()):
+        threads = [
+            threading.Thread(target=replay_session, args=(shell, args.logs, args.mode, args.speed, stats))
+            for shell, stats in zip(shells, session_stats)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    logger.close()
+    vfs.close()
+
+    total = ReplayStats()
+    for stats in session_stats:
+        total.merge(stats)
+    for line in format_report(total, elapsed, args):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
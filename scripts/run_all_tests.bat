@@ -18,6 +18,8 @@ echo.
 call scripts\test_different_paths.bat
 echo.
 call scripts\test_error_cases.bat
+echo.
+call scripts\test_concurrency.bat
 
 echo.
 echo ===============================================
@@ -0,0 +1,17 @@
+@echo off
+chcp 65001 > nul
+echo ===============================================
+echo Тест: параллельное чтение и запись VFS
+echo ===============================================
+
+if not exist "logs" mkdir logs
+
+python shell_emulator.py --log-file "./logs/concurrency_test.log" --benchmark concurrency --benchmark-iterations 5000 --benchmark-threads 16
+if errorlevel 1 (
+    echo Тест завершился с ошибками
+) else (
+    echo Тест пройден
+)
+
+echo.
+pause
\ No newline at end of file
@@ -1,8 +1,24 @@
 import argparse
+import heapq
+import io
 import os
+import random
+import sys
+import tarfile
+import tempfile
+import threading
+import time
 import zipfile
 from ShellEmulator import *
 from FileType import *
+from ContentCache import Residency, configure_content_cache
+from MetadataTable import ROW_FILE, MetadataQuery, MetadataTable, np
+from OutOfCore import OutOfCorePolicy
+from SharedImage import build_image
+from StorageBackends import is_image_file
+from VFSGlob import PathFilter
+from Logger import LogLevel
+from Tracer import DEFAULT_TRACE_CAPACITY, tracer
 
 
 def parse_arguments():
@@ -16,6 +32,9 @@ def parse_arguments():
   python shell_emulator.py --create-test minimal --log-file ./logs/test.log
   python shell_emulator.py --create-test medium --log-file ./logs/test.log --startup-script ./test.txt
   python shell_emulator.py --create-test deep --log-file ./logs/test.log
+  python shell_emulator.py --vfs-path ./my_vfs.zip --log-file ./logs/shell.log --build-image ./my_vfs.vfsimg
+  python shell_emulator.py --vfs-path ./base.zip --layer ./team_delta.zip --log-file ./logs/shell.log
+  python shell_emulator.py --vfs-path ./full.zip --include 'home/user/**' --include 'etc/**' --exclude '**/*.bak' --log-file ./logs/shell.log
         """
     )
 
@@ -41,9 +60,221 @@ def parse_arguments():
         help='Автоматически создать тестовую VFS указанного типа'
     )
 
+    parser.add_argument(
+        '--cache-budget',
+        type=parse_size,
+        help='Бюджет памяти для содержимого файлов VFS (например 64M); включает ленивую загрузку'
+    )
+
+    parser.add_argument(
+        '--cache-no-compress',
+        action='store_true',
+        help='Не сжимать холодные файлы в кэше, а сразу выгружать их'
+    )
+
+    parser.add_argument(
+        '--max-memory',
+        type=parse_size,
+        help='Лимит памяти для архивов больше ОЗУ (например 256M): потоковое чтение, '
+             'временные файлы и индекс узлов в SQLite'
+    )
+
+    parser.add_argument(
+        '--spill-dir',
+        help='Директория для временных файлов режима --max-memory (по умолчанию системная)'
+    )
+
+    parser.add_argument(
+        '--report-memory',
+        action='store_true',
+        help='Отследить выделения памяти при загрузке VFS (tracemalloc) и вывести отчет vfs-stats'
+    )
+
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Проверить CRC файлов архива при запуске; в ленивом режиме CRC проверяется при первом чтении файла'
+    )
+
+    parser.add_argument(
+        '--layer',
+        action='append',
+        default=[],
+        metavar='ПУТЬ',
+        help='Смонтировать архив или директорию поверх --vfs-path (можно повторять, '
+             'последний слой - верхний)'
+    )
+
+    parser.add_argument(
+        '--include',
+        action='append',
+        default=[],
+        metavar='ШАБЛОН',
+        help='Загрузить из источника только пути, совпадающие с шаблоном (например home/user/**); '
+             'можно повторять'
+    )
+
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=[],
+        metavar='ШАБЛОН',
+        help='Не загружать пути, совпадающие с шаблоном (например backup/** или **/*.bak); '
+             'можно повторять'
+    )
+
+    parser.add_argument(
+        '--search-index',
+        action='store_true',
+        help='Построить в фоне индекс содержимого для команды search; индекс архива '
+             'сохраняется рядом с ним (ФАЙЛ.trgm) и используется повторно'
+    )
+
+    parser.add_argument(
+        '--build-image',
+        metavar='ФАЙЛ',
+        help='Построить из --vfs-path неизменяемый образ VFS для подключения несколькими процессами '
+             '(--vfs-path ФАЙЛ) и завершиться'
+    )
+
+    parser.add_argument(
+        '--profile',
+        metavar='ФАЙЛ',
+        help='Профилировать выполнение команд и сохранить результат в файл '
+             '(pstats, а с --profile-sample - свернутые стеки для flamegraph)'
+    )
+
+    parser.add_argument(
+        '--profile-sample',
+        action='store_true',
+        help='Использовать для --profile легковесное профилирование снимками стека'
+    )
+
+    parser.add_argument(
+        '--profile-interval',
+        type=float,
+        default=5.0,
+        help='Интервал снимков стека в миллисекундах (по умолчанию 5)'
+    )
+
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=20,
+        help='Сколько функций вывести после завершения профилирования (по умолчанию 20)'
+    )
+
+    parser.add_argument(
+        '--trace',
+        metavar='ФАЙЛ',
+        help='Записать трассировку выполнения (скрипты, разбор, команды, разрешение путей, '
+             'чтение архива, сброс лога) в JSON формата Chrome trace-event для Perfetto'
+    )
+
+    parser.add_argument(
+        '--trace-buffer',
+        type=int,
+        default=DEFAULT_TRACE_CAPACITY,
+        help=f'Емкость кольцевого буфера трассировки в отрезках (по умолчанию {DEFAULT_TRACE_CAPACITY}); '
+             'при переполнении вытесняются самые старые'
+    )
+
+    parser.add_argument(
+        '--log-level',
+        choices=[level.name for level in LogLevel],
+        default='DEBUG',
+        help='Минимальный уровень записываемых событий (по умолчанию DEBUG - все события)'
+    )
+
+    parser.add_argument(
+        '--log-sample',
+        action='append',
+        type=parse_sample_rate,
+        default=[],
+        metavar='КОМАНДА=ДОЛЯ',
+        help='Доля записываемых успешных вызовов команды, например echo=0.01 или *=0.1 (ошибки пишутся всегда)'
+    )
+
+    parser.add_argument(
+        '--log-max-bytes',
+        type=parse_size,
+        help='Ротация лога при достижении размера (например 10M)'
+    )
+
+    parser.add_argument(
+        '--log-rotate-interval',
+        type=float,
+        help='Ротация лога по времени, в секундах'
+    )
+
+    parser.add_argument(
+        '--log-backups',
+        type=int,
+        default=5,
+        help='Количество хранимых архивных копий лога (по умолчанию 5)'
+    )
+
+    parser.add_argument(
+        '--log-gzip',
+        action='store_true',
+        help='Сжимать архивные копии лога gzip'
+    )
+
+    parser.add_argument(
+        '-c',
+        dest='command',
+        help='Выполнить команды (через ";") без баннера и приглашения и выйти'
+    )
+
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='Читать команды из stdin без баннера и приглашения'
+    )
+
+    parser.add_argument(
+        '--throughput',
+        action='store_true',
+        help='В пакетном режиме вывести в stderr число команд и скорость выполнения'
+    )
+
+    parser.add_argument(
+        '--benchmark',
+        choices=['parse', 'concurrency', 'metadata'],
+        help='Запустить микро-бенчмарк и выйти (concurrency - нагрузочный тест '
+             'параллельного чтения и записи VFS с проверкой результатов, metadata - '
+             'запросы find по таблице метаданных против обхода дерева; итерации - число узлов)'
+    )
+
+    parser.add_argument(
+        '--benchmark-iterations',
+        type=int,
+        default=200000,
+        help='Количество итераций бенчмарка (по умолчанию 200000)'
+    )
+
+    parser.add_argument(
+        '--benchmark-threads',
+        type=int,
+        default=8,
+        help='Количество потоков-читателей для бенчмарка concurrency (по умолчанию 8)'
+    )
+
     return parser.parse_args()
 
 
+def parse_size(value):
+    """Преобразует размер вида 512, 64K, 16M, 2G в байты"""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = value.strip().upper().rstrip('B')
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"некорректный размер: {value}")
+
+
 def create_minimal_vfs():
     """Создает минимальную VFS"""
     archive_path = "minimal_vfs.zip"
@@ -355,10 +586,387 @@ echo "Готово!"
     print("Созданы тестовые стартовые скрипты в папке scripts/")
 
 
+def run_parse_benchmark(log_file, iterations):
+    """Измеряет пропускную способность parse_command в строках в секунду"""
+    shell = ShellEmulator(vfs_path="benchmark_vfs", log_file=log_file)
+    shell.environment.set("VFS_VERSION", "1.0")
+
+    samples = {
+        'без переменных': 'ls home/user/documents',
+        'с переменными': 'echo "Пользователь: $USER, дом: ${HOME}, версия: $VFS_VERSION"',
+        'код возврата': 'echo $?',
+        'с кавычками': "echo 'a b' \"c d\" e\\ f",
+        'конвейер': 'cat big.log | grep ERROR | head -n 5 > out.txt',
+    }
+
+    print(f"Бенчмарк parse_command, итераций: {iterations}")
+    for label, line in samples.items():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            shell.parse_command(line)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<16} {iterations / elapsed:>12,.0f} строк/с")
+
+
+def run_concurrency_stress_test(iterations, readers):
+    """Нагружает одну VFS параллельными читателями и писателями и проверяет,
+    что читатели всегда видят согласованное содержимое. Последний писатель
+    меняет структуру дерева: удаляет файлы и создает их заново узлами с
+    загрузчиком, содержимое которых читается при первом обращении. Возвращает код завершения"""
+    # Пустая VFS в памяти: каждый писатель работает в своей директории
+    vfs = VirtualFileSystem("stress_vfs", quiet=True)
+    directories = ["/home", "/home/user", "/home/churn"]
+    writers = len(directories)
+    files_per_writer = 20
+    churn = VFSNode("churn", FileType.DIRECTORY)
+    vfs.resolve_path("/home").add_child(churn)
+
+    def expected(writer, index, version):
+        return f"{writer}:{index}:{version}\n" * (index + 1)
+
+    errors = []
+    reads = [0] * readers
+    stop = threading.Event()
+
+    def write_loop(writer):
+        cursor = vfs.open_cursor()
+        if not cursor.change_directory(directories[writer]):
+            errors.append(f"писатель {writer}: не удалось перейти в {directories[writer]}")
+            return
+        for version in range(iterations):
+            index = version % files_per_writer
+            if not cursor.write_file(f"f{index}.txt", [expected(writer, index, version)]):
+                errors.append(f"писатель {writer}: не удалось записать f{index}.txt")
+        if cursor.get_current_path() != directories[writer]:
+            errors.append(f"писатель {writer}: курсор изменился: {cursor.get_current_path()}")
+
+    def churn_loop(writer):
+        for version in range(iterations):
+            index = version % files_per_writer
+            name = f"f{index}.txt"
+            data = expected(writer, index, version).encode('utf-8')
+            node = VFSNode(name, FileType.FILE, size=len(data), residency=Residency.EVICTED,
+                           loader=lambda data=data: data)
+            with vfs.lock.write_lock():
+                churn.remove_child(name)
+                if not churn.add_child(node):
+                    errors.append(f"писатель {writer}: не удалось создать {name}")
+
+    def read_loop(reader):
+        cursor = vfs.open_cursor()
+        writer = reader % writers
+        cursor.change_directory(directories[writer])
+        while not stop.is_set():
+            for entry in cursor.list_directory():
+                name = entry['name']
+                if entry['type'] != FileType.FILE.value:
+                    continue
+                content = cursor.read_file_content(name)
+                if content is None and writer == writers - 1:
+                    continue   # Файл удален после чтения списка
+                # Файл должен целиком соответствовать одной из версий
+                index = int(name[1:-4])
+                version = content.split(':', 3)[2].split('\n', 1)[0] if content else ""
+                if not version.isdigit() or content != expected(writer, index, int(version)):
+                    errors.append(f"читатель {reader}: несогласованное содержимое {directories[writer]}/{name}")
+                    stop.set()
+                reads[reader] += 1
+            if cursor.get_current_path() != directories[writer]:
+                errors.append(f"читатель {reader}: курсор изменился: {cursor.get_current_path()}")
+                stop.set()
+
+    reader_threads = [threading.Thread(target=read_loop, args=(i,)) for i in range(readers)]
+    writer_threads = [threading.Thread(target=write_loop, args=(i,)) for i in range(writers - 1)]
+    writer_threads.append(threading.Thread(target=churn_loop, args=(writers - 1,)))
+
+    print(f"Нагрузочный тест VFS: читателей {readers}, писателей {writers} (из них создает и удаляет узлы: 1), "
+          f"записей на писателя {iterations}")
+    start = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # После завершения писателей в каждом файле должна быть последняя версия
+    for writer in range(writers):
+        for index in range(min(files_per_writer, iterations)):
+            last_version = max(v for v in range(iterations) if v % files_per_writer == index)
+            path = f"{directories[writer]}/f{index}.txt"
+            if vfs.read_file_content(path) != expected(writer, index, last_version):
+                errors.append(f"{path}: итоговое содержимое не совпадает")
+
+    total_reads = sum(reads)
+    print(f"  Чтений: {total_reads:,} ({total_reads / elapsed:,.0f}/с), записей: {writers * iterations:,}, "
+          f"время: {elapsed:.2f} с")
+    errors.extend(run_tar_stream_stress(max(1, iterations // 50), readers))
+    if errors:
+        print(f"  ОШИБКИ ({len(errors)}):")
+        for error in errors[:10]:
+            print(f"    {error}")
+        return 1
+    print("  Результат: OK")
+    return 0
+
+
+def run_tar_stream_stress(streams, readers):
+    """Параллельно читает потоки open_stream() файлов TAR-архива, смонтированного
+    лениво, и проверяет, что каждый поток видит только байты своего файла.
+    Возвращает список ошибок"""
+    files, file_size, chunk = 8, 256 * 1024, 16 * 1024
+    errors = []
+    with tempfile.TemporaryDirectory() as directory:
+        archive_path = os.path.join(directory, "stress.tar")
+        with tarfile.open(archive_path, 'w') as tar:
+            for index in range(files):
+                info = tarfile.TarInfo(f"data/f{index}.bin")
+                info.size = file_size
+                tar.addfile(info, io.BytesIO(bytes([65 + index]) * file_size))
+        vfs = VirtualFileSystem(archive_path, quiet=True, lazy=True)
+
+        def read_loop(reader):
+            rng = random.Random(reader)
+            for _ in range(streams):
+                index = rng.randrange(files)
+                stream = vfs.open_stream(f"/data/f{index}.bin")
+                if stream is None:
+                    errors.append(f"читатель {reader}: не удалось открыть /data/f{index}.bin")
+                    return
+                with stream:
+                    for _ in range(64):
+                        stream.seek(rng.randrange(file_size - chunk))
+                        if stream.read(chunk) != bytes([65 + index]) * chunk:
+                            errors.append(f"читатель {reader}: чужие байты в потоке /data/f{index}.bin")
+                            return
+
+        threads = [threading.Thread(target=read_loop, args=(i,)) for i in range(readers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        vfs.close()
+        print(f"  Потоков TAR: {streams * readers:,}, время: {time.perf_counter() - start:.2f} с")
+    return errors
+
+
+def run_metadata_benchmark(nodes):
+    """Сравнивает запросы find по таблице метаданных с обходом узлов дерева
+    на синтетической VFS из nodes узлов. Возвращает код завершения"""
+    rng = random.Random(42)
+    now = time.time()
+    week_ago = now - 7 * 86400
+    files_per_directory = 1000
+
+    # Узлы создаются напрямую: содержимое не нужно, важны только размер и время изменения
+    vfs = VirtualFileSystem("metadata_benchmark_vfs", quiet=True)
+    data = VFSNode("data", FileType.DIRECTORY)
+    vfs.root.set_child(data)
+    other = VFSNode("other", FileType.DIRECTORY)
+    vfs.root.set_child(other)
+    created = 0
+    directory_number = 0
+    while created < nodes:
+        parent = data if directory_number % 4 else other
+        directory = VFSNode(f"dir{directory_number}", FileType.DIRECTORY)
+        parent.set_child(directory)
+        for i in range(min(files_per_directory, nodes - created)):
+            directory.set_child(VFSNode(
+                f"file{i}.dat", FileType.FILE, residency=Residency.EVICTED,
+                size=int(rng.paretovariate(1.2) * 4096), modified_time=now - rng.random() * 60 * 86400))
+        created += files_per_directory + 1
+        directory_number += 1
+
+    def walk(node, path):
+        """Обход узлов в глубину, как без таблицы"""
+        stack = [(node, path)]
+        while stack:
+            current, current_path = stack.pop()
+            yield current, current_path
+            if current.type == FileType.DIRECTORY:
+                for name, child in current.children.items():
+                    stack.append((child, f"{current_path}/{name}"))
+
+    def walk_recent_large():
+        return sorted(path for node, path in walk(data, "/data")
+                      if node.type == FileType.FILE and node.size > 10 * 1024 ** 2
+                      and node.modified_time > week_ago)
+
+    def walk_top():
+        top = heapq.nlargest(100, ((node.size, path) for node, path in walk(vfs.root, "")
+                                   if node.type == FileType.FILE))
+        return [size for size, _ in top]
+
+    def walk_total():
+        return sum(node.size for node, _ in walk(vfs.root, "") if node.type == FileType.FILE)
+
+    def table_recent_large():
+        rows = table.select(table.row_of(['data']), MetadataQuery(
+            type=ROW_FILE, min_size=10 * 1024 ** 2, newer_than=week_ago))
+        return sorted('/' + table.path(row) for row in rows)
+
+    def table_top():
+        rows = table.select(0, MetadataQuery(type=ROW_FILE))
+        return [table.size[row] for row in table.largest(rows, 100)]
+
+    def table_total():
+        return table.summary(table.select(0, MetadataQuery(type=ROW_FILE)))['total_size']
+
+    start = time.perf_counter()
+    table = MetadataTable.from_tree(vfs.root)
+    build_time = time.perf_counter() - start
+
+    print(f"Бенчмарк таблицы метаданных: узлов {len(table):,}, NumPy: {'да' if np is not None else 'нет'}")
+    print(f"  Построение таблицы: {build_time:.3f} с")
+    mismatches = 0
+    queries = [
+        ('файлы > 10M за неделю в /data', walk_recent_large, table_recent_large),
+        ('100 наибольших файлов', walk_top, table_top),
+        ('суммарный размер', walk_total, table_total),
+    ]
+    for label, walk_query, table_query in queries:
+        start = time.perf_counter()
+        expected = walk_query()
+        walk_time = time.perf_counter() - start
+        start = time.perf_counter()
+        result = table_query()
+        table_time = time.perf_counter() - start
+        status = "OK" if result == expected else "РАСХОЖДЕНИЕ"
+        mismatches += result != expected
+        print(f"  {label:<32} обход {walk_time * 1000:>9.1f} мс, таблица {table_time * 1000:>8.1f} мс, "
+              f"ускорение {walk_time / max(table_time, 1e-9):>6.1f}x  {status}")
+    return 1 if mismatches else 0
+
+
+def report_integrity(shell, output):
+    """Выполняет проверку целостности для --verify"""
+    if shell.vfs.lazy:
+        # Полный проход распаковки при запуске не нужен: каждый файл проверяется при первом чтении
+        print("Проверка CRC: выполняется при первом чтении каждого файла (ленивый режим)", file=output)
+    else:
+        # При полной загрузке все файлы уже прочитаны, отчет собирается без повторного чтения
+        shell.execute_line("vfs-verify")
+
+
+def start_profiling(shell, args):
+    """Включает профилирование, если задан --profile"""
+    if args.profile:
+        shell.start_profiling(sampling=args.profile_sample, interval=args.profile_interval / 1000)
+
+
+def finish_profiling(shell, args, output):
+    """Сохраняет профиль и выводит top-N функций"""
+    if not args.profile or shell.profiler is None:
+        return
+    shell.profiler.stop()
+    try:
+        shell.profiler.dump(args.profile)
+        print(f"Профиль сохранен: {args.profile}", file=output)
+    except OSError as e:
+        print(f"Ошибка сохранения профиля: {e}", file=output)
+    for line in shell.profiler.top(args.profile_top):
+        print(line, file=output)
+
+
+def finish_tracing(args, output):
+    """Сохраняет трассировку, если задан --trace"""
+    if not args.trace:
+        return
+    tracer.stop()
+    try:
+        count = tracer.dump(args.trace)
+        print(f"Трассировка сохранена: {args.trace} (отрезков: {count}, вытеснено: {tracer.dropped})",
+              file=output)
+    except OSError as e:
+        print(f"Ошибка сохранения трассировки: {e}", file=output)
+
+
+def run_batch_mode(vfs_path, args):
+    """Выполняет команды из -c или stdin и возвращает код завершения"""
+    shell = ShellEmulator(vfs_path=vfs_path, log_file=args.log_file, batch=True,
+                          log_options=build_log_options(args), vfs_options=build_vfs_options(args))
+
+    if args.report_memory:
+        shell.execute_line("vfs-stats")
+    if args.verify:
+        report_integrity(shell, sys.stderr)
+    start_profiling(shell, args)
+
+    start = time.perf_counter()
+    try:
+        if args.command is not None:
+            status = shell.run_batch([args.command])
+        else:
+            status = shell.run_batch(sys.stdin)
+    finally:
+        shell.logger.close()
+    elapsed = time.perf_counter() - start
+    shell.vfs.wait_index_saved()
+    # Отчет профилировщика идет в stderr, чтобы не смешиваться с выводом команд
+    finish_profiling(shell, args, sys.stderr)
+    finish_tracing(args, sys.stderr)
+
+    if args.throughput:
+        rate = shell.commands_executed / elapsed if elapsed > 0 else 0.0
+        print(f"Выполнено команд: {shell.commands_executed} за {elapsed:.3f} с ({rate:,.0f} команд/с)",
+              file=sys.stderr)
+        stats = shell.logger.stats()
+        print(f"Лог: записано {stats['written']}, отброшено по уровню {stats['dropped_by_level']}, "
+              f"выборкой {stats['dropped_by_sampling']}, ротаций {stats['rotations']}", file=sys.stderr)
+    return status
+
+
+def parse_sample_rate(value):
+    """Преобразует строку вида команда=доля в пару (команда, доля)"""
+    command, sep, rate = value.partition('=')
+    try:
+        rate = float(rate)
+    except ValueError:
+        sep = ""
+    if not sep or not command or not 0 <= rate <= 1:
+        raise argparse.ArgumentTypeError(f"ожидается команда=доля от 0 до 1: {value}")
+    return command, rate
+
+
+def build_vfs_options(args):
+    """Собирает параметры VFS из аргументов командной строки"""
+    return {
+        'max_memory': args.max_memory,
+        'spill_dir': args.spill_dir,
+        'trace_memory': args.report_memory,
+        'layers': args.layer,
+        'search_index': args.search_index,
+        'path_filter': PathFilter.from_patterns(args.include, args.exclude),
+    }
+
+
+def build_log_options(args):
+    """Собирает параметры логгера из аргументов командной строки"""
+    return {
+        'level': LogLevel[args.log_level],
+        'sample_rates': dict(args.log_sample),
+        'max_bytes': args.log_max_bytes,
+        'rotate_interval': args.log_rotate_interval,
+        'backup_count': args.log_backups,
+        'compress_rotated': args.log_gzip,
+    }
+
+
 def main():
     """Точка входа в приложение"""
     args = parse_arguments()
 
+    if args.benchmark == 'parse':
+        run_parse_benchmark(args.log_file, args.benchmark_iterations)
+        return
+    if args.benchmark == 'concurrency':
+        sys.exit(run_concurrency_stress_test(args.benchmark_iterations, args.benchmark_threads))
+    if args.benchmark == 'metadata':
+        sys.exit(run_metadata_benchmark(args.benchmark_iterations))
+
     # Создаем тестовую VFS если запрошено
     vfs_path = args.vfs_path
     if args.create_test:
@@ -404,9 +1012,36 @@ def main():
         print("Ошибка: необходимо указать --vfs-path или --create-test")
         return
 
+    if args.build_image:
+        try:
+            stats = build_image(vfs_path, args.build_image,
+                                PathFilter.from_patterns(args.include, args.exclude))
+        except (OSError, ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+            print(f"Ошибка построения образа: {e}")
+            sys.exit(1)
+        print(f"Образ VFS построен: {args.build_image} (узлов: {stats.nodes}, файлов: {stats.files}, "
+              f"{stats.image_bytes} байт) за {stats.elapsed:.3f} с")
+        return
+
+    # Без явного бюджета кэша в режиме --max-memory кэшу отдается половина лимита
+    if args.cache_budget is None and args.max_memory is not None:
+        args.cache_budget = OutOfCorePolicy.from_limit(args.max_memory).cache_budget
+    if args.cache_budget is not None:
+        configure_content_cache(args.cache_budget, compress=not args.cache_no_compress)
+    if args.trace_buffer <= 0:
+        print(f"Ошибка: некорректный размер буфера трассировки: {args.trace_buffer}")
+        sys.exit(1)
+    # Трассировка включается до создания оболочки, чтобы в нее попала загрузка VFS
+    if args.trace:
+        tracer.start(args.trace_buffer)
+
     # Создаем необходимые директории для логов
     os.makedirs(os.path.dirname(args.log_file) if os.path.dirname(args.log_file) else ".", exist_ok=True)
 
+    # Пакетный режим: без вывода параметров, баннера и приглашения
+    if args.command is not None or args.batch:
+        sys.exit(run_batch_mode(vfs_path, args))
+
     # Отладочный вывод параметров
     print("=" * 60)
     print("ПАРАМЕТРЫ ЗАПУСКА ЭМУЛЯТОРА:")
@@ -417,12 +1052,22 @@ def main():
         vfs_type = "ZIP архив"
         if not os.path.exists(vfs_path):
             print(f"  Предупреждение: архив не найден, будет создана пустая VFS")
+    elif os.path.isdir(vfs_path):
+        vfs_type = "Директория на диске"
+    elif is_image_file(vfs_path):
+        vfs_type = "Образ VFS (mmap)"
+    elif os.path.isfile(vfs_path) and tarfile.is_tarfile(vfs_path):
+        vfs_type = "TAR архив"
     else:
         vfs_type = "Память"
 
     print(f"  Тип VFS: {vfs_type}")
     print(f"  Лог-файл: {args.log_file}")
     print(f"  Стартовый скрипт: {args.startup_script}")
+    if args.cache_budget is not None:
+        print(f"  Бюджет кэша: {args.cache_budget} байт")
+    if args.max_memory is not None:
+        print(f"  Лимит памяти: {args.max_memory} байт")
     if args.create_test:
         print(f"  Тип теста: {args.create_test}")
     print("=" * 60)
@@ -430,9 +1075,21 @@ def main():
     shell = ShellEmulator(
         vfs_path=vfs_path,
         log_file=args.log_file,
-        startup_script=args.startup_script
+        startup_script=args.startup_script,
+        log_options=build_log_options(args),
+        vfs_options=build_vfs_options(args)
     )
-    shell.run()
+    if args.report_memory:
+        shell.execute_line("vfs-stats")
+    if args.verify:
+        report_integrity(shell, sys.stdout)
+    start_profiling(shell, args)
+    try:
+        shell.run()
+        shell.vfs.wait_index_saved()
+    finally:
+        finish_profiling(shell, args, sys.stdout)
+        finish_tracing(args, sys.stdout)
 
 
 if __name__ == "__main__":